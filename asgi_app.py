@@ -0,0 +1,322 @@
+import os
+import time
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import asyncpg
+import httpx
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse, HTMLResponse
+from starlette.routing import Route, Mount
+
+import flows
+import server
+import webhook_recorder
+from event_subscriptions import Subscription
+from events import loads as loads_json
+from webhook_dedup import WEBHOOK_DEDUP_TTL_HOURS
+from metrics import WEBHOOK_DUPLICATES, HTTP_SECONDS, record_github_response
+from tracing import span
+
+# Asyncio serving mode (SERVER_MODE=asgi in startup.sh, run by uvicorn).
+# /webhook, /telegram_commands and /dashboard are native async routes using an
+# asyncpg pool and a shared httpx client, so slow Telegram/GitHub calls no
+# longer pin a worker. Everything else (admin, /metrics, /health, ...) is the
+# Flask app mounted underneath. Push processing and the event writers keep
+# running on the existing thread executor / threadpool.
+#
+# The webhook and command flows are the ones in flows.py; AsgiIO only swaps
+# in awaiting DB/HTTP helpers. Telegram messages go out through the same
+# send queue as in the Flask app.
+
+ASGI_DB_POOL_MIN = int(os.getenv("ASGI_DB_POOL_MIN", "2"))
+ASGI_DB_POOL_MAX = int(os.getenv("ASGI_DB_POOL_MAX", "20"))
+# upper bound on concurrent outbound HTTP calls per process
+ASGI_HTTP_MAX_CONNECTIONS = int(os.getenv("ASGI_HTTP_MAX_CONNECTIONS", "1000"))
+
+db_pool = None
+http_client = None
+_background_tasks = set()  # strong refs so pending tasks aren't garbage-collected
+
+@asynccontextmanager
+async def lifespan(app):
+    global db_pool, http_client
+    db_pool = await asyncpg.create_pool(server.DATABASE_URL, min_size=ASGI_DB_POOL_MIN, max_size=ASGI_DB_POOL_MAX)
+    http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=ASGI_HTTP_MAX_CONNECTIONS,
+                                                        max_keepalive_connections=100))
+    try:
+        yield
+    finally:
+        await http_client.aclose()
+        await db_pool.close()
+
+# --- I/O for the shared flows (flows.py): asyncpg / httpx versions of ServerIO's helpers ---
+async def _reload_single_flight(cache, load):
+    """Run load() (which refills cache) in one request; concurrent requests wait for it instead."""
+    if cache.begin_reload():
+        failed = False
+        try:
+            await load()
+        except Exception as e:
+            print(f"{type(cache).__name__} reload error:", e)
+            failed = True
+        finally:
+            cache.end_reload(failed)
+    else:
+        while cache.reloading():
+            await asyncio.sleep(0.005)
+
+class AsgiIO(server.ServerIO):
+    """Awaiting I/O for flows.py. Enqueue-only methods (send queue, executor, CI batcher) are inherited."""
+
+    # webhook path
+    async def webhook_secret(self, chat_id, secret_key):
+        """Cached (secret_key, signing_secret) for chat_id (server.webhook_secrets, shared with the mounted Flask app)."""
+        cache = server.webhook_secrets
+        if cache.stale(chat_id, secret_key):
+            async def load():
+                rows = await db_pool.fetch("SELECT chat_id, secret_key, signing_secret FROM webhooks")
+                cache.replace({r['chat_id']: (r['secret_key'], r['signing_secret']) for r in rows})
+            await _reload_single_flight(cache, load)
+        return cache.peek(chat_id)
+
+    async def subscription(self, chat_id):
+        """Cached event subscription for chat_id (server.subscriptions, shared with the mounted Flask app)."""
+        cache = server.subscriptions
+        if cache.stale():
+            async def load():
+                rows = await db_pool.fetch("SELECT chat_id, events, repos, branches FROM event_subscriptions")
+                cache.replace({r['chat_id']: Subscription(r['events'], r['repos'], r['branches']) for r in rows})
+            await _reload_single_flight(cache, load)
+        return cache.peek(chat_id)
+
+    async def claim_delivery(self, delivery_id, chat_id, gh_event):
+        """asyncpg version of server.claim_webhook_delivery (shares its in-memory LRU)."""
+        dedup = server.delivery_dedup
+        if dedup.seen(delivery_id):
+            WEBHOOK_DUPLICATES.labels(source='memory').inc()
+            return False
+        try:
+            status = await db_pool.execute("""
+                INSERT INTO webhook_deliveries (delivery_id, chat_id, event) VALUES ($1, $2, $3)
+                ON CONFLICT (delivery_id) DO NOTHING
+            """, delivery_id, str(chat_id), gh_event)
+            if dedup.cleanup_due():
+                await db_pool.execute("DELETE FROM webhook_deliveries WHERE received_at < NOW() - make_interval(hours => $1)",
+                                      WEBHOOK_DEDUP_TTL_HOURS)
+        except Exception as e:
+            print("claim_webhook_delivery error:", e)
+            return True
+        dedup.remember(delivery_id)
+        if status != "INSERT 0 1":
+            WEBHOOK_DUPLICATES.labels(source='db').inc()
+            return False
+        return True
+
+    async def release_delivery(self, delivery_id):
+        server.delivery_dedup.forget(delivery_id)
+        try:
+            await db_pool.execute("DELETE FROM webhook_deliveries WHERE delivery_id = $1", delivery_id)
+        except Exception as e:
+            print("release_webhook_delivery error:", e)
+
+    async def record_webhook(self, gh_event, delivery_id, data):
+        if webhook_recorder.WEBHOOK_RECORD_DIR:
+            await run_in_threadpool(webhook_recorder.record_webhook, gh_event, delivery_id, data)
+
+    async def handle_event(self, gh_event, event, chat_id):
+        # the PR/review/issue writers stay synchronous; keep them off the event loop
+        await run_in_threadpool(server.EVENT_HANDLERS[gh_event], event, chat_id)
+
+    # commands
+    async def get_chat_id_from_secret(self, secret_key):
+        try:
+            return await db_pool.fetchval("SELECT chat_id FROM webhooks WHERE secret_key = $1", secret_key)
+        except Exception as e:
+            print("get_chat_id_from_secret error:", e)
+            return None
+
+    async def get_secret_from_chat_id(self, chat_id):
+        try:
+            return await db_pool.fetchval("SELECT secret_key FROM webhooks WHERE chat_id = $1", str(chat_id))
+        except Exception as e:
+            print("get_secret_from_chat_id error:", e)
+            return None
+
+    async def save_webhook_config(self, chat_id, secret_key, signing_secret):
+        try:
+            await db_pool.execute("""
+                INSERT INTO webhooks (secret_key, chat_id, signing_secret)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (chat_id) DO UPDATE SET secret_key = EXCLUDED.secret_key, signing_secret = EXCLUDED.signing_secret
+            """, secret_key, str(chat_id), signing_secret)
+            server.webhook_secrets.put(chat_id, secret_key, signing_secret)
+        except Exception as e:
+            print("save_webhook_config error:", e)
+
+    async def save_subscription(self, chat_id, sub):
+        try:
+            await db_pool.execute("""
+                INSERT INTO event_subscriptions (chat_id, events, repos, branches, updated_at)
+                VALUES ($1, $2, $3, $4, NOW())
+                ON CONFLICT (chat_id) DO UPDATE
+                  SET events = EXCLUDED.events, repos = EXCLUDED.repos, branches = EXCLUDED.branches, updated_at = NOW()
+            """, str(chat_id), sorted(sub.events), list(sub.repos), list(sub.branches))
+            server.subscriptions.put(chat_id, sub)
+            return True
+        except Exception as e:
+            print("save_subscription error:", e)
+            return False
+
+    async def create_pending_request(self, secret_key, user_id, chat_id):
+        request_uuid = str(uuid.uuid4())
+        try:
+            await db_pool.execute("""
+                INSERT INTO pending_token_requests (request_id, secret_key, user_id, chat_id, created_at)
+                VALUES ($1, $2, $3, $4, NOW())
+            """, request_uuid, secret_key, str(user_id), str(chat_id))
+            return request_uuid
+        except Exception as e:
+            print("create_pending_request error:", e)
+            return None
+
+    async def get_pending_request_by_user(self, user_id, expiry_minutes=15):
+        try:
+            r = await db_pool.fetchrow("""
+                SELECT secret_key, chat_id, created_at FROM pending_token_requests
+                WHERE user_id = $1
+                ORDER BY created_at DESC LIMIT 1
+            """, str(user_id))
+            if not r:
+                return None
+            age = (datetime.now(timezone.utc) - r['created_at']).total_seconds()
+            if age > expiry_minutes * 60:
+                await self.clear_pending_request_by_user(user_id)
+                return None
+            return {'secret_key': r['secret_key'], 'chat_id': r['chat_id']}
+        except Exception as e:
+            print("get_pending_request error:", e)
+            return None
+
+    async def clear_pending_request_by_user(self, user_id):
+        try:
+            await db_pool.execute("DELETE FROM pending_token_requests WHERE user_id = $1", str(user_id))
+        except Exception as e:
+            print("clear_pending_request error:", e)
+
+    async def remove_token_for_chat(self, chat_id):
+        try:
+            await db_pool.execute("DELETE FROM github_tokens WHERE chat_id = $1", str(chat_id))
+            return True
+        except Exception as e:
+            print("remove_token error:", e)
+            return False
+
+    async def validate_github_token(self, token):
+        try:
+            r = await http_client.get(f"{server.GITHUB_API_URL}/user",
+                                      headers={"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}, timeout=8)
+            record_github_response('user', r)
+            if r.status_code == 200:
+                return r.json()
+            print("token validate failed:", r.status_code, r.text)
+            return None
+        except Exception as e:
+            print("validate_github_token error:", e)
+            return None
+
+    async def save_encrypted_token_for_chat(self, chat_id, plaintext_token, created_by=None):
+        if not server.fernet:
+            print("FERNET_KEY missing")
+            return False
+        enc = server.fernet.encrypt(plaintext_token.encode()).decode()
+        try:
+            await db_pool.execute("""
+                INSERT INTO github_tokens (chat_id, encrypted_token, created_by)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (chat_id) DO UPDATE SET encrypted_token = EXCLUDED.encrypted_token, created_by = EXCLUDED.created_by, created_at = NOW()
+            """, str(chat_id), enc, created_by)
+            return True
+        except Exception as e:
+            print("save_encrypted_token error:", e)
+            return False
+
+    def start_token_install(self, chat_id, user_id, username, target_chat_id, token):
+        task = asyncio.create_task(self._install_github_token(chat_id, user_id, username, target_chat_id, token))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    async def _install_github_token(self, *args):
+        try:
+            await flows.install_github_token(self, *args)
+        except Exception as e:
+            print("install_github_token error:", e)
+
+asgi_io = AsgiIO()
+
+def _observe(endpoint, status, t0):
+    HTTP_SECONDS.labels(endpoint=endpoint, status=str(status)).observe(time.perf_counter() - t0)
+
+# --- Routes ---
+async def git_webhook(request):
+    t0 = time.perf_counter()
+    headers = request.headers
+    with span("POST /webhook", **{"github.delivery_id": headers.get('X-GitHub-Delivery'),
+                                  "github.event": headers.get('X-GitHub-Event', '').lower(),
+                                  "gitsync.chat_id": request.query_params.get('chat_id')}):
+        body = await request.body()
+        status, payload = await flows.handle_webhook(asgi_io, request.query_params, headers, body)
+    _observe('git_webhook', status, t0)
+    return JSONResponse(payload, status_code=status)
+
+async def telegram_commands(request):
+    t0 = time.perf_counter()
+    try:
+        update = loads_json(await request.body())
+    except ValueError:
+        update = None
+    if not isinstance(update, dict):
+        _observe('telegram_commands', 400, t0)
+        return JSONResponse({"status": "error", "message": "Invalid JSON body."}, status_code=400)
+    status = 500
+    try:
+        reply = await flows.handle_update(asgi_io, update)
+        status = 200
+    finally:
+        _observe('telegram_commands', status, t0)
+    # primary answer rides on the webhook reply, as in server.telegram_commands
+    return JSONResponse(reply or {"status": "ok"})
+
+def _render_dashboard_sync(target_chat_id):
+    with server.app.app_context():
+        return server.render_dashboard(target_chat_id)
+
+async def dashboard(request):
+    t0 = time.perf_counter()
+    secret_key = request.query_params.get('key')
+    if not secret_key:
+        _observe('dashboard', 401, t0)
+        return HTMLResponse("<h1>401 Unauthorized</h1><p>Access denied.</p>", status_code=401)
+    target_chat_id = await asgi_io.get_chat_id_from_secret(secret_key)
+    if not target_chat_id:
+        _observe('dashboard', 401, t0)
+        return HTMLResponse("<h1>401 Unauthorized</h1><p>Invalid dashboard key.</p>", status_code=401)
+    # the aggregate queries + Jinja render stay synchronous; keep them off the event loop
+    result = await run_in_threadpool(_render_dashboard_sync, target_chat_id)
+    body, status = (result if isinstance(result, tuple) else (result, 200))
+    _observe('dashboard', status, t0)
+    return HTMLResponse(body, status_code=status)
+
+app = Starlette(
+    routes=[
+        Route('/webhook', git_webhook, methods=['POST']),
+        Route('/telegram_commands', telegram_commands, methods=['POST']),
+        Route('/dashboard', dashboard, methods=['GET']),
+        Mount('/', app=WSGIMiddleware(server.app)),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,282 @@
+import email.policy
+import json
+import random
+import re
+import threading
+import time
+import types
+from email.parser import BytesParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Local stand-ins for the Telegram Bot API, GitHub REST API and Gemini REST API.
+# Each runs a ThreadingHTTPServer on 127.0.0.1 with configurable latency and
+# error injection so the push pipeline can be measured without network access.
+
+def parse_multipart(raw, content_type):
+    """Form fields as strings; file parts as {'filename', 'size', 'content'}."""
+    msg = BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + raw)
+    body = {}
+    for part in msg.iter_parts():
+        name = part.get_param('name', header='content-disposition')
+        data = part.get_payload(decode=True) or b""
+        filename = part.get_filename()
+        if filename:
+            body[name] = {'filename': filename, 'size': len(data), 'content': data}
+        else:
+            body[name] = data.decode('utf-8', 'replace')
+    return body
+
+class FakeService:
+    """Base HTTP stand-in: subclasses implement handle(method, path, body) -> (status, dict)."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=500):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.request_count = 0
+        self.error_count = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self, port=0):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _dispatch(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw = self.rfile.read(length) if length else b""
+                status, payload = service._respond(method, self.path, raw, self.headers)
+                if isinstance(payload, types.GeneratorType):
+                    # streamed body: each yielded str is sent as its own HTTP chunk
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for piece in payload:
+                        data = piece.encode()
+                        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                    self.wfile.write(b"0\r\n\r\n")
+                    return
+                out = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _respond(self, method, path, raw, headers):
+        with self._lock:
+            self.request_count += 1
+        delay = self.latency_ms + (random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0 and not self.streams(path):
+            time.sleep(delay / 1000.0)
+        if self.error_rate and random.random() < self.error_rate:
+            with self._lock:
+                self.error_count += 1
+            return self.error_status, {"ok": False, "error_code": self.error_status, "description": "injected error"}
+        content_type = headers.get('Content-Type') or ''
+        if content_type.startswith('multipart/form-data'):
+            body = parse_multipart(raw, content_type)
+        else:
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = {}
+        return self.handle(method, path, body, headers)
+
+    def streams(self, path):
+        """True when handle() returns a generator that spreads the latency itself."""
+        return False
+
+    def handle(self, method, path, body, headers):
+        return 404, {"message": "Not Found"}
+
+
+class FakeTelegram(FakeService):
+    """
+    Records every bot method call; waiters block until a matching message arrives.
+    Updates queued with push_update() are served to getUpdates long polls.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.messages = []
+        self.updates = []
+        self._cond = threading.Condition()
+        self._next_message_id = 1
+        self._next_update_id = 1
+
+    def push_update(self, update):
+        """Queue an update (update_id assigned here) for the next getUpdates call."""
+        with self._cond:
+            update = dict(update, update_id=self._next_update_id)
+            self._next_update_id += 1
+            self.updates.append(update)
+            self._cond.notify_all()
+        return update['update_id']
+
+    def _get_updates(self, body):
+        offset = body.get('offset')
+        limit = body.get('limit') or 100
+        deadline = time.perf_counter() + float(body.get('timeout') or 0)
+        with self._cond:
+            while True:
+                if offset is not None:
+                    # like the real API, asking for an offset confirms everything before it
+                    self.updates = [u for u in self.updates if u['update_id'] >= offset]
+                if self.updates:
+                    return 200, {"ok": True, "result": self.updates[:limit]}
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return 200, {"ok": True, "result": []}
+                self._cond.wait(remaining)
+
+    def handle(self, method, path, body, headers):
+        m = re.match(r"^/bot(?P<token>[^/]+)/(?P<method>\w+)", path)
+        if not m:
+            return 404, {"ok": False, "error_code": 404, "description": "Not Found"}
+        api_method = m.group('method')
+        if api_method == 'getUpdates':
+            return self._get_updates(body)
+        if api_method in ('deleteWebhook', 'setWebhook'):
+            return 200, {"ok": True, "result": True}
+        with self._cond:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+            self.messages.append({
+                'method': api_method,
+                'chat_id': str(body.get('chat_id')),
+                'text': body.get('text') or body.get('caption') or '',
+                'document': body.get('document') if isinstance(body.get('document'), dict) else None,
+                'message_id': body.get('message_id', message_id),
+                'received_at': time.perf_counter()
+            })
+            self._cond.notify_all()
+        return 200, {"ok": True, "result": {"message_id": message_id, "chat": {"id": body.get('chat_id')}, "text": body.get('text', '')}}
+
+    def wait_for(self, predicate, timeout=60.0):
+        """Block until a recorded message satisfies predicate; returns it or None."""
+        deadline = time.perf_counter() + timeout
+        seen = 0
+        with self._cond:
+            while True:
+                for msg in self.messages[seen:]:
+                    if predicate(msg):
+                        return msg
+                seen = len(self.messages)
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def reset(self):
+        with self._cond:
+            self.messages = []
+
+
+class FakeGitHub(FakeService):
+    """Serves /user and /repos/{owner}/{repo}/compare/{base}...{head} with synthetic file stats."""
+
+    def __init__(self, files_per_compare=8, **kwargs):
+        super().__init__(**kwargs)
+        self.files_per_compare = files_per_compare
+
+    def handle(self, method, path, body, headers):
+        if path.startswith('/user'):
+            return 200, {"login": "bench-user", "id": 1}
+        m = re.match(r"^/repos/(?P<owner>[^/]+)/(?P<repo>[^/]+)/compare/(?P<base>[^.]+)\.\.\.(?P<head>[^/?]+)", path)
+        if not m:
+            return 404, {"message": "Not Found"}
+        head = m.group('head')
+        files = [{
+            # the head sha is embedded so a Telegram message can be matched to its push
+            "filename": f"src/pkg_{head[:7]}/module_{i}.py",
+            "status": "modified" if i % 3 else "added",
+            "additions": 10 + i,
+            "deletions": i
+        } for i in range(self.files_per_compare)]
+        return 200, {"files": files, "total_commits": 1, "status": "ahead"}
+
+
+class FakeGemini(FakeService):
+    """
+    Answers models/{name}:generateContent with a response shaped like the real
+    one; :streamGenerateContent streams the same text as a JSON array in
+    stream_chunks pieces spread over the configured latency.
+    """
+
+    def __init__(self, stream_chunks=6, **kwargs):
+        super().__init__(**kwargs)
+        self.stream_chunks = stream_chunks
+
+    def streams(self, path):
+        return ':streamGenerateContent' in path
+
+    def _stream(self):
+        text = self.SUMMARY
+        step = max(1, -(-len(text) // self.stream_chunks))
+        pieces = [text[k:k + step] for k in range(0, len(text), step)]
+        pause = self.latency_ms / 1000.0 / len(pieces)
+        for n, piece in enumerate(pieces):
+            time.sleep(pause)
+            item = {"candidates": [{"content": {"parts": [{"text": piece}], "role": "model"}, "index": 0}]}
+            if n == len(pieces) - 1:
+                item["candidates"][0]["finishReason"] = "STOP"
+                item["usageMetadata"] = {"promptTokenCount": 120, "candidatesTokenCount": 60, "totalTokenCount": 180}
+            yield ("[" if n == 0 else ",\r\n") + json.dumps(item)
+        yield "]"
+
+    MODELS = ("gemini-2.5-pro", "gemini-2.5-flash", "gemini-2.5-flash-lite")
+
+    SUMMARY = (
+        "<b>Review Status:</b> ✅ Looks good\n"
+        "<b>Summary:</b> Synthetic benchmark summary of the pushed changes.\n"
+        "<b>Technical Context:</b>\n• module updated\n• tests adjusted"
+    )
+
+    def handle(self, method, path, body, headers):
+        if self.streams(path):
+            return 200, self._stream()
+        if method == 'GET' and path.split('?', 1)[0].rstrip('/').endswith('/models'):
+            return 200, {"models": [{"name": f"models/{name}", "supportedGenerationMethods": ["generateContent", "countTokens"]}
+                                    for name in self.MODELS]}
+        if ':generateContent' not in path:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        return 200, {
+            "candidates": [{
+                "content": {"parts": [{"text": self.SUMMARY}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0
+            }],
+            "usageMetadata": {"promptTokenCount": 120, "candidatesTokenCount": 60, "totalTokenCount": 180}
+        }
@@ -0,0 +1,119 @@
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+# Synthetic data for a throwaway benchmark database: chats, webhooks, commits
+# (project_updates + update_summaries), pull requests, reviews and issues.
+
+SCALES = {
+    'small':  {'chats': 5,  'devs_per_chat': 5,  'commits': 2_000,   'prs': 200,    'weeks': 4},
+    'medium': {'chats': 20, 'devs_per_chat': 10, 'commits': 20_000,  'prs': 2_000,  'weeks': 8},
+    'large':  {'chats': 50, 'devs_per_chat': 20, 'commits': 200_000, 'prs': 20_000, 'weeks': 12},
+}
+
+def recreate_database(admin_url, name):
+    """Drop and recreate `name` using a maintenance connection (e.g. .../postgres)."""
+    conn = psycopg2.connect(admin_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as c:
+            c.execute(f'DROP DATABASE IF EXISTS "{name}"')
+            c.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        conn.close()
+
+def seed(conn, scale, fernet=None, seed_value=42):
+    """
+    Populate an initialised schema. Returns a list of chats as dicts with
+    chat_id, secret_key and authors. Requires init_db() to have run.
+    """
+    from retention import ensure_monthly_partitions
+
+    spec = SCALES[scale]
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+    oldest = now - timedelta(weeks=spec['weeks'])
+    chats = []
+    with conn.cursor() as c:
+        ensure_monthly_partitions(c, start=oldest)
+        for i in range(spec['chats']):
+            chat_id = str(-1000000 - i)
+            secret_key = str(uuid.uuid4())
+            signing_secret = uuid.uuid4().hex
+            authors = [f"dev{i}_{j}" for j in range(spec['devs_per_chat'])]
+            c.execute("""INSERT INTO webhooks (secret_key, chat_id, signing_secret) VALUES (%s, %s, %s)
+                         ON CONFLICT (chat_id) DO UPDATE SET secret_key = EXCLUDED.secret_key, signing_secret = EXCLUDED.signing_secret""",
+                      (secret_key, chat_id, signing_secret))
+            if fernet:
+                c.execute("""INSERT INTO github_tokens (chat_id, encrypted_token, created_by) VALUES (%s, %s, 'bench')
+                             ON CONFLICT (chat_id) DO NOTHING""", (chat_id, fernet.encrypt(b"ghp_benchtoken").decode()))
+            chats.append({'chat_id': chat_id, 'secret_key': secret_key, 'signing_secret': signing_secret, 'authors': authors})
+
+        span = (now - oldest).total_seconds()
+        per_chat = max(1, spec['commits'] // spec['chats'])
+        for chat in chats:
+            rows = []
+            for _ in range(per_chat):
+                added, modified, removed = rng.randint(0, 3), rng.randint(0, 8), rng.randint(0, 2)
+                rows.append((chat['chat_id'], rng.choice(chat['authors']), f"org/repo{rng.randint(1, 3)}", "main",
+                             added + modified + removed, added, modified, removed, rng.randint(0, 400), rng.randint(0, 200),
+                             oldest + timedelta(seconds=rng.uniform(0, span))))
+            inserted = execute_values(c, """
+                INSERT INTO project_updates
+                (chat_id, author, repo_name, branch_name, files_changed, files_added, files_modified, files_removed, lines_added, lines_removed, timestamp)
+                VALUES %s RETURNING id, chat_id, timestamp
+            """, rows, page_size=1000, fetch=True)
+            execute_values(c, "INSERT INTO update_summaries (update_id, chat_id, created_at, summary) VALUES %s",
+                           [(r[0], r[1], r[2], "<b>Review Status:</b> OK\n<b>Summary:</b> " + "synthetic change " * 20) for r in inserted],
+                           page_size=1000)
+
+        per_chat_prs = max(1, spec['prs'] // spec['chats'])
+        pr_id = 1
+        review_id = 1
+        for chat in chats:
+            prs, reviews = [], []
+            for n in range(per_chat_prs):
+                created = oldest + timedelta(seconds=rng.uniform(0, span))
+                merged = created + timedelta(hours=rng.uniform(1, 72)) if rng.random() < 0.7 else None
+                prs.append((pr_id, chat['chat_id'], "org/repo1", n + 1, rng.choice(chat['authors']), created, merged, merged,
+                            'closed' if merged else 'open', rng.randint(1, 500), rng.randint(0, 200), rng.randint(1, 30)))
+                for _ in range(rng.randint(0, 3)):
+                    reviews.append((review_id, pr_id, rng.choice(chat['authors']), rng.choice(['APPROVED', 'COMMENTED', 'CHANGES_REQUESTED']),
+                                    created + timedelta(hours=rng.uniform(0.1, 24))))
+                    review_id += 1
+                pr_id += 1
+            execute_values(c, """INSERT INTO pull_requests (id, chat_id, repo_name, number, author, created_at, merged_at, closed_at, state, additions, deletions, changed_files)
+                                 VALUES %s""", prs, page_size=1000)
+            if reviews:
+                execute_values(c, "INSERT INTO pr_reviews (id, pr_id, reviewer, state, submitted_at) VALUES %s", reviews, page_size=1000)
+    conn.commit()
+    with conn.cursor() as c:
+        c.execute("ANALYZE")
+    conn.commit()
+    return chats
+
+def push_payload(chat, seq, files=6):
+    """A GitHub push payload shaped like the real one (one commit)."""
+    sha = uuid.uuid4().hex + uuid.uuid4().hex[:8]
+    before = uuid.uuid4().hex + uuid.uuid4().hex[:8]
+    author = chat['authors'][seq % len(chat['authors'])]
+    return sha, {
+        "ref": "refs/heads/main",
+        "before": before,
+        "after": sha,
+        "repository": {"name": "repo1", "full_name": "org/repo1", "owner": {"login": "org", "name": "org"},
+                       "organization": "org"},
+        "pusher": {"name": author, "email": f"{author}@example.com"},
+        "sender": {"login": author},
+        "head_commit": None,
+        "commits": [{
+            "id": sha,
+            "message": f"Benchmark change {seq}",
+            "added": [f"src/new_{seq}_{i}.py" for i in range(files // 3)],
+            "modified": [f"src/mod_{seq}_{i}.py" for i in range(files - files // 3)],
+            "removed": []
+        }]
+    }
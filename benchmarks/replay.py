@@ -0,0 +1,408 @@
+"""
+Webhook replay load generator.
+
+Replays recorded (WEBHOOK_RECORD_DIR) or synthetic GitHub deliveries and
+Telegram command updates against a running GitSync server at a fixed rate and
+concurrency, spread over many chats.
+
+  1. Provision chats (webhook secrets) in the target database:
+       python -m benchmarks.replay provision --database-url $DATABASE_URL --chats 200 --out chats.json
+
+  2. Start the server with TELEGRAM_API_BASE=http://127.0.0.1:8081 so sends land
+     in the fake Telegram started by the replay (needed for completion times).
+
+  3. Replay a burst:
+       python -m benchmarks.replay run --target http://127.0.0.1:5000 --chats-file chats.json \
+           --mix push=60,pull_request=20,pull_request_review=10,issues=10,command=5 \
+           --rate 40 --concurrency 32 --count 2000 --fake-telegram-port 8081 \
+           [--input recordings/webhooks-20260101.jsonl]
+
+Reports accept latency per event type, executor queue depth over time (from
+/health) and end-to-end completion time (request sent -> Telegram message).
+
+Payloads are generated on the submitting thread in sequence order, so --seed
+reproduces the event mix, actions and PR choices; commit shas and delivery ids
+stay unique per run so a repeated replay isn't deduplicated by the server.
+Reviews always point at a PR emitted earlier in the run for the same chat.
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks.fakes import FakeTelegram
+from webhook_auth import github_signature
+from benchmarks.run_bench import summarize
+
+EVENT_TYPES = ('push', 'pull_request', 'pull_request_review', 'issues', 'command')
+
+def new_sha():
+    return uuid.uuid4().hex + uuid.uuid4().hex[:8]
+
+# one id scheme for synthetic and refreshed recorded payloads: base + seq
+ID_BASE = {'pull_request': 10**9, 'review': 2 * 10**9, 'issue': 3 * 10**9}
+
+def pr_ref(seq):
+    """(id, number) of the PR a pull_request delivery with this seq creates."""
+    return ID_BASE['pull_request'] + seq, 100000 + seq
+
+# --- synthetic payloads (only the fields the handlers read) ---
+# rng is the run's seeded Random; pr is the (id, number) a review refers to
+def synth_push(seq, author, rng, pr=None):
+    sha = new_sha()
+    return {
+        "ref": "refs/heads/main", "before": new_sha(), "after": sha,
+        "repository": {"name": "repo1", "full_name": "org/repo1", "owner": {"login": "org"}, "organization": "org"},
+        "pusher": {"name": author}, "sender": {"login": author},
+        "commits": [{"id": sha, "message": f"Replay change {seq}",
+                     "added": [f"src/a_{seq}.py"], "modified": [f"src/m_{seq}_{i}.py" for i in range(4)], "removed": []}]
+    }, [sha[:7]]
+
+def synth_pull_request(seq, author, rng, pr=None):
+    pr_id, number = pr_ref(seq)
+    return {
+        "action": rng.choice(["opened", "closed", "synchronize"]),
+        "pull_request": {"id": pr_id, "number": number, "title": f"Replay PR {seq}", "user": {"login": author},
+                         "state": "open", "created_at": "2026-01-01T00:00:00Z", "merged_at": None, "closed_at": None,
+                         "additions": 10, "deletions": 2, "changed_files": 3, "head": {"ref": "feature"}},
+        "repository": {"full_name": "org/repo1"}, "sender": {"login": author}
+    }, [f"#{number}"]
+
+def synth_review(seq, author, rng, pr=None):
+    pr_id, number = pr
+    return {
+        "action": "submitted",
+        "review": {"id": ID_BASE['review'] + seq, "user": {"login": author}, "state": "approved", "submitted_at": "2026-01-01T01:00:00Z"},
+        "pull_request": {"id": pr_id, "number": number, "head": {"ref": "feature"}},
+        "repository": {"full_name": "org/repo1"}, "sender": {"login": author}
+    }, [f"#{number}"]
+
+def synth_issue(seq, author, rng, pr=None):
+    number = 100000 + seq
+    return {
+        "action": "closed",
+        "issue": {"id": ID_BASE['issue'] + seq, "number": number, "title": f"Replay issue {seq}", "user": {"login": author},
+                  "closed_by": {"login": author}, "created_at": "2026-01-01T00:00:00Z", "closed_at": "2026-01-02T00:00:00Z",
+                  "labels": [{"name": "bug"}]},
+        "repository": {"full_name": "org/repo1"}, "sender": {"login": author}
+    }, [f"#{number}"]
+
+SYNTH = {'push': synth_push, 'pull_request': synth_pull_request, 'pull_request_review': synth_review, 'issues': synth_issue}
+
+def synth_command(seq, chat_id):
+    return {
+        "update_id": 500000 + seq,
+        "message": {"message_id": seq, "from": {"id": 900000 + seq % 50, "username": f"user{seq % 50}"},
+                    "chat": {"id": int(chat_id), "type": "group"}, "text": "/dashboard"}
+    }
+
+def refresh_recorded(event_type, payload, seq, pr=None):
+    """Give a recorded payload fresh ids so dedup/idempotency doesn't short-circuit it; reviews move to pr."""
+    payload = json.loads(json.dumps(payload))
+    markers = []
+    if event_type == 'push':
+        for commit in payload.get('commits') or []:
+            commit['id'] = new_sha()
+            markers.append(commit['id'][:7])
+        payload['after'] = new_sha()
+        markers.append(payload['after'][:7])
+        if payload.get('head_commit') and payload.get('commits'):
+            payload['head_commit'] = payload['commits'][-1]
+    else:
+        pr_id, number = pr or pr_ref(seq)
+        if isinstance(payload.get('pull_request'), dict):
+            payload['pull_request']['id'] = pr_id
+            payload['pull_request']['number'] = number
+        if isinstance(payload.get('issue'), dict):
+            number = 100000 + seq
+            payload['issue']['id'] = ID_BASE['issue'] + seq
+            payload['issue']['number'] = number
+        if isinstance(payload.get('review'), dict):
+            payload['review']['id'] = ID_BASE['review'] + seq
+        markers.append(f"#{number}")
+    return payload, markers
+
+def load_recordings(paths):
+    by_type = defaultdict(list)
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                rec = json.loads(line)
+                event = rec.get('event') or 'push'
+                by_type[event].append(rec['payload'])
+    return by_type
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in EVENT_TYPES:
+            raise SystemExit(f"unknown event type in --mix: {name!r}")
+        mix[name] = float(weight or 1)
+    return mix
+
+# --- provisioning ---
+def cmd_provision(args):
+    import psycopg2
+    chats = []
+    conn = psycopg2.connect(args.database_url)
+    try:
+        with conn.cursor() as c:
+            for i in range(args.chats):
+                chat_id = str(args.base_chat_id - i)
+                secret_key = str(uuid.uuid4())
+                signing_secret = uuid.uuid4().hex
+                c.execute("""INSERT INTO webhooks (secret_key, chat_id, signing_secret) VALUES (%s, %s, %s)
+                             ON CONFLICT (chat_id) DO UPDATE SET secret_key = EXCLUDED.secret_key, signing_secret = EXCLUDED.signing_secret""",
+                          (secret_key, chat_id, signing_secret))
+                chats.append({'chat_id': chat_id, 'secret_key': secret_key, 'signing_secret': signing_secret})
+        conn.commit()
+    finally:
+        conn.close()
+    with open(args.out, 'w') as f:
+        json.dump(chats, f, indent=1)
+    print(f"Provisioned {len(chats)} chats -> {args.out}")
+    return 0
+
+# --- replay ---
+class QueueSampler(threading.Thread):
+    """Polls /health for executor queue depth while the replay runs."""
+
+    def __init__(self, target, interval):
+        super().__init__(daemon=True)
+        self.target = target
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        t0 = time.perf_counter()
+        while not self._stop_event.is_set():
+            try:
+                r = requests.get(f"{self.target}/health", timeout=5)
+                depth = r.json().get('queue_depth')
+                if depth is not None:
+                    self.samples.append((time.perf_counter() - t0, depth))
+            except Exception:
+                pass
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+def cmd_run(args):
+    with open(args.chats_file) as f:
+        chats = json.load(f)
+    if not chats:
+        raise SystemExit("chats file is empty")
+    mix = parse_mix(args.mix)
+    recordings = load_recordings(args.input) if args.input else {}
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+    rng = random.Random(args.seed)
+
+    telegram = FakeTelegram(latency_ms=args.telegram_latency_ms)
+    if args.fake_telegram_port:
+        # fixed port so the server's TELEGRAM_API_BASE can point at it
+        telegram.start(port=args.fake_telegram_port)
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=args.concurrency, pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    results = []
+    results_lock = threading.Lock()
+    prs_by_chat = defaultdict(list)     # PRs emitted so far, for reviews to refer to
+
+    def build(seq):
+        """Next delivery; runs on the submitting thread so the seeded rng sequence doesn't depend on scheduling."""
+        kind = rng.choices(kinds, weights)[0]
+        chat = chats[seq % len(chats)]
+        author = f"replay{seq % 25}"
+        if kind == 'command':
+            url = f"{args.target}/telegram_commands"
+            body, markers = synth_command(seq, chat['chat_id']), None
+            raw = json.dumps(body).encode()
+            return kind, chat, url, raw, {'Content-Type': 'application/json'}, markers
+        earlier = prs_by_chat[chat['chat_id']]
+        if kind == 'pull_request_review' and not earlier:
+            kind = 'pull_request'       # nothing to review yet in this chat
+        pr = rng.choice(earlier) if kind == 'pull_request_review' else None
+        if recordings.get(kind):
+            body, markers = refresh_recorded(kind, rng.choice(recordings[kind]), seq, pr)
+        else:
+            body, markers = SYNTH[kind](seq, author, rng, pr)
+        if kind == 'pull_request':
+            earlier.append(pr_ref(seq))
+        url = f"{args.target}/webhook?secret_key={chat['secret_key']}&chat_id={chat['chat_id']}"
+        raw = json.dumps(body).encode()
+        headers = {'X-GitHub-Event': kind, 'X-GitHub-Delivery': str(uuid.uuid4()), 'Content-Type': 'application/json',
+                   'X-Hub-Signature-256': github_signature(chat.get('signing_secret') or chat['secret_key'], raw)}
+        return kind, chat, url, raw, headers, markers
+
+    def send(delivery):
+        kind, chat, url, raw, headers, markers = delivery
+        t0 = time.perf_counter()
+        status, reply = None, None
+        try:
+            r = session.post(url, data=raw, headers=headers, timeout=args.request_timeout)
+            status = r.status_code
+            try:
+                reply = r.json()
+            except ValueError:
+                reply = None
+        except requests.RequestException:
+            status = 'error'
+        accepted = time.perf_counter()
+        rec = {'kind': kind, 'chat_id': str(chat['chat_id']), 'status': status, 't0': t0,
+               'accept_ms': (accepted - t0) * 1000, 'markers': markers, 'done_at': None}
+        # commands answered inline via webhook reply complete with the HTTP response
+        if kind == 'command' and isinstance(reply, dict) and reply.get('method'):
+            rec['done_at'] = accepted
+        with results_lock:
+            results.append(rec)
+
+    sampler = QueueSampler(args.target, args.queue_poll_interval)
+    sampler.start()
+    interval = 1.0 / args.rate if args.rate > 0 else 0.0
+    started = time.perf_counter()
+    deadline = started + args.duration if args.duration else None
+    sent = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for seq in itertools.count():
+            if args.count and seq >= args.count:
+                break
+            if deadline and time.perf_counter() >= deadline:
+                break
+            delivery = build(seq)
+            next_at = started + seq * interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, delivery)
+            sent += 1
+    send_wall = time.perf_counter() - started
+
+    # wait for outstanding completions in the fake Telegram
+    if args.fake_telegram_port:
+        wait_until = time.perf_counter() + args.completion_timeout
+        for rec in results:
+            if rec['done_at'] is not None:
+                continue
+            remaining = max(0.0, wait_until - time.perf_counter())
+            if rec['markers']:
+                pred = lambda m, rec=rec: m['chat_id'] == rec['chat_id'] and m['received_at'] >= rec['t0'] and any(x in m['text'] for x in rec['markers'])
+            else:
+                pred = lambda m, rec=rec: m['chat_id'] == rec['chat_id'] and m['received_at'] >= rec['t0']
+            msg = telegram.wait_for(pred, timeout=remaining)
+            if msg:
+                rec['done_at'] = msg['received_at']
+    sampler.stop()
+    sampler.join(timeout=5)
+    if args.fake_telegram_port:
+        telegram.stop()
+
+    report = build_report(results, sampler.samples, sent, send_wall)
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+def build_report(results, queue_samples, sent, send_wall):
+    by_kind = defaultdict(list)
+    for r in results:
+        by_kind[r['kind']].append(r)
+    statuses = defaultdict(int)
+    for r in results:
+        statuses[str(r['status'])] += 1
+    per_kind = {}
+    for kind, recs in by_kind.items():
+        per_kind[kind] = {
+            'accept': summarize([r['accept_ms'] for r in recs]),
+            'e2e': summarize([(r['done_at'] - r['t0']) * 1000 for r in recs if r['done_at'] is not None]),
+            'completed': sum(1 for r in recs if r['done_at'] is not None),
+            'sent': len(recs)
+        }
+    depths = [d for _, d in queue_samples]
+    growth = None
+    if len(queue_samples) >= 2:
+        (t_first, d_first), (t_last, d_last) = queue_samples[0], queue_samples[-1]
+        peak_t = max(queue_samples, key=lambda s: s[1])[0]
+        growth = (max(depths) - d_first) / max(peak_t - t_first, 1e-6)
+    return {
+        'sent': sent,
+        'achieved_rate_per_s': sent / send_wall if send_wall else 0.0,
+        'statuses': dict(statuses),
+        'per_kind': per_kind,
+        'queue_depth': {
+            'samples': queue_samples,
+            'max': max(depths) if depths else None,
+            'end': depths[-1] if depths else None,
+            'growth_per_s': growth
+        }
+    }
+
+def print_report(report):
+    fmt = lambda v: f"{v:9.1f}" if v is not None else f"{'-':>9}"
+    print(f"\nsent {report['sent']} at {report['achieved_rate_per_s']:.1f}/s; statuses {report['statuses']}")
+    print(f"{'event':<20} {'sent':>6} {'done':>6} {'acc p50':>9} {'acc p95':>9} {'acc p99':>9} {'e2e p50':>9} {'e2e p95':>9} {'e2e p99':>9}")
+    for kind, r in sorted(report['per_kind'].items()):
+        a, e = r['accept'], r['e2e']
+        print(f"{kind:<20} {r['sent']:>6} {r['completed']:>6} {fmt(a['p50_ms'])} {fmt(a['p95_ms'])} {fmt(a['p99_ms'])} "
+              f"{fmt(e['p50_ms'])} {fmt(e['p95_ms'])} {fmt(e['p99_ms'])}")
+    q = report['queue_depth']
+    if q['max'] is not None:
+        growth = f"{q['growth_per_s']:.2f}/s" if q['growth_per_s'] is not None else "-"
+        print(f"queue depth: max {q['max']}, end {q['end']}, growth to peak {growth}")
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest='cmd', required=True)
+
+    prov = sub.add_parser('provision', help='create webhook secrets for N chats in the target DB')
+    prov.add_argument('--database-url', required=True)
+    prov.add_argument('--chats', type=int, default=100)
+    prov.add_argument('--base-chat-id', type=int, default=-2000000)
+    prov.add_argument('--out', default='chats.json')
+
+    run = sub.add_parser('run', help='replay deliveries against a running server')
+    run.add_argument('--target', default='http://127.0.0.1:5000')
+    run.add_argument('--chats-file', required=True)
+    run.add_argument('--input', nargs='*', help='recorded webhooks-*.jsonl files (default: synthetic payloads)')
+    run.add_argument('--mix', default='push=60,pull_request=20,pull_request_review=10,issues=10')
+    run.add_argument('--rate', type=float, default=20.0, help='requests per second (0 = as fast as possible)')
+    run.add_argument('--concurrency', type=int, default=16)
+    run.add_argument('--count', type=int, default=500)
+    run.add_argument('--duration', type=float, default=0, help='stop sending after N seconds (overrides --count when hit first)')
+    run.add_argument('--request-timeout', type=float, default=30.0)
+    run.add_argument('--fake-telegram-port', type=int, default=0, help='start a fake Telegram here to measure completion')
+    run.add_argument('--telegram-latency-ms', type=float, default=0.0)
+    run.add_argument('--completion-timeout', type=float, default=300.0)
+    run.add_argument('--queue-poll-interval', type=float, default=0.5)
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--json', dest='json_out')
+    return p.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.cmd == 'provision':
+        return cmd_provision(args)
+    return cmd_run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
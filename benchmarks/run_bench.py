@@ -0,0 +1,220 @@
+"""
+Benchmark: webhook -> process_standup_task -> Telegram latency and dashboard render time.
+
+Runs the real Flask app in-process against local fake Telegram/GitHub/Gemini
+servers and a throwaway Postgres database seeded at one or more scales.
+
+    python -m benchmarks.run_bench --admin-url postgresql://localhost/postgres \
+        --scales small,medium --pushes 100 --concurrency 8 --json bench.json
+
+Compare against a stored run with --baseline bench.json (non-zero exit when a
+p95 regresses by more than --max-regression).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2.extensions
+
+from benchmarks.fakes import FakeTelegram, FakeGitHub, FakeGemini
+from webhook_auth import github_signature
+from benchmarks.fixtures import SCALES, recreate_database, seed, push_payload
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def summarize(values_ms):
+    return {
+        'count': len(values_ms),
+        'p50_ms': percentile(values_ms, 50),
+        'p95_ms': percentile(values_ms, 95),
+        'p99_ms': percentile(values_ms, 99),
+        'max_ms': max(values_ms) if values_ms else None
+    }
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--admin-url', default=os.getenv('BENCH_ADMIN_DATABASE_URL', 'postgresql://localhost/postgres'),
+                   help='maintenance DB URL used to (re)create the benchmark database')
+    p.add_argument('--db-name', default='gitsync_bench')
+    p.add_argument('--scales', default='small', help=f"comma list of {','.join(SCALES)}")
+    p.add_argument('--pushes', type=int, default=50)
+    p.add_argument('--concurrency', type=int, default=4)
+    p.add_argument('--mode', choices=['exact', 'estimated'], default='exact',
+                   help='exact = chats have a GitHub token (compare API path)')
+    p.add_argument('--dashboard-runs', type=int, default=10)
+    p.add_argument('--telegram-latency-ms', type=float, default=50)
+    p.add_argument('--github-latency-ms', type=float, default=150)
+    p.add_argument('--gemini-latency-ms', type=float, default=1500)
+    p.add_argument('--model-backend', choices=['fake', 'stub'], default='fake',
+                   help='fake = Gemini REST stand-in over HTTP; stub = in-process MODEL_BACKEND=stub '
+                        '(same latency, no HTTP/client overhead)')
+    p.add_argument('--model-tokens-per-sec', type=float, default=0,
+                   help='stub backend output speed on top of --gemini-latency-ms (0 = latency only)')
+    p.add_argument('--jitter-ms', type=float, default=0)
+    p.add_argument('--error-rate', type=float, default=0.0, help='injected error rate for every fake service')
+    p.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for each Telegram message')
+    p.add_argument('--json', dest='json_out', help='write results as JSON')
+    p.add_argument('--baseline', help='previous --json output to compare against')
+    p.add_argument('--max-regression', type=float, default=0.25, help='allowed p95 slowdown vs baseline (0.25 = 25%%)')
+    return p.parse_args(argv)
+
+def start_fakes(args):
+    common = {'jitter_ms': args.jitter_ms, 'error_rate': args.error_rate}
+    telegram = FakeTelegram(latency_ms=args.telegram_latency_ms, **common).start()
+    github = FakeGitHub(latency_ms=args.github_latency_ms, **common).start()
+    gemini = FakeGemini(latency_ms=args.gemini_latency_ms, **common).start()
+    return telegram, github, gemini
+
+def configure_env(args, telegram, github, gemini):
+    """Must run before server is imported: server reads its config at import time."""
+    from cryptography.fernet import Fernet
+    os.environ['DATABASE_URL'] = psycopg2.extensions.make_dsn(args.admin_url, dbname=args.db_name)
+    os.environ['TELEGRAM_API_BASE'] = telegram.url
+    os.environ['GITHUB_API_URL'] = github.url
+    os.environ['GEMINI_API_ENDPOINT'] = gemini.url
+    os.environ['GOOGLE_API_KEY'] = 'bench-key'
+    if args.model_backend == 'stub':
+        os.environ['MODEL_BACKEND'] = 'stub'
+        os.environ['STUB_MODEL_LATENCY_MS'] = str(args.gemini_latency_ms)
+        os.environ['STUB_MODEL_TOKENS_PER_SEC'] = str(args.model_tokens_per_sec)
+        os.environ['STUB_MODEL_FAILURE_RATE'] = str(args.error_rate)
+    os.environ['TELEGRAM_BOT_TOKEN_FOR_COMMANDS'] = 'bench-bot-token'
+    os.environ.setdefault('FERNET_KEY', Fernet.generate_key().decode())
+
+def run_pushes(server, telegram, chats, args):
+    def one(seq):
+        chat = chats[seq % len(chats)]
+        sha, payload = push_payload(chat, seq)
+        client = server.app.test_client()
+        t0 = time.perf_counter()
+        body = json.dumps(payload).encode()
+        r = client.post(f"/webhook?secret_key={chat['secret_key']}&chat_id={chat['chat_id']}", data=body,
+                        headers={'X-GitHub-Event': 'push', 'Content-Type': 'application/json',
+                                 'X-Hub-Signature-256': github_signature(chat['signing_secret'], body)})
+        accepted = time.perf_counter()
+        marker = sha[:7]
+        msg = telegram.wait_for(lambda m: m['chat_id'] == chat['chat_id'] and marker in m['text'], timeout=args.timeout)
+        return {
+            'status': r.status_code,
+            'accept_ms': (accepted - t0) * 1000,
+            'e2e_ms': (msg['received_at'] - t0) * 1000 if msg else None,
+            'started': t0,
+            'finished': msg['received_at'] if msg else None
+        }
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.pushes)))
+    done = [r for r in results if r['finished'] is not None]
+    wall = (max(r['finished'] for r in done) - min(r['started'] for r in results)) if done else None
+    return {
+        'accept': summarize([r['accept_ms'] for r in results]),
+        'ingest_e2e': summarize([r['e2e_ms'] for r in done]),
+        'completed': len(done),
+        'failed': len(results) - len(done),
+        'throughput_per_s': (len(done) / wall) if wall else 0.0
+    }
+
+def run_dashboard(server, chats, args):
+    client = server.app.test_client()
+    key = chats[0]['secret_key']
+    t0 = time.perf_counter()
+    r = client.get(f"/dashboard?key={key}")
+    cold_ms = (time.perf_counter() - t0) * 1000
+    if r.status_code != 200:
+        print(f"dashboard returned {r.status_code}", file=sys.stderr)
+    warm = []
+    for _ in range(args.dashboard_runs):
+        t0 = time.perf_counter()
+        client.get(f"/dashboard?key={key}")
+        warm.append((time.perf_counter() - t0) * 1000)
+    return {'cold_ms': cold_ms, 'warm': summarize(warm)}
+
+def print_report(results):
+    print()
+    print(f"{'scale':<8} {'metric':<16} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for scale, res in results['scales'].items():
+        for name, stats in (('accept', res['pushes']['accept']), ('ingest_e2e', res['pushes']['ingest_e2e']),
+                            ('dashboard_warm', res['dashboard']['warm'])):
+            fmt = lambda v: f"{v:10.1f}" if v is not None else f"{'-':>10}"
+            print(f"{scale:<8} {name:<16} {fmt(stats['p50_ms'])} {fmt(stats['p95_ms'])} {fmt(stats['p99_ms'])}")
+        print(f"{scale:<8} {'dashboard_cold':<16} {res['dashboard']['cold_ms']:10.1f}")
+        print(f"{scale:<8} throughput {res['pushes']['throughput_per_s']:.2f} pushes/s, "
+              f"completed {res['pushes']['completed']}, failed {res['pushes']['failed']}")
+
+def compare_baseline(results, baseline, max_regression):
+    """Return a list of human-readable regressions (p95 only)."""
+    regressions = []
+    for scale, res in results['scales'].items():
+        base = baseline.get('scales', {}).get(scale)
+        if not base:
+            continue
+        pairs = (
+            ('ingest_e2e', res['pushes']['ingest_e2e']['p95_ms'], base['pushes']['ingest_e2e']['p95_ms']),
+            ('accept', res['pushes']['accept']['p95_ms'], base['pushes']['accept']['p95_ms']),
+            ('dashboard_warm', res['dashboard']['warm']['p95_ms'], base['dashboard']['warm']['p95_ms']),
+        )
+        for name, now, before in pairs:
+            if now is None or not before:
+                continue
+            if now > before * (1 + max_regression):
+                regressions.append(f"{scale}/{name}: p95 {before:.1f}ms -> {now:.1f}ms")
+    return regressions
+
+def main(argv=None):
+    args = parse_args(argv)
+    scales = [s.strip() for s in args.scales.split(',') if s.strip()]
+    for s in scales:
+        if s not in SCALES:
+            raise SystemExit(f"unknown scale {s!r}; choose from {', '.join(SCALES)}")
+
+    telegram, github, gemini = start_fakes(args)
+    configure_env(args, telegram, github, gemini)
+    recreate_database(args.admin_url, args.db_name)
+    import server  # noqa: E402  (config is read at import)
+
+    results = {'config': {k: v for k, v in vars(args).items() if k not in ('baseline', 'json_out')}, 'scales': {}}
+    try:
+        for scale in scales:
+            print(f"== scale {scale}: recreating {args.db_name} and seeding...")
+            recreate_database(args.admin_url, args.db_name)
+            server.init_db()
+            conn = server.get_db_connection()
+            try:
+                chats = seed(conn, scale, fernet=server.fernet if args.mode == 'exact' else None)
+            finally:
+                conn.close()
+            telegram.reset()
+            print(f"   {args.pushes} pushes at concurrency {args.concurrency} ({args.mode})...")
+            pushes = run_pushes(server, telegram, chats, args)
+            print("   dashboard render...")
+            dashboard = run_dashboard(server, chats, args)
+            results['scales'][scale] = {'pushes': pushes, 'dashboard': dashboard}
+    finally:
+        for svc in (telegram, github, gemini):
+            svc.stop()
+
+    print_report(results)
+    if args.json_out:
+        with open(args.json_out, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_baseline(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regressions vs baseline.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -41,6 +41,8 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 # GITHUB_TOKEN removed as per request
 MODEL_NAME = 'gemini-2.5-pro' 
 TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+# commit fields kept when a push is queued during maintenance (what process_commits reads)
+PENDING_COMMIT_FIELDS = ('id', 'message', 'added', 'removed', 'modified')
 
 # --- SYSTEM SETUP ---
 if GOOGLE_API_KEY:
@@ -390,8 +392,9 @@ def process_standup_task(target_bot_token, target_chat_id, author_name, data):
                     repo_full_name = data.get('repository', {}).get('full_name', 'Unknown') 
                     branch_ref = data.get('ref', 'unknown')
                     
-                    # Save the entire 'commits' list as JSON
-                    commits_data = json.dumps(data.get('commits', []))
+                    # Save only the commit fields processing reads, not GitHub's full commit objects
+                    commits_data = json.dumps([{k: c[k] for k in PENDING_COMMIT_FIELDS if k in c}
+                                               for c in data.get('commits', []) if isinstance(c, dict)])
                     
                     enqueue_pending_commit(target_chat_id, author_name, 
                                            repo_full_name, 
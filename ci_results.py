@@ -0,0 +1,207 @@
+import os
+import time
+import atexit
+import threading
+
+from psycopg2.extras import execute_values
+
+from metrics import CI_BATCH_ROWS
+
+# CI outcomes from check_run / check_suite / workflow_run webhooks. A push
+# fans out into a burst of these (queued, in_progress, completed for every
+# check), so the webhook only hands the run to CIBatcher: rows are coalesced
+# per (kind, run id) in memory and written by one background thread as a single
+# multi-row upsert every CI_FLUSH_INTERVAL seconds, or as soon as
+# CI_BATCH_SIZE runs are pending. The upsert joins pull_requests, so runs for
+# PRs we haven't stored (forks, PRs opened before the hook) are dropped
+# instead of failing the batch, and a late in_progress delivery never
+# overwrites a completed result. When a batch fails, its rows are retried one
+# at a time so a row Postgres rejects can't block the rest; a row that fails
+# CI_MAX_ROW_ATTEMPTS flushes in a row is logged and dropped.
+#
+# check_run, check_suite and workflow_run ids are separate id spaces, so rows
+# are keyed by (kind, id). A push usually produces all three granularities for
+# the same CI; the leaderboard counts one per PR (workflow_run, else
+# check_suite, else check_run) so runs aren't double-counted.
+#
+# The connection factory and the after-write hook are injected by server.
+
+CI_BATCH_SIZE = int(os.getenv("CI_BATCH_SIZE", "200"))
+CI_FLUSH_INTERVAL = float(os.getenv("CI_FLUSH_INTERVAL", "2"))
+CI_MAX_ROW_ATTEMPTS = int(os.getenv("CI_MAX_ROW_ATTEMPTS", "3"))
+
+def init_ci_table(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ci_results (
+          kind TEXT NOT NULL,
+          id BIGINT NOT NULL,
+          pr_id BIGINT REFERENCES pull_requests(id),
+          status TEXT,
+          started_at TIMESTAMP WITH TIME ZONE,
+          finished_at TIMESTAMP WITH TIME ZONE,
+          PRIMARY KEY (kind, id)
+        )
+    ''')
+    # tables created before kind existed were keyed by id alone; their rows were check runs
+    c.execute("ALTER TABLE ci_results ADD COLUMN IF NOT EXISTS kind TEXT")
+    c.execute("UPDATE ci_results SET kind = 'check_run' WHERE kind IS NULL")
+    c.execute("ALTER TABLE ci_results ALTER COLUMN kind SET NOT NULL")
+    c.execute("""
+        SELECT COUNT(*) FROM information_schema.key_column_usage
+        WHERE table_name = 'ci_results' AND constraint_name = 'ci_results_pkey'
+    """)
+    if c.fetchone()[0] == 1:
+        c.execute("ALTER TABLE ci_results DROP CONSTRAINT ci_results_pkey, ADD PRIMARY KEY (kind, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_ci_results_pr ON ci_results (pr_id)")
+
+UPSERT_SQL = """
+    INSERT INTO ci_results (kind, id, pr_id, status, started_at, finished_at)
+    SELECT v.kind, v.id, v.pr_id, v.status, v.started_at::timestamptz, v.finished_at::timestamptz
+    FROM (VALUES %s) AS v (kind, id, pr_id, status, started_at, finished_at)
+    JOIN pull_requests p ON p.id = v.pr_id
+    ON CONFLICT (kind, id) DO UPDATE
+      SET pr_id = EXCLUDED.pr_id, status = EXCLUDED.status,
+          started_at = COALESCE(ci_results.started_at, EXCLUDED.started_at), finished_at = EXCLUDED.finished_at
+      WHERE ci_results.finished_at IS NULL OR EXCLUDED.finished_at IS NOT NULL
+    RETURNING pr_id
+"""
+
+def ci_row(event):
+    """(kind, id, pr_id, status, started_at, finished_at) for a CI event, or None when it isn't tied to a PR."""
+    if not event.run_id or not event.pr_ids:
+        return None
+    # one row per run; a run shared by several PRs counts for the first one GitHub lists
+    return (event.KIND, event.run_id, event.pr_ids[0], event.outcome, event.started_at, event.finished_at)
+
+class CIBatcher:
+    def __init__(self, connect=None, on_flush=None, batch_size=CI_BATCH_SIZE, interval=CI_FLUSH_INTERVAL):
+        self.connect = connect          # () -> psycopg2 connection or None
+        self.on_flush = on_flush        # (conn, chat_ids) after a batch is written
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = {}              # (kind, run id) -> (row, chat_id)
+        self._failures = {}             # (kind, run id) -> failed writes so far (flush lock held)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def add(self, event, chat_id):
+        """Queue a CI event; never touches the DB. Returns False when the event has no PR to attach to."""
+        row = ci_row(event)
+        if row is None:
+            return False
+        self._ensure_started()
+        with self._lock:
+            self._merge(row[:2], (row, str(chat_id)), newer=True)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        return True
+
+    def _merge(self, key, entry, newer):
+        """Put entry into _pending (lock held). The newer of two rows wins, except that a
+        completed result is never replaced by a queued / in_progress one."""
+        current = self._pending.get(key)
+        if current is None:
+            self._pending[key] = entry
+            return
+        old, new = (current, entry) if newer else (entry, current)
+        self._pending[key] = new if new[0][5] is not None or old[0][5] is None else old
+
+    def _requeue(self, batch):
+        # runs queued while the batch was in flight are newer than the batch's rows
+        with self._lock:
+            for key, entry in batch.items():
+                self._merge(key, entry, newer=False)
+
+    def pending(self):
+        return len(self._pending)
+
+    def _ensure_started(self):
+        # started lazily so gunicorn workers (not the master) own the thread
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="ci-results-flush")
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self.flush() is None:
+                time.sleep(self.interval)     # DB trouble: the batch was requeued, back off before retrying
+
+    def _write(self, conn, rows):
+        """Upsert rows and commit; returns the PR ids of the rows stored."""
+        with conn.cursor() as c:
+            stored = execute_values(c, UPSERT_SQL, rows, page_size=max(len(rows), 1), fetch=True)
+        conn.commit()
+        return [r[0] for r in stored]
+
+    def _write_each(self, conn, batch):
+        """
+        Retry a failed batch row by row. Returns (stored PR ids, ok); ok is False
+        when the connection was lost and the unwritten rows were requeued.
+        """
+        stored, retry = [], {}
+        items = list(batch.items())
+        for i, (key, entry) in enumerate(items):
+            try:
+                conn.rollback()
+                stored += self._write(conn, [entry[0]])
+                self._failures.pop(key, None)
+            except Exception as e:
+                if conn.closed:
+                    print("ci_results flush error:", e, "- requeued", len(items) - i, "runs")
+                    retry.update(items[i:])
+                    self._requeue(retry)
+                    return stored, False
+                attempts = self._failures.get(key, 0) + 1
+                if attempts >= CI_MAX_ROW_ATTEMPTS:
+                    print("ci_results dropped run", key, "after", attempts, "failed writes:", e)
+                    self._failures.pop(key, None)
+                else:
+                    self._failures[key] = attempts
+                    retry[key] = entry
+        self._requeue(retry)
+        return stored, True
+
+    def flush(self):
+        """
+        Write everything pending in one upsert; returns the number of rows stored,
+        or None when the DB was unavailable and the batch was requeued.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            conn = self.connect()
+            if not conn:
+                print("ci_results flush error: DB unavailable, requeued", len(batch), "runs")
+                self._requeue(batch)
+                return None
+            try:
+                ok = True
+                try:
+                    stored = self._write(conn, [row for row, _ in batch.values()])
+                    self._failures.clear()
+                except Exception as e:
+                    print("ci_results flush error:", e, "- retrying", len(batch), "runs one at a time")
+                    stored, ok = self._write_each(conn, batch)
+                CI_BATCH_ROWS.observe(len(batch))
+                stored_prs = set(stored)
+                chats = {chat for row, chat in batch.values() if row[2] in stored_prs}
+                if chats and self.on_flush:
+                    # the rows are committed; a failing hook doesn't change that
+                    try:
+                        self.on_flush(conn, chats)
+                    except Exception as e:
+                        print("ci_results on_flush error:", e)
+                return len(stored) if ok else None
+            finally:
+                conn.close()
@@ -0,0 +1,166 @@
+import os
+import html
+import time
+import threading
+from fnmatch import fnmatchcase
+
+from metrics import WEBHOOK_EVENTS
+
+# Per-chat event subscriptions. EVENT_ROUTES says what ingest does with each
+# X-GitHub-Event: "handle" stores it and notifies the group (EVENT_HANDLERS),
+# "push" queues a summary job, "ci" is batched into ci_results without a
+# message, "ack" is answered on the spot (ping). Any other
+# event type, or one the chat hasn't subscribed to, is acknowledged as ignored
+# before the body is parsed, so only relevant deliveries reach the DB, the
+# executor or the model. Repo and branch filters (fnmatch patterns, e.g.
+# "acme/*" or "release/*") are checked once the event is parsed.
+#
+# Subscriptions are edited with /events and cached in memory; other workers
+# pick up a change within SUBSCRIPTION_TTL seconds.
+
+SUBSCRIPTION_TTL = int(os.getenv("SUBSCRIPTION_TTL", "60"))
+
+ROUTE_HANDLE = 'handle'
+ROUTE_PUSH = 'push'
+ROUTE_CI = 'ci'
+ROUTE_ACK = 'ack'
+ROUTE_IGNORE = 'ignore'
+
+EVENT_ROUTES = {
+    'push': ROUTE_PUSH,
+    'pull_request': ROUTE_HANDLE,
+    'pull_request_review': ROUTE_HANDLE,
+    'issues': ROUTE_HANDLE,
+    'check_run': ROUTE_CI,
+    'check_suite': ROUTE_CI,
+    'workflow_run': ROUTE_CI,
+    'ping': ROUTE_ACK,
+}
+DEFAULT_EVENTS = ('push', 'pull_request', 'pull_request_review', 'issues', 'check_run', 'check_suite', 'workflow_run')
+
+def init_subscription_table(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS event_subscriptions (
+          chat_id TEXT PRIMARY KEY,
+          events TEXT[] NOT NULL,
+          repos TEXT[],
+          branches TEXT[],
+          updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    ''')
+
+class Subscription:
+    """Event types a chat wants plus optional repo / branch patterns (empty = any)."""
+    __slots__ = ('events', 'repos', 'branches')
+
+    def __init__(self, events=DEFAULT_EVENTS, repos=(), branches=()):
+        self.events = frozenset(events)
+        self.repos = tuple(r.lower() for r in repos or ())
+        self.branches = tuple(branches or ())
+
+    def route(self, gh_event):
+        route = EVENT_ROUTES.get(gh_event, ROUTE_IGNORE)
+        if route == ROUTE_ACK or gh_event in self.events:
+            return route
+        return ROUTE_IGNORE
+
+    def matches(self, repo_full_name, branch):
+        """Repo / branch filters; events without a branch (issues) only check the repo."""
+        if self.repos:
+            full_name = (repo_full_name or '').lower()
+            if not any(fnmatchcase(full_name, p) or fnmatchcase(full_name.split('/')[-1], p) for p in self.repos):
+                return False
+        if self.branches and branch:
+            return any(fnmatchcase(branch, p) for p in self.branches)
+        return True
+
+    def describe(self):
+        """Telegram HTML summary for /events."""
+        return (f"<b>Events:</b> {', '.join(sorted(self.events)) or 'none'}\n"
+                f"<b>Repos:</b> {html.escape(', '.join(self.repos)) or 'all'}\n"
+                f"<b>Branches:</b> {html.escape(', '.join(self.branches)) or 'all'}")
+
+DEFAULT_SUBSCRIPTION = Subscription()
+
+def parse_subscription(args):
+    """
+    Subscription from /events arguments: event names, repo:<pattern> and
+    branch:<pattern>; no event names means the defaults. Raises ValueError
+    with the first argument it doesn't understand.
+    """
+    events, repos, branches = [], [], []
+    for arg in args:
+        if arg.startswith('repo:') and arg[5:]:
+            repos.append(arg[5:])
+        elif arg.startswith('branch:') and arg[7:]:
+            branches.append(arg[7:])
+        elif EVENT_ROUTES.get(arg) not in (None, ROUTE_ACK):
+            events.append(arg)
+        else:
+            raise ValueError(arg)
+    return Subscription(events or DEFAULT_EVENTS, repos, branches)
+
+def subscribable_events():
+    return [e for e, route in EVENT_ROUTES.items() if route != ROUTE_ACK]
+
+def record_event(gh_event, outcome):
+    """
+    Count a delivery by outcome: dispatched, ignored (event type), filtered
+    (repo/branch), unlinked (CI run without a PR), ack, failed (dispatch error).
+    """
+    WEBHOOK_EVENTS.labels(event=gh_event if gh_event in EVENT_ROUTES else 'other', outcome=outcome).inc()
+
+class SubscriptionCache:
+    """chat_id -> Subscription, reloaded in full every ttl seconds. Async callers use replace()."""
+
+    def __init__(self, loader=None, ttl=SUBSCRIPTION_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._subs = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def replace(self, subs):
+        with self._lock:
+            self._subs = {str(k): v for k, v in subs.items()}
+            self._loaded_at = time.monotonic()
+
+    def put(self, chat_id, sub):
+        with self._lock:
+            self._subs[str(chat_id)] = sub
+
+    def peek(self, chat_id):
+        return self._subs.get(str(chat_id), DEFAULT_SUBSCRIPTION)
+
+    def begin_reload(self):
+        """Single flight: True for the one caller that should reload now (it must call end_reload())."""
+        return self._reload_lock.acquire(blocking=False)
+
+    def end_reload(self, failed=False):
+        if failed:
+            with self._lock:
+                self._loaded_at = time.monotonic()   # keep serving the old map; retry after ttl
+        self._reload_lock.release()
+
+    def reloading(self):
+        return self._reload_lock.locked()
+
+    def get(self, chat_id):
+        if self.loader is not None and self.stale():
+            if self.begin_reload():
+                failed = False
+                try:
+                    self.replace(self.loader())
+                except Exception as e:
+                    print("subscription cache reload error:", e)
+                    failed = True
+                finally:
+                    self.end_reload(failed)
+            else:
+                with self._reload_lock:     # wait for the reload in flight instead of running another
+                    pass
+        return self.peek(chat_id)
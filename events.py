@@ -0,0 +1,236 @@
+import json
+
+# --- Typed event model ---
+# One parser turns a webhook body into a small __slots__ object per event;
+# handlers read attributes instead of walking nested dicts. Commit file lists
+# are the payload's own lists (only copied to drop non-string entries).
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:   # optional: stdlib json is used without it
+    orjson = None
+    _loads = json.loads
+
+def loads(raw):
+    """Decode a JSON request body (bytes or str); raises ValueError on bad input."""
+    return _loads(raw)
+
+# Payloads come from the network: every nested value is type-checked before
+# use, so a malformed body parses into an event with empty fields instead of
+# raising in a handler.
+def _obj(d, key):
+    value = d.get(key)
+    return value if isinstance(value, dict) else {}
+
+def _objs(d, key):
+    value = d.get(key)
+    return [v for v in value if isinstance(v, dict)] if isinstance(value, list) else []
+
+def _paths(d, key):
+    value = d.get(key)
+    if not isinstance(value, list):
+        return []
+    return value if all(isinstance(p, str) for p in value) else [p for p in value if isinstance(p, str)]
+
+def _text(value):
+    return value if isinstance(value, str) else ''
+
+def _login(obj):
+    if isinstance(obj, dict):
+        return obj.get('login')
+    return obj if isinstance(obj, str) and obj else None   # push payloads carry repository.organization as a plain login
+
+class Commit:
+    __slots__ = ('id', 'message', 'added', 'removed', 'modified')
+
+    def __init__(self, id='', message='', added=(), removed=(), modified=()):
+        self.id = id
+        self.message = message
+        self.added = added
+        self.removed = removed
+        self.modified = modified
+
+    @classmethod
+    def parse(cls, c):
+        if not isinstance(c, dict):
+            return cls()
+        return cls(_text(c.get('id')), _text(c.get('message')), _paths(c, 'added'),
+                   _paths(c, 'removed'), _paths(c, 'modified'))
+
+    @property
+    def files(self):
+        return list(self.added) + list(self.removed) + list(self.modified)
+
+class Repository:
+    __slots__ = ('name', 'full_name', 'organization', 'owner_login')
+
+    def __init__(self, r):
+        owner = _obj(r, 'owner')
+        self.name = r.get('name')
+        self.full_name = _text(r.get('full_name'))
+        self.organization = _login(r.get('organization'))
+        self.owner_login = owner.get('login') or owner.get('name')
+
+    @property
+    def display_name(self):
+        name = self.name or 'Unknown Repo'
+        return f"{self.organization}/{name}" if self.organization else name
+
+class Event:
+    __slots__ = ('action', 'repository', 'sender')
+
+    def __init__(self, data):
+        self.action = data.get('action')
+        self.repository = Repository(_obj(data, 'repository'))
+        self.sender = _login(data.get('sender'))
+
+    @property
+    def author(self):
+        return self.sender or "Unknown"
+
+    @property
+    def ref_name(self):
+        """Full branch name for subscription filters (None when the event has no branch)."""
+        return None
+
+class PushEvent(Event):
+    __slots__ = ('ref', 'before', 'after', 'commits', 'head_commit', 'pusher', 'has_pusher')
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.ref = _text(data.get('ref'))
+        self.before = data.get('before')
+        self.after = data.get('after')
+        head = _obj(data, 'head_commit')
+        self.head_commit = Commit.parse(head) if head else None
+        self.commits = [Commit.parse(c) for c in _objs(data, 'commits')]
+        if not self.commits and self.head_commit:
+            self.commits = [self.head_commit]
+        self.has_pusher = 'pusher' in data
+        self.pusher = _obj(data, 'pusher').get('name')
+
+    @property
+    def author(self):
+        return self.pusher if self.has_pusher else super().author
+
+    @property
+    def branch(self):
+        return self.ref.split('/')[-1] if self.ref else 'unknown'
+
+    @property
+    def ref_name(self):
+        for prefix in ('refs/heads/', 'refs/tags/'):
+            if self.ref.startswith(prefix):
+                return self.ref[len(prefix):]
+        return self.ref or None
+
+class PullRequestEvent(Event):
+    __slots__ = ('pr_id', 'number', 'title', 'state', 'user', 'created_at', 'merged_at', 'closed_at',
+                 'additions', 'deletions', 'changed_files', 'head_ref')
+
+    def __init__(self, data):
+        super().__init__(data)
+        pr = _obj(data, 'pull_request')
+        self.pr_id = pr.get('id')
+        self.number = pr.get('number')
+        self.title = _text(pr.get('title'))
+        self.state = pr.get('state')
+        self.user = _login(pr.get('user'))
+        self.created_at = pr.get('created_at')
+        self.merged_at = pr.get('merged_at')
+        self.closed_at = pr.get('closed_at')
+        self.additions = pr.get('additions', 0)
+        self.deletions = pr.get('deletions', 0)
+        self.changed_files = pr.get('changed_files', 0)
+        self.head_ref = _text(_obj(pr, 'head').get('ref'))
+
+    @property
+    def ref_name(self):
+        return self.head_ref or None
+
+class ReviewEvent(Event):
+    __slots__ = ('review_id', 'reviewer', 'state', 'submitted_at', 'pr_id', 'pr_number', 'head_ref')
+
+    def __init__(self, data):
+        super().__init__(data)
+        review = _obj(data, 'review')
+        pr = _obj(data, 'pull_request')
+        self.review_id = review.get('id')
+        self.reviewer = _login(review.get('user'))
+        self.state = review.get('state')
+        self.submitted_at = review.get('submitted_at')
+        self.pr_id = pr.get('id')
+        self.pr_number = pr.get('number')
+        self.head_ref = _text(_obj(pr, 'head').get('ref'))
+
+    @property
+    def ref_name(self):
+        return self.head_ref or None
+
+class IssueEvent(Event):
+    __slots__ = ('issue_id', 'number', 'title', 'user', 'closed_by', 'created_at', 'closed_at', 'labels')
+
+    def __init__(self, data):
+        super().__init__(data)
+        issue = _obj(data, 'issue')
+        self.issue_id = issue.get('id')
+        self.number = issue.get('number')
+        self.title = _text(issue.get('title'))
+        self.user = _login(issue.get('user'))
+        self.closed_by = _login(issue.get('closed_by'))
+        self.created_at = issue.get('created_at')
+        self.closed_at = issue.get('closed_at')
+        self.labels = [l.get('name') for l in _objs(issue, 'labels')]
+
+class CIEvent(Event):
+    """A check run, check suite or workflow run (KIND is the payload key) and the PRs it belongs to."""
+    KIND = None
+    __slots__ = ('run_id', 'name', 'status', 'conclusion', 'started_at', 'finished_at', 'pr_ids', 'head_branch')
+
+    def __init__(self, data):
+        super().__init__(data)
+        run = _obj(data, self.KIND)
+        self.run_id = run.get('id')
+        self.name = run.get('name')
+        self.status = run.get('status')
+        self.conclusion = run.get('conclusion')
+        self.started_at = run.get('started_at') or run.get('run_started_at') or run.get('created_at')
+        self.finished_at = (run.get('completed_at') or run.get('updated_at')) if self.status == 'completed' else None
+        self.pr_ids = [p['id'] for p in _objs(run, 'pull_requests') if p.get('id')]
+        self.head_branch = _text(run.get('head_branch') or _obj(run, 'check_suite').get('head_branch')) or None
+
+    @property
+    def outcome(self):
+        """Conclusion once completed (success, failure, cancelled, ...), else queued / in_progress."""
+        return (self.conclusion or 'completed') if self.status == 'completed' else self.status
+
+    @property
+    def ref_name(self):
+        return self.head_branch
+
+class CheckRunEvent(CIEvent):
+    KIND = 'check_run'
+    __slots__ = ()
+
+class CheckSuiteEvent(CIEvent):
+    KIND = 'check_suite'
+    __slots__ = ()
+
+class WorkflowRunEvent(CIEvent):
+    KIND = 'workflow_run'
+    __slots__ = ()
+
+EVENT_TYPES = {
+    'push': PushEvent,
+    'pull_request': PullRequestEvent,
+    'pull_request_review': ReviewEvent,
+    'issues': IssueEvent,
+    'check_run': CheckRunEvent,
+    'check_suite': CheckSuiteEvent,
+    'workflow_run': WorkflowRunEvent,
+}
+
+def parse_event(gh_event, data):
+    """Typed event for a decoded payload; unknown event types parse as pushes (as git_webhook routes them)."""
+    return EVENT_TYPES.get(gh_event, PushEvent)(data if isinstance(data, dict) else {})
@@ -0,0 +1,228 @@
+import re
+import html
+import uuid
+import secrets
+import traceback
+
+from webhook_auth import check_webhook
+from event_subscriptions import (parse_subscription, subscribable_events, record_event,
+                                 ROUTE_ACK, ROUTE_IGNORE, ROUTE_HANDLE, ROUTE_CI)
+from events import parse_event, loads as loads_json
+
+# Webhook and bot-command flows shared by both serving modes. Each flow is
+# written once as a coroutine against an I/O object: server.ServerIO wraps the
+# blocking psycopg2/requests helpers (its coroutines never suspend, so Flask
+# runs a flow with run_sync() and no event loop), and asgi_app.AsgiIO
+# overrides the DB/HTTP methods with asyncpg/httpx ones.
+#
+# Awaited io methods do I/O; plain io methods only enqueue work (send queue,
+# executor, CI batcher) and never block.
+
+def run_sync(coro):
+    """Run a flow whose awaits all complete immediately (ServerIO); returns its result."""
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("flow suspended under run_sync(); use an awaiting I/O object")
+
+def reply_html(chat_id, text, **extra):
+    return {"method": "sendMessage", "chat_id": chat_id, "text": text, "parse_mode": "HTML", **extra}
+
+EVENTS_USAGE = (f"Usage: <code>/events [{' '.join(subscribable_events())}] [repo:owner/name] [branch:main]</code>\n"
+                "Patterns may use <code>*</code>; <code>/events reset</code> restores the defaults.")
+
+# --- GitHub webhook ---
+async def handle_webhook(io, params, headers, body):
+    """
+    One /webhook delivery: authenticate on the raw body, route by event type
+    and subscription, claim the delivery id, parse, then dispatch. Returns
+    (HTTP status, JSON body).
+    """
+    secret_key = params.get('secret_key')
+    target_chat_id = params.get('chat_id')
+    gh_event = headers.get('X-GitHub-Event', '').lower()
+    delivery_id = headers.get('X-GitHub-Delivery')
+
+    # authenticate against the cached secret: no JSON parsing or DB work for rejects
+    chat_secrets = await io.webhook_secret(target_chat_id, secret_key) if target_chat_id else None
+    rejected = check_webhook(chat_secrets, target_chat_id, secret_key, body, headers.get('X-Hub-Signature-256'))
+    if rejected:
+        print("Auth failed:", target_chat_id, rejected)
+        return 401, {"status": "error", "message": "Invalid secret_key, chat_id or signature."}
+
+    # ping and event types the chat hasn't subscribed to are answered here
+    subscription = await io.subscription(target_chat_id)
+    route = subscription.route(gh_event)
+    if route == ROUTE_ACK:
+        record_event(gh_event, 'ack')
+        return 200, {"status": "ok", "message": "pong"}
+    if route == ROUTE_IGNORE:
+        record_event(gh_event, 'ignored')
+        return 200, {"status": "ignored", "message": f"Not subscribed to '{gh_event}' events"}
+
+    # GitHub retries and "Redeliver" reuse the delivery id: answer those without running anything
+    if delivery_id and not await io.claim_delivery(delivery_id, target_chat_id, gh_event):
+        return 200, {"status": "duplicate", "message": "Delivery already processed"}
+    # from here on the delivery is claimed: any failure releases it so a redelivery can run
+    try:
+        data = loads_json(body)
+        await io.record_webhook(gh_event, delivery_id, data)
+        # handlers and the queued job only get the typed event, not the raw payload
+        event = parse_event(gh_event, data)
+        if not subscription.matches(event.repository.full_name, event.ref_name):
+            record_event(gh_event, 'filtered')
+            return 200, {"status": "ignored", "message": "Filtered by the chat's repo/branch settings"}
+    except Exception as e:
+        print("webhook parse error:", e)
+        if delivery_id:
+            await io.release_delivery(delivery_id)
+        message = "Invalid JSON body." if isinstance(e, ValueError) else "Malformed payload."
+        return 400, {"status": "error", "message": message}
+
+    try:
+        if route == ROUTE_CI:
+            # CI bursts are written in batches by the CI batcher; no group message
+            record_event(gh_event, 'dispatched' if io.queue_ci(event, target_chat_id) else 'unlinked')
+        elif route == ROUTE_HANDLE:
+            await io.handle_event(gh_event, event, target_chat_id)
+            io.notify(gh_event, event, target_chat_id)
+            record_event(gh_event, 'dispatched')
+        else:
+            io.dispatch_push(event, target_chat_id)
+            record_event(gh_event, 'dispatched')
+    except Exception as e:
+        print("webhook dispatch error:", e)
+        traceback.print_exc()
+        record_event(gh_event, 'failed')
+        if delivery_id:
+            await io.release_delivery(delivery_id)
+        # a 2xx counts as delivered; only an error status lets GitHub's redelivery run it again
+        return 500, {"status": "error", "message": "Processing failed; redeliver to retry."}
+
+    return 200, {"status": "processing", "message": "Accepted"}
+
+# --- Telegram commands ---
+# The primary answer to a command goes back as the webhook reply (Telegram
+# performs the sendMessage itself, no round-trip before we return); any extra
+# notifications and the GitHub token check run on the send queue / in the background.
+def looks_like_token(s):
+    return bool(re.search(r'ghp_|gho_|github_pat_|ghs_|ghu_|ghr_', s)) or len(s.strip()) > 30
+
+async def handle_update(io, update):
+    """Entry point for one Bot API update; returns the reply payload (with "method") or None."""
+    if isinstance(update, dict) and isinstance(update.get('message'), dict):
+        return await handle_command_message(io, update['message'])
+    return None
+
+async def handle_command_message(io, message):
+    message_text = message.get('text', '')
+    chat_id = message['chat']['id']
+
+    # /start (supports deep-link payload)
+    if message_text.startswith('/start'):
+        parts = message_text.strip().split()
+        if len(parts) > 1:
+            secret_payload = parts[1].strip()
+            target_chat = await io.get_chat_id_from_secret(secret_payload)
+            if not target_chat:
+                return reply_html(chat_id, "❌ This setup link is invalid or expired.")
+            await io.create_pending_request(secret_payload, message['from']['id'], target_chat)
+            return reply_html(chat_id, "🔒 Paste your GitHub PAT in this private chat. It will be stored encrypted and never shown. (Expires in 15 minutes)")
+        guide_text = (
+            "👋 <b>Welcome to GitSync!</b>\n\n"
+            "Add me to your Telegram organization group to instantly generate a unique webhook for your team.\n\n"
+            f"Tap →Add(User_Name:<code>@{io.bot_username}</code>)→ Done.\n\n"
+            "Run:\n🔹 <code>/gitsync</code>\n🔹 <code>/dashboard</code>\n🔹 <code>/events</code>"
+        )
+        return reply_html(chat_id, guide_text)
+
+    if message_text.startswith('/gitsync'):
+        new_key = str(uuid.uuid4())
+        signing_secret = secrets.token_hex(32)
+        await io.save_webhook_config(chat_id, new_key, signing_secret)
+        # the signing secret goes to the requester privately: anyone in the group can read the URL
+        requester = message.get('from', {}).get('id')
+        if requester:
+            io.queue_html(requester, (
+                "🔑 <b>GitSync webhook Secret</b>\n\n"
+                f"Set <b>Secret</b> in the GitHub webhook form to:\n\n<code>{signing_secret}</code>\n\n"
+                "Keep it private; it is not shown again. Running /gitsync again replaces it and the webhook URL."
+            ))
+        webhook_url = f"{io.app_base_url}/webhook?secret_key={new_key}&chat_id={chat_id}"
+        deep_link = f"https://t.me/{io.bot_username}?start={new_key}"
+        response_text = (
+            "👋 <b>GitSync Setup Guide</b>\n\n"
+            "1. Copy your unique Webhook URL:\n\n"
+            f"<code>{webhook_url}</code>\n\n"
+            "2. Paste in GitHub repo settings → Webhooks (push event), content type <code>application/json</code>, "
+            "and set <b>Secret</b> to the value I sent you in a private message. Unsigned deliveries are rejected. "
+            f"No message? Open a chat with <code>@{io.bot_username}</code>, press Start, then run /gitsync here again.\n\n"
+            f"3. To enable exact line counts for private repos, an admin should click: <a href=\"{deep_link}\">secure token setup (private DM)</a>\n\n"
+            "Then run /dashboard."
+        )
+        return reply_html(chat_id, response_text, disable_web_page_preview=True)
+
+    if message_text.startswith('/events'):
+        return await handle_events_command(io, chat_id, message_text.split()[1:])
+
+    if message_text.startswith('/dashboard'):
+        key = await io.get_secret_from_chat_id(chat_id)
+        if key:
+            dashboard_url = f"{io.app_base_url}/dashboard?key={key}"
+            response_text = f"📊 <b>Team Dashboard</b>\nOpen: <a href='{dashboard_url}'>Open Dashboard</a>"
+        else:
+            response_text = "❌ Run /gitsync first."
+        return reply_html(chat_id, response_text)
+
+    # private chat flows: token paste & removal
+    if message['chat']['type'] != 'private':
+        return None
+    text = message_text.strip()
+    user_id = message['from']['id']
+    if text.startswith('/remove_github_token'):
+        pending = await io.get_pending_request_by_user(user_id)
+        if not pending:
+            return reply_html(chat_id, "⚠️ Click group setup link first.")
+        target_chat = pending['chat_id']
+        ok = await io.remove_token_for_chat(target_chat)
+        await io.clear_pending_request_by_user(user_id)
+        if not ok:
+            return reply_html(chat_id, "❌ Remove failed.")
+        io.queue_html(target_chat, "⚠️ GitSync: Token removed. Exact counts disabled.")
+        return reply_html(chat_id, "✅ Token removed.")
+
+    if looks_like_token(text):
+        pending = await io.get_pending_request_by_user(user_id)
+        if not pending:
+            return reply_html(chat_id, "⚠️ No pending request found. Use group's setup link.")
+        io.start_token_install(chat_id, user_id, message.get('from', {}).get('username'), pending['chat_id'], text)
+        return reply_html(chat_id, "⏳ Checking your token with GitHub…")
+    return None
+
+async def handle_events_command(io, chat_id, args):
+    """/events shows the chat's subscription; /events <events> [repo:<pattern>] [branch:<pattern>] replaces it."""
+    if not args:
+        sub = await io.subscription(chat_id)
+        return reply_html(chat_id, f"📬 <b>Event subscriptions</b>\n{sub.describe()}\n\n{EVENTS_USAGE}")
+    try:
+        sub = parse_subscription([] if args == ['reset'] else args)
+    except ValueError as e:
+        return reply_html(chat_id, f"❌ Unknown option <code>{html.escape(str(e))}</code>.\n{EVENTS_USAGE}")
+    if not await io.save_subscription(chat_id, sub):
+        return reply_html(chat_id, "❌ Could not save the subscription.")
+    return reply_html(chat_id, f"✅ <b>Event subscriptions updated</b>\n{sub.describe()}")
+
+async def install_github_token(io, chat_id, user_id, username, target_chat_id, token):
+    """Background half of the token paste: validate with GitHub, store, notify both chats."""
+    if not await io.validate_github_token(token):
+        io.queue_html(chat_id, "❌ Token validation failed. Ensure 'repo' permissions are present.")
+        return
+    saved = await io.save_encrypted_token_for_chat(target_chat_id, token, created_by=username)
+    await io.clear_pending_request_by_user(user_id)
+    if saved:
+        io.queue_html(target_chat_id, f"✅ GitHub token installed by <b>{html.escape(username or 'admin')}</b>. Exact per-file insertions/deletions enabled.")
+        io.queue_html(chat_id, "✅ Token validated and saved securely.")
+    else:
+        io.queue_html(chat_id, "❌ Save failed.")
@@ -0,0 +1,10 @@
+# Picked up automatically by gunicorn from the working directory.
+# With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to files in
+# that directory; drop a dead worker's live gauges so /metrics stays accurate.
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except Exception as e:
+        print("child_exit metrics cleanup error:", e)
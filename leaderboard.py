@@ -0,0 +1,342 @@
+import sys
+import traceback
+from datetime import timedelta
+
+from metrics import cache_result
+
+# Corporate leaderboard: composite score from PRs, reviews, issues, speed, CI, commits.
+# Rows are precomputed per chat and ISO week into leaderboard_snapshots so the
+# dashboard reads O(authors) rows instead of re-aggregating raw events. A
+# dirty snapshot is served as is while the debounced refresh (or the periodic
+# job) rebuilds it; a read only computes when the current week has no snapshot
+# at all (first view of a chat, start of an ISO week), once, and stores it.
+
+WEIGHTS = {
+    'merged_prs': 0.20,
+    'reviews': 0.15,
+    'issues': 0.10,
+    'commits': 0.15,
+    'files': 0.10,
+    'first_review_speed': 0.08,
+    'merge_speed': 0.07,
+    'ci': 0.10,
+    'cross_reviews': 0.05
+}
+
+def init_leaderboard_tables(c):
+    """Create snapshot tables (called from init_db with an open cursor)."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+            chat_id TEXT NOT NULL,
+            iso_year INTEGER NOT NULL,
+            iso_week INTEGER NOT NULL,
+            author TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            score DOUBLE PRECISION DEFAULT 0,
+            commits INTEGER DEFAULT 0,
+            files_changed INTEGER DEFAULT 0,
+            merged_prs INTEGER DEFAULT 0,
+            reviews_done INTEGER DEFAULT 0,
+            issues_closed INTEGER DEFAULT 0,
+            ci_pass_rate DOUBLE PRECISION,
+            computed_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (chat_id, iso_year, iso_week, author)
+        )
+    ''')
+    # one row per chat: when events last landed vs. when the snapshot was rebuilt
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS leaderboard_snapshot_state (
+            chat_id TEXT PRIMARY KEY,
+            dirty_at TIMESTAMP WITH TIME ZONE,
+            computed_at TIMESTAMP WITH TIME ZONE,
+            iso_year INTEGER,
+            iso_week INTEGER
+        )
+    ''')
+
+def iso_week_key(now_ist):
+    iso = now_ist.isocalendar()
+    return iso[0], iso[1]
+
+def compute_leaderboard(c, chat_id, period_start):
+    """Aggregate raw PR/review/issue/CI/commit events into ranked leaderboard rows."""
+    chat_id = str(chat_id)
+
+    # merged PRs
+    c.execute("""SELECT author, COUNT(*) AS merged_prs
+                 FROM pull_requests
+                 WHERE chat_id = %s AND merged_at IS NOT NULL AND merged_at >= %s
+                 GROUP BY author""", (chat_id, period_start))
+    merged_rows = {r[0]: int(r[1]) for r in c.fetchall()}
+
+    # reviews
+    c.execute("""SELECT reviewer AS author, COUNT(*) AS reviews_done,
+                SUM(CASE WHEN r.state='APPROVED' THEN 1 ELSE 0 END) AS approvals
+        FROM pr_reviews r
+        JOIN pull_requests p ON r.pr_id = p.id
+        WHERE p.chat_id = %s AND r.submitted_at >= %s
+        GROUP BY reviewer""", (chat_id, period_start))
+    review_rows = {r[0]: {'reviews_done': int(r[1]), 'approvals': int(r[2])} for r in c.fetchall()}
+
+    # issues closed
+    c.execute("""SELECT closed_by AS author, COUNT(*) AS issues_closed,
+                        SUM(CASE WHEN labels && ARRAY['bug'] THEN 1 ELSE 0 END) AS bugs_closed
+                 FROM issues_closed
+                 WHERE chat_id = %s AND closed_at >= %s
+                 GROUP BY closed_by""", (chat_id, period_start))
+    issue_rows = {r[0]: {'issues_closed': int(r[1]), 'bugs_closed': int(r[2] or 0)} for r in c.fetchall()}
+
+    # first review time per author (lower better)
+    c.execute("""WITH first_review AS (
+                   SELECT pr_id, MIN(submitted_at) AS first_review_at
+                   FROM pr_reviews GROUP BY pr_id
+                 )
+                 SELECT p.author, AVG(EXTRACT(epoch FROM (fr.first_review_at - p.created_at))) AS avg_first_review_secs
+                 FROM pull_requests p JOIN first_review fr ON fr.pr_id = p.id
+                 WHERE p.chat_id = %s AND p.created_at >= %s
+                 GROUP BY p.author""", (chat_id, period_start))
+    first_review_rows = {r[0]: float(r[1]) for r in c.fetchall()}
+
+    # avg merge secs
+    c.execute("""SELECT author, AVG(EXTRACT(epoch FROM (merged_at - created_at))) AS avg_merge_secs
+                 FROM pull_requests
+                 WHERE chat_id = %s AND merged_at IS NOT NULL AND created_at >= %s
+                 GROUP BY author""", (chat_id, period_start))
+    merge_time_rows = {r[0]: float(r[1]) for r in c.fetchall()}
+
+    # ci pass rates (finished runs only; queued / in_progress rows are still pending).
+    # Each PR counts one granularity: workflow runs, else check suites, else check runs.
+    c.execute("""WITH prs AS (
+                   SELECT id, author FROM pull_requests WHERE chat_id = %s AND created_at >= %s
+                 ), ci AS (
+                   SELECT r.pr_id, r.status, r.finished_at,
+                          CASE r.kind WHEN 'workflow_run' THEN 0 WHEN 'check_suite' THEN 1 ELSE 2 END AS level
+                   FROM ci_results r JOIN prs ON prs.id = r.pr_id
+                 ), ranked AS (
+                   SELECT ci.*, MIN(level) OVER (PARTITION BY pr_id) AS best_level FROM ci
+                 )
+                 SELECT p.author,
+                        SUM(CASE WHEN c.status='success' AND c.finished_at IS NOT NULL THEN 1 ELSE 0 END) AS passed,
+                        COUNT(c.finished_at) AS total
+                 FROM prs p
+                 LEFT JOIN ranked c ON c.pr_id = p.id AND c.level = c.best_level
+                 GROUP BY p.author""", (chat_id, period_start))
+    ci_rows = {r[0]: {'passed': int(r[1] or 0), 'total': int(r[2] or 0)} for r in c.fetchall()}
+
+    # cross-team reviews (reviewer != pr author)
+    c.execute("""SELECT r.reviewer AS author, COUNT(*) AS cross_reviews
+                 FROM pr_reviews r
+                 JOIN pull_requests p ON r.pr_id = p.id
+                 WHERE p.chat_id = %s AND r.submitted_at >= %s AND r.reviewer <> p.author
+                 GROUP BY r.reviewer""", (chat_id, period_start))
+    cross_rows = {r[0]: int(r[1]) for r in c.fetchall()}
+
+    # commit stats
+    c.execute("""SELECT author, COUNT(*) as commits,
+                        SUM(files_added + files_modified + files_removed) as files_changed
+                 FROM project_updates
+                 WHERE chat_id = %s AND timestamp >= %s
+                 GROUP BY author""", (chat_id, period_start))
+    commit_stats = {r[0]: {'commits': int(r[1] or 0), 'files_changed': int(r[2] or 0)} for r in c.fetchall()}
+
+    authors = set(merged_rows) | set(review_rows) | set(issue_rows) | set(first_review_rows) | set(merge_time_rows) | set(ci_rows) | set(cross_rows) | set(commit_stats.keys())
+    authors.discard(None)
+
+    metrics = {}
+    for a in authors:
+        metrics[a] = {
+            'merged_prs': merged_rows.get(a, 0),
+            'reviews_done': review_rows.get(a, {}).get('reviews_done', 0),
+            'approvals': review_rows.get(a, {}).get('approvals', 0),
+            'issues_closed': issue_rows.get(a, {}).get('issues_closed', 0),
+            'bugs_closed': issue_rows.get(a, {}).get('bugs_closed', 0),
+            'avg_first_review_secs': first_review_rows.get(a, None),
+            'avg_merge_secs': merge_time_rows.get(a, None),
+            'ci_pass_rate': (ci_rows[a]['passed'] / ci_rows[a]['total']) if ci_rows.get(a, {}).get('total') else None,
+            'cross_reviews': cross_rows.get(a, 0),
+            'commits': commit_stats.get(a, {}).get('commits', 0),
+            'files_changed': commit_stats.get(a, {}).get('files_changed', 0)
+        }
+
+    def normalize_map(vals):
+        if not vals:
+            return {}
+        maxv = max(vals.values())
+        if maxv == 0:
+            return {k: 0.0 for k in vals}
+        return {k: (v / maxv) for k,v in vals.items()}
+
+    def normalize_time_map(time_map):
+        filtered = {k:v for k,v in time_map.items() if v is not None}
+        if not filtered:
+            return {k:0.0 for k in time_map}
+        maxv = max(filtered.values())
+        if maxv == 0:
+            return {k:1.0 for k in filtered}
+        scores = {}
+        for k in time_map:
+            v = time_map[k]
+            if v is None:
+                scores[k] = 0.0
+            else:
+                scores[k] = 1.0 - (v / maxv)
+        return scores
+
+    n_merged = normalize_map({a: metrics[a]['merged_prs'] for a in authors})
+    n_reviews = normalize_map({a: metrics[a]['reviews_done'] for a in authors})
+    n_issues = normalize_map({a: metrics[a]['issues_closed'] for a in authors})
+    n_cross = normalize_map({a: metrics[a]['cross_reviews'] for a in authors})
+    n_commits = normalize_map({a: metrics[a]['commits'] for a in authors})
+    n_files = normalize_map({a: metrics[a]['files_changed'] for a in authors})
+    n_ci = normalize_map({a: (metrics[a]['ci_pass_rate'] if metrics[a]['ci_pass_rate'] is not None else 0.0) for a in authors})
+    n_first_review = normalize_time_map({a: (metrics[a]['avg_first_review_secs'] if metrics[a]['avg_first_review_secs'] else None) for a in authors})
+    n_merge_time = normalize_time_map({a: (metrics[a]['avg_merge_secs'] if metrics[a]['avg_merge_secs'] else None) for a in authors})
+
+    leaderboard = []
+    for a in sorted(authors):
+        score = 0.0
+        score += WEIGHTS['merged_prs'] * n_merged.get(a, 0.0)
+        score += WEIGHTS['reviews'] * n_reviews.get(a, 0.0)
+        score += WEIGHTS['issues'] * n_issues.get(a, 0.0)
+        score += WEIGHTS['commits'] * n_commits.get(a, 0.0)
+        score += WEIGHTS['files'] * n_files.get(a, 0.0)
+        score += WEIGHTS['first_review_speed'] * n_first_review.get(a, 0.0)
+        score += WEIGHTS['merge_speed'] * n_merge_time.get(a, 0.0)
+        score += WEIGHTS['ci'] * n_ci.get(a, 0.0)
+        score += WEIGHTS['cross_reviews'] * n_cross.get(a, 0.0)
+
+        leaderboard.append({
+            'name': a,
+            'score': round(score * 100, 2),
+            'commits': metrics[a]['commits'],
+            'files_changed': metrics[a]['files_changed'],
+            'merged_prs': metrics[a]['merged_prs'],
+            'reviews_done': metrics[a]['reviews_done'],
+            'issues_closed': metrics[a]['issues_closed'],
+            'ci_pass_rate': metrics[a].get('ci_pass_rate', None)
+        })
+
+    leaderboard.sort(key=lambda x: x['score'], reverse=True)
+    return leaderboard
+
+def store_snapshot(conn, chat_id, iso_year, iso_week, leaderboard):
+    """Replace the snapshot rows for (chat, week) and mark the chat clean."""
+    with conn.cursor() as c:
+        c.execute("DELETE FROM leaderboard_snapshots WHERE chat_id = %s AND iso_year = %s AND iso_week = %s",
+                  (str(chat_id), iso_year, iso_week))
+        for rank, row in enumerate(leaderboard, start=1):
+            c.execute("""
+                INSERT INTO leaderboard_snapshots
+                (chat_id, iso_year, iso_week, author, rank, score, commits, files_changed, merged_prs, reviews_done, issues_closed, ci_pass_rate, computed_at)
+                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,NOW())
+            """, (str(chat_id), iso_year, iso_week, row['name'], rank, row['score'], row['commits'], row['files_changed'],
+                  row['merged_prs'], row['reviews_done'], row['issues_closed'], row['ci_pass_rate']))
+        c.execute("""
+            INSERT INTO leaderboard_snapshot_state (chat_id, computed_at, iso_year, iso_week)
+            VALUES (%s, NOW(), %s, %s)
+            ON CONFLICT (chat_id) DO UPDATE SET computed_at = EXCLUDED.computed_at,
+                iso_year = EXCLUDED.iso_year, iso_week = EXCLUDED.iso_week
+        """, (str(chat_id), iso_year, iso_week))
+    conn.commit()
+
+def refresh_snapshot(conn, chat_id, period_start, now_ist):
+    """Recompute and store the current week's leaderboard for one chat."""
+    iso_year, iso_week = iso_week_key(now_ist)
+    with conn.cursor() as c:
+        leaderboard = compute_leaderboard(c, chat_id, period_start)
+    store_snapshot(conn, chat_id, iso_year, iso_week, leaderboard)
+    return leaderboard
+
+def mark_leaderboard_dirty(conn, chat_id):
+    """Cheap upsert recording that new events landed for this chat."""
+    with conn.cursor() as c:
+        c.execute("""
+            INSERT INTO leaderboard_snapshot_state (chat_id, dirty_at)
+            VALUES (%s, NOW())
+            ON CONFLICT (chat_id) DO UPDATE SET dirty_at = EXCLUDED.dirty_at
+        """, (str(chat_id),))
+    conn.commit()
+
+def load_snapshot(c, chat_id, now_ist):
+    """
+    Return (rows, fresh): the stored leaderboard for the current ISO week with
+    week-over-week rank change (None if this week has no snapshot yet), and
+    whether it is up to date with the chat's events.
+    """
+    iso_year, iso_week = iso_week_key(now_ist)
+    prev_year, prev_week = iso_week_key(now_ist - timedelta(weeks=1))
+    c.execute("""
+        SELECT computed_at IS NOT NULL AND iso_year = %s AND iso_week = %s,
+               dirty_at IS NULL OR dirty_at <= computed_at
+        FROM leaderboard_snapshot_state WHERE chat_id = %s
+    """, (iso_year, iso_week, str(chat_id)))
+    state = c.fetchone()
+    if not state or not state[0]:
+        return None, False
+    c.execute("""
+        SELECT s.author, s.score, s.commits, s.files_changed, s.merged_prs, s.reviews_done,
+               s.issues_closed, s.ci_pass_rate, s.rank, prev.rank
+        FROM leaderboard_snapshots s
+        LEFT JOIN leaderboard_snapshots prev
+          ON prev.chat_id = s.chat_id AND prev.author = s.author
+         AND prev.iso_year = %s AND prev.iso_week = %s
+        WHERE s.chat_id = %s AND s.iso_year = %s AND s.iso_week = %s
+        ORDER BY s.rank
+    """, (prev_year, prev_week, str(chat_id), iso_year, iso_week))
+    rows = [{
+        'name': r[0],
+        'score': float(r[1] or 0),
+        'commits': int(r[2] or 0),
+        'files_changed': int(r[3] or 0),
+        'merged_prs': int(r[4] or 0),
+        'reviews_done': int(r[5] or 0),
+        'issues_closed': int(r[6] or 0),
+        'ci_pass_rate': r[7],
+        'rank': r[8],
+        # positive = moved up since last week, None = not ranked last week
+        'rank_change': (r[9] - r[8]) if r[9] is not None else None
+    } for r in c.fetchall()]
+    return rows, bool(state[1])
+
+def get_leaderboard(conn, chat_id, period_start, now_ist, request_refresh=None):
+    """
+    Stored snapshot for this week. A missing one is computed and stored here
+    so the first view isn't empty; a stale one is served while
+    request_refresh(chat_id) schedules the rebuild.
+    """
+    with conn.cursor() as c:
+        rows, fresh = load_snapshot(c, chat_id, now_ist)
+    cache_result('leaderboard_snapshot', fresh)
+    if rows is None:
+        try:
+            refresh_snapshot(conn, chat_id, period_start, now_ist)
+        except Exception as e:
+            # most likely a concurrent first view storing the same week; use its snapshot
+            conn.rollback()
+            print("leaderboard refresh error:", chat_id, e, file=sys.stderr)
+        with conn.cursor() as c:
+            rows, fresh = load_snapshot(c, chat_id, now_ist)
+    elif not fresh and request_refresh:
+        request_refresh(chat_id)
+    return rows or []
+
+def refresh_dirty_snapshots(conn, period_start, now_ist):
+    """Periodic job: rebuild every chat whose events are newer than its snapshot."""
+    iso_year, iso_week = iso_week_key(now_ist)
+    with conn.cursor() as c:
+        c.execute("""
+            SELECT chat_id FROM leaderboard_snapshot_state
+            WHERE computed_at IS NULL OR dirty_at > computed_at
+               OR iso_year IS DISTINCT FROM %s OR iso_week IS DISTINCT FROM %s
+        """, (iso_year, iso_week))
+        chat_ids = [r[0] for r in c.fetchall()]
+    refreshed = 0
+    for chat_id in chat_ids:
+        try:
+            refresh_snapshot(conn, chat_id, period_start, now_ist)
+            refreshed += 1
+        except Exception as e:
+            conn.rollback()
+            print("leaderboard refresh error:", chat_id, e, file=sys.stderr)
+            traceback.print_exc()
+    return refreshed
@@ -0,0 +1,139 @@
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import request, g, Response
+from prometheus_client import (Counter, Histogram, Gauge, CollectorRegistry, REGISTRY,
+                               generate_latest, CONTENT_TYPE_LATEST, multiprocess)
+
+# Prometheus metrics for the whole pipeline. Under gunicorn, set
+# PROMETHEUS_MULTIPROC_DIR (startup.sh does) so every worker writes to shared
+# files and /metrics aggregates across processes; gunicorn.conf.py cleans up
+# after dead workers.
+
+MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+HTTP_SECONDS = Histogram(
+    'gitsync_http_request_seconds', 'Time to answer an HTTP request (webhook accept time = endpoint git_webhook)',
+    ['endpoint', 'status'], buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+STAGE_SECONDS = Histogram(
+    'gitsync_stage_seconds', 'Duration of pipeline stages (compare_fetch, model_call, db_write, telegram_send, ...)',
+    ['stage'], buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80))
+DB_CONNECT_SECONDS = Histogram(
+    'gitsync_db_connect_seconds', 'Time to acquire a Postgres connection',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    'gitsync_executor_queue_depth', 'Background tasks submitted but not started', multiprocess_mode='livesum')
+EXECUTOR_ACTIVE = Gauge(
+    'gitsync_executor_active_threads', 'Background tasks currently running', multiprocess_mode='livesum')
+BACKGROUND_TASKS = Counter(
+    'gitsync_background_tasks_total', 'Background tasks finished', ['task', 'outcome'])
+CACHE_REQUESTS = Counter(
+    'gitsync_cache_requests_total', 'Cache lookups by result', ['cache', 'result'])
+TELEGRAM_REQUESTS = Counter(
+    'gitsync_telegram_requests_total', 'Telegram Bot API calls by method and HTTP status', ['method', 'status'])
+TELEGRAM_RATE_LIMITED = Counter(
+    'gitsync_telegram_rate_limited_total', 'Telegram 429 Too Many Requests responses')
+TELEGRAM_QUEUE_DEPTH = Gauge(
+    'gitsync_telegram_queue_depth', 'Telegram sends queued but not yet attempted', multiprocess_mode='livesum')
+GITHUB_REQUESTS = Counter(
+    'gitsync_github_requests_total', 'GitHub API calls by endpoint and HTTP status', ['endpoint', 'status'])
+GITHUB_RATE_LIMIT_REMAINING = Gauge(
+    'gitsync_github_rate_limit_remaining', 'X-RateLimit-Remaining from the latest GitHub response',
+    multiprocess_mode='mostrecent')
+WEBHOOK_REJECTED = Counter(
+    'gitsync_webhook_rejected_total', 'Webhook requests rejected before parsing, by reason', ['reason'])
+WEBHOOK_DUPLICATES = Counter(
+    'gitsync_webhook_duplicates_total', 'Redelivered webhooks skipped, by where the delivery id was found', ['source'])
+WEBHOOK_EVENTS = Counter(
+    'gitsync_webhook_events_total', 'Authenticated webhooks by event type and outcome (dispatched, ignored, filtered, unlinked, ack)',
+    ['event', 'outcome'])
+MODEL_CALLS = Counter(
+    'gitsync_model_calls_total', 'Model summary attempts by outcome (ok, timeout, error, short_circuit)', ['outcome'])
+MODEL_BREAKER_OPEN = Gauge(
+    'gitsync_model_breaker_open', '1 while the model circuit breaker is open (fallback summaries only)',
+    multiprocess_mode='max')
+CI_BATCH_ROWS = Histogram(
+    'gitsync_ci_batch_rows', 'CI runs written per ci_results batch upsert',
+    buckets=(1, 5, 10, 25, 50, 100, 200, 500, 1000))
+PROMPT_TOKENS = Histogram(
+    'gitsync_prompt_tokens', 'Estimated size of model prompts in tokens',
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 5000, 10000, 50000))
+MODEL_TIER_SECONDS = Histogram(
+    'gitsync_model_tier_seconds', 'Summary latency by commit tier and route (template, fast, pro)',
+    ['tier', 'route'], buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 20, 40, 80))
+MODEL_TOKENS = Counter(
+    'gitsync_model_tokens_total', 'Model tokens used by tier, model and kind (prompt, output)', ['tier', 'model', 'kind'])
+MODEL_COST_USD = Counter(
+    'gitsync_model_cost_usd_total', 'Estimated model spend in USD by tier and model', ['tier', 'model'])
+
+@contextmanager
+def stage_timer(stage):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - t0)
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+def record_github_response(endpoint, response):
+    GITHUB_REQUESTS.labels(endpoint=endpoint, status=str(response.status_code)).inc()
+    remaining = response.headers.get('X-RateLimit-Remaining')
+    if remaining is not None:
+        try:
+            GITHUB_RATE_LIMIT_REMAINING.set(float(remaining))
+        except ValueError:
+            pass
+
+def record_telegram_response(method, status_code):
+    TELEGRAM_REQUESTS.labels(method=method, status=str(status_code)).inc()
+    if status_code == 429:
+        TELEGRAM_RATE_LIMITED.inc()
+
+def track_background(fn):
+    """
+    Wrap a callable for executor.submit: counts it as queued now, active while
+    it runs, and records its outcome when done.
+    """
+    EXECUTOR_QUEUE_DEPTH.inc()
+    name = getattr(fn, '__name__', 'task')
+
+    @wraps(fn)
+    def runner(*args, **kwargs):
+        EXECUTOR_QUEUE_DEPTH.dec()
+        EXECUTOR_ACTIVE.inc()
+        outcome = 'ok'
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            EXECUTOR_ACTIVE.dec()
+            BACKGROUND_TASKS.labels(task=name, outcome=outcome).inc()
+    return runner
+
+def register_metrics(app):
+    """Time every request and expose /metrics on the Flask app."""
+    @app.before_request
+    def _start_timer():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _observe(response):
+        t0 = g.pop('_metrics_t0', None)
+        if t0 is not None and request.endpoint != 'metrics':
+            HTTP_SECONDS.labels(endpoint=request.endpoint or 'unknown', status=str(response.status_code)).observe(time.perf_counter() - t0)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if MULTIPROC:
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
@@ -0,0 +1,61 @@
+# migrate_partition_updates.py
+# One-off: convert an existing heap project_updates table into the monthly
+# range-partitioned layout created by init_db on fresh installs.
+import os
+import psycopg2
+from dotenv import load_dotenv
+from retention import create_partitioned_updates_table, create_summary_tables, ensure_monthly_partitions, has_inline_summary, is_partitioned
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Please set DATABASE_URL environment variable (same one used by your app) and re-run.")
+    raise SystemExit(1)
+
+print("Connecting to database...")
+conn = psycopg2.connect(DATABASE_URL)
+try:
+    with conn.cursor() as c:
+        if is_partitioned(c):
+            print("✅ project_updates is already partitioned. Nothing to do.")
+            raise SystemExit(0)
+        inline_summary = has_inline_summary(c)
+        print("Renaming existing table to project_updates_legacy...")
+        c.execute("ALTER TABLE project_updates RENAME TO project_updates_legacy")
+        c.execute("ALTER INDEX IF EXISTS idx_updates_chat_time RENAME TO idx_updates_legacy_chat_time")
+        print("Creating partitioned table...")
+        create_partitioned_updates_table(c)
+        create_summary_tables(c)
+        c.execute("SELECT MIN(timestamp) FROM project_updates_legacy")
+        oldest = c.fetchone()[0]
+        created = ensure_monthly_partitions(c, start=oldest)
+        print(f"Created {created} monthly partitions.")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_updates_chat_time ON project_updates (chat_id, timestamp DESC)")
+        print("Copying rows...")
+        c.execute("""
+            INSERT INTO project_updates
+            (id, chat_id, author, repo_name, branch_name, files_changed, files_added, files_modified, files_removed, lines_added, lines_removed, timestamp)
+            SELECT id, chat_id, author, repo_name, branch_name, files_changed, files_added, files_modified, files_removed,
+                   COALESCE(lines_added, 0), COALESCE(lines_removed, 0), COALESCE(timestamp, NOW())
+            FROM project_updates_legacy
+        """)
+        print(f"Copied {c.rowcount} rows.")
+        if inline_summary:
+            c.execute("""
+                INSERT INTO update_summaries (update_id, chat_id, created_at, summary)
+                SELECT id, chat_id, COALESCE(timestamp, NOW()), summary
+                FROM project_updates_legacy
+                WHERE summary IS NOT NULL
+                ON CONFLICT (update_id) DO NOTHING
+            """)
+            print(f"Moved {c.rowcount} summaries to update_summaries.")
+        c.execute("SELECT setval(pg_get_serial_sequence('project_updates', 'id'), COALESCE((SELECT MAX(id) FROM project_updates), 1))")
+        conn.commit()
+        print("✅ Migration applied. Verify the dashboard, then DROP TABLE project_updates_legacy.")
+except Exception as e:
+    conn.rollback()
+    print("Migration failed:", e)
+    raise
+finally:
+    conn.close()
@@ -0,0 +1,41 @@
+# migrate_split_summaries.py
+# One-off: move the inline project_updates.summary column into update_summaries
+# so the stats table only carries numeric columns.
+import os
+import psycopg2
+from dotenv import load_dotenv
+from retention import create_summary_tables, has_inline_summary
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Please set DATABASE_URL environment variable (same one used by your app) and re-run.")
+    raise SystemExit(1)
+
+print("Connecting to database...")
+conn = psycopg2.connect(DATABASE_URL)
+try:
+    with conn.cursor() as c:
+        if not has_inline_summary(c):
+            print("✅ project_updates has no inline summary column. Nothing to do.")
+            raise SystemExit(0)
+        create_summary_tables(c)
+        print("Copying summaries to update_summaries...")
+        c.execute("""
+            INSERT INTO update_summaries (update_id, chat_id, created_at, summary)
+            SELECT id, chat_id, COALESCE(timestamp, NOW()), summary
+            FROM project_updates
+            WHERE summary IS NOT NULL
+            ON CONFLICT (update_id) DO NOTHING
+        """)
+        print(f"Moved {c.rowcount} summaries.")
+        c.execute("ALTER TABLE project_updates DROP COLUMN summary")
+        conn.commit()
+        print("✅ Migration applied. Run VACUUM FULL project_updates (or its partitions) off-peak to reclaim space.")
+except Exception as e:
+    conn.rollback()
+    print("Migration failed:", e)
+    raise
+finally:
+    conn.close()
@@ -0,0 +1,211 @@
+import os
+import re
+import html
+import time
+import zlib
+import random
+import threading
+from collections import namedtuple
+
+from model_guard import ModelTimeout
+
+# Model client registry. A backend turns (model name, prompt) into text; the
+# active one is chosen by MODEL_BACKEND (default "gemini") and built once per
+# process. Backends register a factory with register_backend(), so another
+# implementation can be swapped in without touching the call sites;
+# MODEL_BACKEND=stub runs the pipeline offline against StubBackend.
+
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini")
+
+ModelResult = namedtuple('ModelResult', ['text', 'prompt_tokens', 'output_tokens'])
+
+class ModelBackend:
+    """Interface: generate() is required; warm() and validate() are optional."""
+    name = 'base'
+
+    def generate(self, model_name, prompt, deadline, on_partial=None):
+        """
+        Return a ModelResult. deadline is a time.monotonic() value; with
+        on_partial, stream and call on_partial(text_so_far) as text arrives.
+        Raises ModelTimeout when the deadline is missed.
+        """
+        raise NotImplementedError
+
+    def warm(self, model_names):
+        pass
+
+    def validate(self, model_names):
+        """Names from model_names the backend cannot serve (empty when all are fine)."""
+        return []
+
+class GeminiBackend(ModelBackend):
+    """google.generativeai; one GenerativeModel per model name, shared by all threads."""
+    name = 'gemini'
+
+    def __init__(self, api_key=None, endpoint=None):
+        import google.generativeai as genai
+        import requests
+        from google.api_core import exceptions as api_exceptions
+        self._genai = genai
+        # what a missed request timeout surfaces as on the grpc and rest transports
+        self._timeouts = (api_exceptions.DeadlineExceeded, requests.exceptions.Timeout, TimeoutError)
+        api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        endpoint = endpoint or os.getenv("GEMINI_API_ENDPOINT")
+        if api_key:
+            if endpoint:
+                genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': endpoint})
+            else:
+                genai.configure(api_key=api_key)
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, model_name):
+        m = self._models.get(model_name)
+        if m is None:
+            with self._lock:
+                m = self._models.get(model_name)
+                if m is None:
+                    m = self._models[model_name] = self._genai.GenerativeModel(model_name)
+        return m
+
+    def warm(self, model_names):
+        for name in model_names:
+            self.model(name)
+
+    def validate(self, model_names):
+        available = {m.name.split('/', 1)[-1] for m in self._genai.list_models()
+                     if 'generateContent' in m.supported_generation_methods}
+        return [name for name in model_names if name not in available]
+
+    def generate(self, model_name, prompt, deadline, on_partial=None):
+        try:
+            return self._generate(model_name, prompt, deadline, on_partial)
+        except self._timeouts as e:
+            raise ModelTimeout(f"{type(e).__name__}: {e}") from e
+
+    def _generate(self, model_name, prompt, deadline, on_partial):
+        model = self.model(model_name)
+        # per-request socket timeout; the stream loop also checks the overall deadline
+        options = {"timeout": max(deadline - time.monotonic(), 1.0), "retry": None}
+        if on_partial is None:
+            response = model.generate_content(prompt, request_options=options)
+            text, usage = response.text, response.usage_metadata
+        else:
+            text, usage = "", None
+            for chunk in model.generate_content(prompt, stream=True, request_options=options):
+                text += chunk.text
+                usage = chunk.usage_metadata or usage
+                if time.monotonic() > deadline:
+                    raise ModelTimeout("model stream exceeded its deadline")
+                on_partial(text)
+        if not usage:
+            return ModelResult(text, 0, 0)
+        return ModelResult(text, usage.prompt_token_count, usage.candidates_token_count)
+
+class StubBackend(ModelBackend):
+    """
+    Deterministic local model for tests and benchmarks (MODEL_BACKEND=stub).
+    The summary is derived from the prompt's commit message and file list in
+    the same HTML shape the real model returns; timing is STUB_MODEL_LATENCY_MS
+    to the first token plus STUB_MODEL_TOKENS_PER_SEC for the rest, and
+    STUB_MODEL_FAILURE_RATE of the calls fail after the first-token latency.
+    """
+    name = 'stub'
+    STATUSES = ("✅ Looks good", "✅ Looks good", "⚠️ Needs a closer look", "✅ Safe to merge")
+    MAX_FILES = 5
+
+    def __init__(self, latency_ms=None, tokens_per_sec=None, failure_rate=None, seed=None):
+        self.latency_ms = float(os.getenv("STUB_MODEL_LATENCY_MS", "200") if latency_ms is None else latency_ms)
+        self.tokens_per_sec = float(os.getenv("STUB_MODEL_TOKENS_PER_SEC", "100") if tokens_per_sec is None else tokens_per_sec)
+        self.failure_rate = float(os.getenv("STUB_MODEL_FAILURE_RATE", "0") if failure_rate is None else failure_rate)
+        self._rng = random.Random(int(os.getenv("STUB_MODEL_SEED", "0")) if seed is None else seed)
+        self._lock = threading.Lock()
+
+    def summary(self, prompt):
+        m = re.search(r"COMMIT MESSAGE: (.*)", prompt)
+        title = (m.group(1).strip().rstrip('.') if m else "") or "No message"
+        files = re.findall(r"^\s+- (\S+)", prompt, re.M)
+        digest = zlib.crc32(prompt.encode())
+        context = "\n".join(f"• <code>{html.escape(f)}</code> updated" for f in files[:self.MAX_FILES]) or "• No files listed"
+        if len(files) > self.MAX_FILES:
+            context += f"\n• …and {len(files) - self.MAX_FILES} more"
+        return (
+            f"<b>Review Status:</b> {self.STATUSES[digest % len(self.STATUSES)]}\n"
+            f"<b>Summary:</b> {html.escape(title)}.\n"
+            f"<b>Technical Context:</b>\n{context}"
+        )
+
+    def _sleep(self, seconds, deadline):
+        if time.monotonic() + seconds > deadline:
+            time.sleep(max(deadline - time.monotonic(), 0))
+            raise ModelTimeout("stub model exceeded its deadline")
+        time.sleep(seconds)
+
+    def generate(self, model_name, prompt, deadline, on_partial=None):
+        self._sleep(self.latency_ms / 1000.0, deadline)
+        with self._lock:
+            failed = self._rng.random() < self.failure_rate
+        if failed:
+            raise RuntimeError("stub model: injected failure (503)")
+        text = self.summary(prompt)
+        output_tokens = max(len(text) // 4, 1)
+        per_token = 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+        if on_partial is None:
+            self._sleep(output_tokens * per_token, deadline)
+        else:
+            # stream roughly a dozen chunks, each after its share of the generation time
+            words = re.findall(r"\S+\s*", text)
+            step = max(len(words) // 12, 1)
+            done = ""
+            for k in range(0, len(words), step):
+                piece = "".join(words[k:k + step])
+                self._sleep(max(len(piece) // 4, 1) * per_token, deadline)
+                done += piece
+                on_partial(done)
+        return ModelResult(text, max(len(prompt) // 4, 1), output_tokens)
+
+_factories = {'gemini': GeminiBackend, 'stub': StubBackend}
+_backend = None
+_backend_lock = threading.Lock()
+
+def register_backend(name, factory):
+    """factory() -> ModelBackend; selectable with MODEL_BACKEND=name."""
+    _factories[name] = factory
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                factory = _factories.get(MODEL_BACKEND)
+                if factory is None:
+                    raise ValueError(f"Unknown MODEL_BACKEND {MODEL_BACKEND!r} (known: {', '.join(sorted(_factories))})")
+                _backend = factory()
+    return _backend
+
+def set_backend(backend):
+    """Replace the process-wide backend (tests, benchmarks); returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+def warm_models(model_names):
+    """Build the backend and its model clients now instead of on the first push."""
+    try:
+        get_backend().warm(model_names)
+    except Exception as e:
+        print("warm_models error:", e)
+
+def validate_models(model_names):
+    """Check the configured models exist; logs and returns False on a miss (never raises)."""
+    try:
+        missing = get_backend().validate(model_names)
+    except Exception as e:
+        print("validate_models error:", e)
+        return False
+    if missing:
+        print(f"⚠️ Model(s) not available on the {get_backend().name} backend: {', '.join(missing)}")
+        return False
+    print(f"Models OK on the {get_backend().name} backend: {', '.join(model_names)}")
+    return True
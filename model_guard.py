@@ -0,0 +1,117 @@
+import os
+import html
+import time
+import threading
+
+from metrics import MODEL_CALLS, MODEL_BREAKER_OPEN
+
+# Guard around the model call. Every call gets a deadline (MODEL_TIMEOUT), and
+# a circuit breaker opens after MODEL_BREAKER_FAILURES consecutive failures:
+# while open, summaries come from fallback_summary() without touching the
+# model, so a slow or down Gemini cannot tie up the background executor.
+# After MODEL_BREAKER_RESET seconds a single probe call is let through; its
+# result closes the breaker again or restarts the wait.
+
+MODEL_TIMEOUT = float(os.getenv("MODEL_TIMEOUT", "30"))
+MODEL_BREAKER_FAILURES = int(os.getenv("MODEL_BREAKER_FAILURES", "3"))
+MODEL_BREAKER_RESET = float(os.getenv("MODEL_BREAKER_RESET", "60"))
+FALLBACK_MAX_FILES = 10
+FALLBACK_STATUS = "⚙️ Automatic summary (AI review unavailable)"
+
+class ModelTimeout(Exception):
+    pass
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=MODEL_BREAKER_FAILURES, reset_timeout=MODEL_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """True if a model call may go ahead (always when closed; one probe after the reset wait)."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+        MODEL_BREAKER_OPEN.set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if not self._probing and self._failures < self.failure_threshold:
+                return
+            if self._opened_at is None:
+                print(f"Model circuit breaker open after {self._failures} failures; using fallback summaries.")
+            self._opened_at = time.monotonic()
+            self._probing = False
+        MODEL_BREAKER_OPEN.set(1)
+
+model_breaker = CircuitBreaker()
+
+def guarded_model_call(call, fallback):
+    """
+    Run call(deadline) under the breaker; deadline is a time.monotonic() value
+    the call must respect. Any failure (or an open breaker) returns fallback().
+    """
+    if not model_breaker.allow():
+        MODEL_CALLS.labels(outcome='short_circuit').inc()
+        return fallback()
+    try:
+        result = call(time.monotonic() + MODEL_TIMEOUT)
+    except Exception as e:
+        # backends translate their transport's timeout errors into ModelTimeout
+        MODEL_CALLS.labels(outcome='timeout' if isinstance(e, (ModelTimeout, TimeoutError)) else 'error').inc()
+        model_breaker.record_failure()
+        print("model call error:", e)
+        return fallback()
+    MODEL_CALLS.labels(outcome='ok').inc()
+    model_breaker.record_success()
+    return result
+
+def _file_line(label, files):
+    shown = ", ".join(f"<code>{html.escape(f)}</code>" for f in files[:FALLBACK_MAX_FILES])
+    more = f" (+{len(files) - FALLBACK_MAX_FILES} more)" if len(files) > FALLBACK_MAX_FILES else ""
+    return f"• {label} ({len(files)}): {shown}{more}"
+
+def fallback_summary(commit, files_changed, status=FALLBACK_STATUS):
+    """Summary in the model's output format built only from the commit (events.Commit) itself (no AI)."""
+    message = (commit.message or 'No message.').strip()
+    title = message.splitlines()[0] if message else 'No message.'
+    added, modified, removed = list(commit.added), list(commit.modified), list(commit.removed)
+
+    lines = []
+    if added or modified or removed:
+        for label, files in (("Added", added), ("Modified", modified), ("Removed", removed)):
+            if files:
+                lines.append(_file_line(label, files))
+    elif files_changed:
+        lines.append(_file_line("Changed", list(files_changed)))
+    else:
+        lines.append("• No file list in the payload")
+
+    return (
+        f"<b>Review Status:</b> {status}\n"
+        f"<b>Summary:</b> {html.escape(title)}\n"
+        "<b>Technical Context:</b>\n" + "\n".join(lines)
+    )
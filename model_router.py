@@ -0,0 +1,104 @@
+import os
+import re
+
+from metrics import MODEL_TIER_SECONDS, MODEL_TOKENS, MODEL_COST_USD
+from model_guard import fallback_summary
+from prompt_builder import PROMPT_TOKEN_BUDGET
+
+# Model tiering: each commit is classified before summarizing and routed to
+# the cheapest thing that does the job. Merge commits get a rule-based
+# template (nothing new to review), trivial and docs-only commits go to the
+# fast model, everything else to the pro model. Large refactors go to the pro
+# model with a bigger prompt budget so more of the file list survives.
+#
+# On the compare path the files and line counts cover the whole push, not
+# the head commit, so only the diff is used there: a "Merge pull request"
+# head says nothing about the changes the push carries.
+
+PRO_MODEL_NAME = os.getenv("PRO_MODEL_NAME", "gemini-2.5-pro")
+FAST_MODEL_NAME = os.getenv("FAST_MODEL_NAME", "gemini-2.5-flash")
+TRIVIAL_MAX_FILES = int(os.getenv("TRIVIAL_MAX_FILES", "2"))
+TRIVIAL_MAX_LINES = int(os.getenv("TRIVIAL_MAX_LINES", "10"))
+LARGE_MIN_FILES = int(os.getenv("LARGE_MIN_FILES", "25"))
+LARGE_MIN_LINES = int(os.getenv("LARGE_MIN_LINES", "500"))
+LARGE_PROMPT_TOKEN_BUDGET = int(os.getenv("LARGE_PROMPT_TOKEN_BUDGET", "6000"))
+
+# tier -> route; a route is 'template' or a key of ROUTE_MODELS
+TIER_ROUTES = {
+    'merge': 'template',
+    'docs': 'fast',
+    'trivial': 'fast',
+    'standard': 'pro',
+    'large': 'pro',
+}
+ROUTE_MODELS = {'fast': FAST_MODEL_NAME, 'pro': PRO_MODEL_NAME}
+# tier -> prompt token budget; tiers not listed use PROMPT_TOKEN_BUDGET
+TIER_PROMPT_BUDGETS = {'large': LARGE_PROMPT_TOKEN_BUDGET}
+
+# USD per million tokens (input, output); override with MODEL_PRICE_<MODEL>="in,out"
+MODEL_PRICES = {
+    'gemini-2.5-pro': (1.25, 10.0),
+    'gemini-2.5-flash': (0.30, 2.50),
+    'gemini-2.5-flash-lite': (0.10, 0.40),
+}
+
+_MERGE_MESSAGE = re.compile(r"^Merge (pull request|branch|remote-tracking branch|tag|commit) ")
+_TRIVIAL_MESSAGE = re.compile(r"\b(typo|whitespace|formatting|lint|bump|version|rename|comment)s?\b", re.I)
+_DOC_PATH = re.compile(
+    r"(^|/)(docs?|documentation)/|\.(md|mdx|rst|txt|adoc)$|(^|/)(README|CHANGELOG|LICENSE|CONTRIBUTING|AUTHORS)[^/]*$",
+    re.I)
+
+def classify_commit(commit, files_changed, lines_changed=None):
+    """
+    'merge', 'docs', 'trivial', 'large' or 'standard'. lines_changed (additions
+    + deletions) is only known on the compare path, where files_changed is the
+    diff of the whole push; the message rules are skipped there and the tier
+    comes from the diff alone. Without it trivial relies on the commit message.
+    """
+    per_commit = lines_changed is None
+    message = (commit.message or '').strip() if per_commit else ''
+    files = list(files_changed)
+    if _MERGE_MESSAGE.match(message):
+        return 'merge'
+    if files and all(_DOC_PATH.search(f) for f in files):
+        return 'docs'
+    if len(files) >= LARGE_MIN_FILES or (lines_changed is not None and lines_changed >= LARGE_MIN_LINES):
+        return 'large'
+    if len(files) <= TRIVIAL_MAX_FILES:
+        if not per_commit and lines_changed <= TRIVIAL_MAX_LINES:
+            return 'trivial'
+        if per_commit and _TRIVIAL_MESSAGE.search(message.splitlines()[0] if message else ''):
+            return 'trivial'
+    return 'standard'
+
+def route_for(tier):
+    """(route, model name or None for the template route)."""
+    route = TIER_ROUTES.get(tier, 'pro')
+    return route, ROUTE_MODELS.get(route)
+
+def prompt_budget(tier):
+    return TIER_PROMPT_BUDGETS.get(tier, PROMPT_TOKEN_BUDGET)
+
+def template_summary(tier, commit, files_changed):
+    status = "🔀 Merge commit (no review needed)" if tier == 'merge' else "📝 Summary generated from commit metadata"
+    return fallback_summary(commit, files_changed, status=status)
+
+def model_price(model_name):
+    override = os.getenv("MODEL_PRICE_" + re.sub(r"[^A-Za-z0-9]", "_", model_name).upper())
+    if override:
+        try:
+            price_in, price_out = (float(x) for x in override.split(','))
+            return price_in, price_out
+        except ValueError:
+            pass
+    # unknown models are costed at pro prices rather than as free
+    return MODEL_PRICES.get(model_name, MODEL_PRICES['gemini-2.5-pro'])
+
+def record_tier_latency(tier, route, seconds):
+    MODEL_TIER_SECONDS.labels(tier=tier, route=route).observe(seconds)
+
+def record_usage(tier, model_name, prompt_tokens, output_tokens):
+    MODEL_TOKENS.labels(tier=tier, model=model_name, kind='prompt').inc(prompt_tokens)
+    MODEL_TOKENS.labels(tier=tier, model=model_name, kind='output').inc(output_tokens)
+    price_in, price_out = model_price(model_name)
+    MODEL_COST_USD.labels(tier=tier, model=model_name).inc((prompt_tokens * price_in + output_tokens * price_out) / 1e6)
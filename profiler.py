@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from collections import Counter
+from functools import wraps
+
+# Opt-in sampling profiler for the heavy paths (dashboard render, push
+# processing). An admin starts a session for one target for N seconds or N
+# calls; while it is active, every thread running that target is sampled via
+# sys._current_frames() and the stacks are written in collapsed format
+# ("root;caller;callee count"), ready for flamegraph.pl / speedscope.
+#
+# Sessions are shared between gunicorn workers through a control file in
+# PROFILE_DIR (same idea as the maintenance flag file); each worker writes its
+# own <session>-<pid>.collapsed file and profile_result() merges them.
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/gitsync_profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "600"))
+CONTROL_FILE = os.path.join(PROFILE_DIR, "active.json")
+
+TARGETS = set()          # names registered through @profiled(...)
+_marked = {}             # thread ident -> target name, only while a session is active
+_stacks = Counter()      # collapsed stack -> samples (this process, current session)
+_lock = threading.Lock()
+_sampler = None
+_sampler_session_id = None
+_session_cache = {'mtime': None, 'session': None}
+
+def _read_session():
+    """Active session dict or None; the control file is re-read only when it changes."""
+    try:
+        mtime = os.stat(CONTROL_FILE).st_mtime_ns
+    except OSError:
+        _session_cache.update(mtime=None, session=None)
+        return None
+    if mtime != _session_cache['mtime']:
+        try:
+            with open(CONTROL_FILE) as f:
+                session = json.load(f)
+        except Exception:
+            session = None
+        _session_cache.update(mtime=mtime, session=session)
+    session = _session_cache['session']
+    if not session or time.time() >= session['until']:
+        return None
+    if session.get('max_calls') and _calls_done(session['id']) >= session['max_calls']:
+        return None
+    return session
+
+def _calls_path(session_id):
+    return os.path.join(PROFILE_DIR, f"{session_id}.calls")
+
+def _calls_done(session_id):
+    try:
+        return os.path.getsize(_calls_path(session_id))
+    except OSError:
+        return 0
+
+def _result_path(session_id, pid=None):
+    return os.path.join(PROFILE_DIR, f"{session_id}-{pid or os.getpid()}.collapsed")
+
+def start_profile(target, seconds=None, calls=None, interval_ms=None):
+    """Begin a session; returns its dict. Raises ValueError on bad arguments."""
+    if target not in TARGETS:
+        raise ValueError(f"unknown target {target!r}; choose from {', '.join(sorted(TARGETS))}")
+    if not seconds and not calls:
+        raise ValueError("give seconds or calls")
+    seconds = min(int(seconds or PROFILE_MAX_SECONDS), PROFILE_MAX_SECONDS)
+    now = time.time()
+    session = {
+        'id': uuid.uuid4().hex[:12],
+        'target': target,
+        'started': now,
+        'until': now + seconds,
+        'max_calls': int(calls) if calls else None,
+        'interval_ms': float(interval_ms or PROFILE_INTERVAL_MS)
+    }
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    tmp = CONTROL_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(session, f)
+    os.replace(tmp, CONTROL_FILE)
+    return session
+
+def stop_profile():
+    """End the active session early (samples collected so far are kept)."""
+    try:
+        with open(CONTROL_FILE) as f:
+            session = json.load(f)
+    except Exception:
+        return None
+    session['until'] = time.time()
+    tmp = CONTROL_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(session, f)
+    os.replace(tmp, CONTROL_FILE)
+    return session
+
+def profile_status():
+    """Last session (active or not) with call count and the workers that produced samples."""
+    try:
+        with open(CONTROL_FILE) as f:
+            session = json.load(f)
+    except Exception:
+        return {'active': False}
+    prefix = f"{session['id']}-"
+    workers = [n[len(prefix):-len(".collapsed")] for n in os.listdir(PROFILE_DIR)
+               if n.startswith(prefix) and n.endswith(".collapsed")]
+    return dict(session, active=_read_session() is not None,
+                calls_done=_calls_done(session['id']), workers=workers)
+
+def profile_result(session_id):
+    """Collapsed stacks for a session, merged across worker processes."""
+    merged = Counter()
+    prefix = f"{session_id}-"
+    for name in os.listdir(PROFILE_DIR):
+        if not (name.startswith(prefix) and name.endswith(".collapsed")):
+            continue
+        with open(os.path.join(PROFILE_DIR, name)) as f:
+            for line in f:
+                stack, _, count = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    merged[stack] += int(count)
+    return "".join(f"{stack} {count}\n" for stack, count in merged.most_common())
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _collapse(target, frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(target)
+    return ";".join(reversed(labels))
+
+def _flush(session_id):
+    with _lock:
+        lines = "".join(f"{stack} {count}\n" for stack, count in _stacks.items())
+    if not lines:
+        return
+    tmp = _result_path(session_id) + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(lines)
+    os.replace(tmp, _result_path(session_id))
+
+def _sample_loop(session):
+    global _sampler
+    interval = session['interval_ms'] / 1000.0
+    me = threading.get_ident()
+    last_flush = time.monotonic()
+    try:
+        while True:
+            current = _read_session()
+            if current is None or current['id'] != session['id']:
+                break
+            frames = sys._current_frames()
+            with _lock:
+                for ident, target in list(_marked.items()):
+                    frame = frames.get(ident)
+                    if frame is not None and ident != me:
+                        _stacks[_collapse(target, frame)] += 1
+            if time.monotonic() - last_flush >= 1.0:
+                _flush(session['id'])
+                last_flush = time.monotonic()
+            time.sleep(interval)
+    except Exception as e:
+        print("profiler sample error:", e)
+    finally:
+        _flush(session['id'])
+        with _lock:
+            _stacks.clear()
+            _sampler = None
+
+def _ensure_sampler(session):
+    global _sampler, _sampler_session_id
+    with _lock:
+        if _sampler is not None:
+            return
+        if _sampler_session_id != session['id']:
+            _stacks.clear()
+            _sampler_session_id = session['id']
+        _sampler = threading.Thread(target=_sample_loop, args=(session,), daemon=True, name="profiler")
+        _sampler.start()
+
+def profiled(target):
+    """Mark a function as a profiling target; costs one stat() per call when no session is active."""
+    TARGETS.add(target)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            session = _read_session()
+            if session is None or session['target'] != target:
+                return fn(*args, **kwargs)
+            ident = threading.get_ident()
+            _ensure_sampler(session)
+            with _lock:
+                _marked[ident] = target
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with _lock:
+                    _marked.pop(ident, None)
+                try:
+                    with open(_calls_path(session['id']), "a") as f:
+                        f.write(".")
+                except OSError:
+                    pass
+        return wrapper
+    return decorator
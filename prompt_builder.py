@@ -0,0 +1,120 @@
+import os
+import math
+from collections import defaultdict
+
+from metrics import PROMPT_TOKENS
+
+# Prompt construction under a token budget. The commit message gets a fixed
+# share of the budget; files are ranked by churn (additions + deletions from
+# the compare API, when known) and listed one per line while room is left,
+# then the remainder is collapsed into per-directory lines with file counts
+# and churn, so a push touching thousands of paths still yields a small prompt.
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+MESSAGE_BUDGET_SHARE = 0.25
+LISTED_FILES_SHARE = 0.6      # of what is left for files; the rest is for directory lines
+CHARS_PER_TOKEN = 4
+
+PROMPT_TEMPLATE = """
+    You are an AI Code Reviewer. Analyze this commit data.
+    COMMIT DATA: COMMIT MESSAGE: {message}
+    FILES CHANGED ({file_count}):
+{files}
+
+    INSTRUCTIONS:
+    1. Return valid HTML ONLY.
+    2. Telegram does NOT support <ul>, <ol>, or <li> tags. DO NOT USE THEM.
+    3. Use the text character "•" for bullet points.
+    4. Use <br> or newlines for line breaks.
+    5. Use <b> for bold, <i> for italic, <code> for code.
+
+    OUTPUT FORMAT:
+    <b>Review Status:</b> [Status]
+    <b>Summary:</b> [One sentence summary]
+    <b>Technical Context:</b> [List files using • bullet points]
+    """
+
+def estimate_tokens(text):
+    # ~4 characters per token for English/code; only used for budgeting, not billing
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+def _churn(stats, path):
+    if not stats or path not in stats:
+        return 0
+    return stats[path][0] + stats[path][1]
+
+def _file_line(path, stats):
+    if stats and path in stats:
+        additions, deletions, status = stats[path]
+        tag = f" [{status}]" if status not in ('modified', None) else ""
+        return f"    - {path} (+{additions}/-{deletions}){tag}"
+    return f"    - {path}"
+
+def _directory(path, depth):
+    parts = path.split('/')[:-1]
+    if depth == 0 or not parts:
+        return "(other files)" if depth == 0 else "(repository root)"
+    return '/'.join(parts[:depth]) + '/'
+
+def _directory_lines(paths, stats, depth):
+    groups = defaultdict(lambda: [0, 0, 0])     # dir -> [files, additions, deletions]
+    for p in paths:
+        g = groups[_directory(p, depth)]
+        g[0] += 1
+        if stats and p in stats:
+            g[1] += stats[p][0]
+            g[2] += stats[p][1]
+    ranked = sorted(groups.items(), key=lambda kv: (-(kv[1][1] + kv[1][2]), -kv[1][0], kv[0]))
+    lines = []
+    for name, (count, additions, deletions) in ranked:
+        churn = f", +{additions}/-{deletions}" if stats else ""
+        lines.append(f"    - {name} ({count} files{churn})")
+    return lines
+
+def compact_file_list(files, stats=None, budget_tokens=PROMPT_TOKEN_BUDGET):
+    """
+    Lines describing the changed files within budget_tokens: the highest-churn
+    files individually, the rest grouped by directory (depth 2, then 1, then a
+    single line). Returns (lines, number of files listed individually).
+    """
+    ranked = sorted(files, key=lambda p: -_churn(stats, p)) if stats else list(files)
+    lines = []
+    used = 0
+    listed_budget = budget_tokens * LISTED_FILES_SHARE if len(ranked) > 1 else budget_tokens
+    for path in ranked:
+        cost = estimate_tokens(_file_line(path, stats)) + 1
+        if used + cost > listed_budget:
+            break
+        lines.append(_file_line(path, stats))
+        used += cost
+    listed = len(lines)
+    rest = ranked[listed:]
+    if rest:
+        for depth in (2, 1, 0):
+            group_lines = _directory_lines(rest, stats, depth)
+            if depth == 0 or sum(estimate_tokens(l) + 1 for l in group_lines) <= budget_tokens - used:
+                break
+        lines.extend(group_lines)
+    return lines, listed
+
+def truncate_to_tokens(text, max_tokens):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+def build_prompt(commit, files_changed, stats=None, budget_tokens=PROMPT_TOKEN_BUDGET):
+    """
+    Prompt for one commit (or a whole push on the compare path) within
+    budget_tokens. Returns (prompt, info) where info has the estimated token
+    count and how many files were listed vs collapsed.
+    """
+    files = list(files_changed)
+    fixed = estimate_tokens(PROMPT_TEMPLATE)
+    message = truncate_to_tokens((commit.message or 'No message.').strip(),
+                                 int(budget_tokens * MESSAGE_BUDGET_SHARE))
+    files_budget = max(budget_tokens - fixed - estimate_tokens(message), 50)
+    lines, listed = compact_file_list(files, stats, files_budget)
+    prompt = PROMPT_TEMPLATE.format(message=message, file_count=len(files), files="\n".join(lines) or "    (none)")
+    info = {"tokens": estimate_tokens(prompt), "files": len(files), "files_listed": listed,
+            "files_collapsed": len(files) - listed}
+    PROMPT_TOKENS.observe(info["tokens"])
+    return prompt, info
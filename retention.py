@@ -0,0 +1,153 @@
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+
+# project_updates is range-partitioned by month on `timestamp` and holds only
+# numeric stats; the AI summary HTML lives in update_summaries keyed by the
+# update id. Old rows keep their stats forever; only the summary is moved into
+# a zlib-compressed archive once it falls outside the retention window.
+
+SUMMARY_RETENTION_DAYS = int(os.getenv("SUMMARY_RETENTION_DAYS", "180"))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+def create_partitioned_updates_table(c):
+    """Create the narrow partitioned stats table and its DEFAULT partition."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS project_updates (
+            id BIGSERIAL,
+            chat_id TEXT NOT NULL,
+            author TEXT,
+            repo_name TEXT,
+            branch_name TEXT,
+            files_changed INTEGER DEFAULT 0,
+            files_added INTEGER DEFAULT 0,
+            files_modified INTEGER DEFAULT 0,
+            files_removed INTEGER DEFAULT 0,
+            lines_added INTEGER DEFAULT 0,
+            lines_removed INTEGER DEFAULT 0,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    ''')
+    # catches rows outside every monthly partition (e.g. the job did not run)
+    c.execute("CREATE TABLE IF NOT EXISTS project_updates_default PARTITION OF project_updates DEFAULT")
+
+def create_summary_tables(c):
+    """Side table for summary text (referenced by project_updates.id) and its archive."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS update_summaries (
+            update_id BIGINT PRIMARY KEY,
+            chat_id TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            summary TEXT NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_update_summaries_created ON update_summaries (created_at)")
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS project_updates_archive (
+            update_id BIGINT NOT NULL,
+            chat_id TEXT NOT NULL,
+            timestamp TIMESTAMP WITH TIME ZONE NOT NULL,
+            summary_z BYTEA NOT NULL,
+            archived_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (update_id, timestamp)
+        )
+    ''')
+
+def has_inline_summary(c):
+    """True if project_updates still carries the pre-split summary column."""
+    c.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'project_updates' AND column_name = 'summary'
+    """)
+    return c.fetchone() is not None
+
+def is_partitioned(c):
+    c.execute("SELECT relkind FROM pg_class WHERE relname = 'project_updates' AND relkind IN ('r', 'p')")
+    r = c.fetchone()
+    return bool(r) and r[0] == 'p'
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+def add_months(dt, n):
+    y, m = divmod(dt.month - 1 + n, 12)
+    return dt.replace(year=dt.year + y, month=m + 1, day=1)
+
+def partition_name(lo):
+    return f"project_updates_y{lo.year}m{lo.month:02d}"
+
+def ensure_monthly_partitions(c, start=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Create monthly partitions from `start` up to `months_ahead` months past now.
+    Rows already sitting in the DEFAULT partition for a new month are moved into it.
+    Workers starting together serialize on an advisory lock held until the
+    caller commits, so only one of them creates each partition.
+    """
+    c.execute("SELECT pg_advisory_xact_lock(hashtext('project_updates_partitions'))")
+    now = month_start(datetime.now(timezone.utc))
+    lo = month_start(start) if start else now
+    last = add_months(now, months_ahead)
+    created = 0
+    while lo <= last:
+        hi = add_months(lo, 1)
+        name = partition_name(lo)
+        c.execute("SELECT 1 FROM pg_class WHERE relname = %s", (name,))
+        if not c.fetchone():
+            c.execute(f"CREATE TABLE IF NOT EXISTS {name} (LIKE project_updates INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            c.execute(f"""
+                WITH moved AS (
+                    DELETE FROM project_updates_default
+                    WHERE timestamp >= %s AND timestamp < %s
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """, (lo, hi))
+            c.execute(f"ALTER TABLE project_updates ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", (lo, hi))
+            created += 1
+        lo = hi
+    return created
+
+def archive_old_summaries(conn, retention_days=SUMMARY_RETENTION_DAYS, batch_size=ARCHIVE_BATCH_SIZE):
+    """Compress summaries older than the retention window into project_updates_archive."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        with conn.cursor() as c:
+            c.execute("""
+                SELECT update_id, chat_id, created_at, summary FROM update_summaries
+                WHERE created_at < %s
+                ORDER BY created_at
+                LIMIT %s
+            """, (cutoff, batch_size))
+            rows = c.fetchall()
+            if not rows:
+                break
+            for update_id, chat_id, ts, summary in rows:
+                c.execute("""
+                    INSERT INTO project_updates_archive (update_id, chat_id, timestamp, summary_z)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (update_id, timestamp) DO NOTHING
+                """, (update_id, chat_id, ts, zlib.compress(summary.encode('utf-8'), 9)))
+            c.execute("DELETE FROM update_summaries WHERE update_id = ANY(%s)", ([r[0] for r in rows],))
+        conn.commit()
+        archived += len(rows)
+    return archived
+
+def get_archived_summary(c, update_id, ts):
+    c.execute("SELECT summary_z FROM project_updates_archive WHERE update_id = %s AND timestamp = %s", (update_id, ts))
+    r = c.fetchone()
+    return zlib.decompress(bytes(r[0])).decode('utf-8') if r else None
+
+def run_retention(conn):
+    """Maintenance job: roll partitions forward and archive old summaries."""
+    with conn.cursor() as c:
+        if not is_partitioned(c):
+            print("project_updates is not partitioned; run migrate_partition_updates.py first.", file=sys.stderr)
+            return 0, 0
+        created = ensure_monthly_partitions(c)
+    conn.commit()
+    archived = archive_old_summaries(conn)
+    return created, archived
@@ -1,5 +1,4 @@
 # GitSync final server file (copy-paste)
-import google.generativeai as genai
 from flask import Flask, request, jsonify, redirect, render_template_string
 from dotenv import load_dotenv
 import os
@@ -19,14 +18,45 @@ import random
 from cryptography.fernet import Fernet
 from psycopg2.extras import RealDictCursor
 from flask import render_template
+import threading
+from leaderboard import init_leaderboard_tables, mark_leaderboard_dirty, refresh_snapshot, get_leaderboard, refresh_dirty_snapshots
+from retention import create_partitioned_updates_table, create_summary_tables, has_inline_summary, ensure_monthly_partitions, is_partitioned, run_retention
+from maintenance import require_admin_key
+from webhook_recorder import record_webhook
+from webhook_auth import WebhookSecretCache
+from webhook_dedup import DeliveryDedup, init_delivery_table, claim_delivery, release_delivery
+from event_subscriptions import SubscriptionCache, Subscription, init_subscription_table
+from ci_results import CIBatcher, init_ci_table
+from events import Commit
+import flows
+from flows import run_sync
+from telegram_html import sanitize_telegram_html, split_telegram_html, html_to_text, TELEGRAM_MESSAGE_LIMIT
+from telegram_stream import StreamingMessage
+from telegram_queue import configure_send_queue, enqueue_send, queue_depth as send_queue_depth
+from metrics import (register_metrics, stage_timer, track_background, record_telegram_response,
+                     record_github_response, DB_CONNECT_SECONDS)
+from profiler import profiled, start_profile, stop_profile, profile_status, profile_result
+from model_guard import guarded_model_call, fallback_summary, model_breaker
+from model_backends import get_backend, warm_models, validate_models
+from model_router import (classify_commit, route_for, prompt_budget, template_summary, record_tier_latency,
+                          record_usage, PRO_MODEL_NAME, ROUTE_MODELS)
+from prompt_builder import build_prompt
+from tracing import register_tracing, span, http_span, record_http_status, propagate_context, TracedCursor
+import time
 
 # Initialize thread pool
 executor = ThreadPoolExecutor(max_workers=5)
 
+def submit_background(fn, *args):
+    """executor.submit with queue-depth / active-thread metrics and the caller's trace context."""
+    return executor.submit(track_background(propagate_context(fn)), *args)
+
 # Load env
 load_dotenv()
 
 app = Flask(__name__)
+register_metrics(app)
+register_tracing(app)
 
 @app.route('/', methods=['GET'])
 def home():
@@ -38,21 +68,38 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 TELEGRAM_BOT_TOKEN_FOR_COMMANDS = os.getenv("TELEGRAM_BOT_TOKEN_FOR_COMMANDS")
 APP_BASE_URL = os.getenv("APP_BASE_URL")
 DATABASE_URL = os.getenv("DATABASE_URL")
-MODEL_NAME = 'gemini-2.5-pro'
-TELEGRAM_API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+MODEL_NAME = PRO_MODEL_NAME
+MODEL_TIERS = sorted(set(ROUTE_MODELS.values()))
+# API base URLs are overridable so benchmarks can point at local stand-ins
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+TELEGRAM_TIMEOUT = int(os.getenv("TELEGRAM_TIMEOUT", "15"))
+# longer reports go out as one message + a document attachment
+TELEGRAM_MAX_PARTS = int(os.getenv("TELEGRAM_MAX_PARTS", "4"))
+# post the push header at once and edit it as the model streams its summary
+STREAM_SUMMARIES = os.getenv("STREAM_SUMMARIES", "0") == "1"
 BOT_USERNAME = os.getenv("BOT_USERNAME")
 FERNET_KEY = os.getenv("FERNET_KEY")
 fernet = Fernet(FERNET_KEY.encode()) if FERNET_KEY else None
 
-if GOOGLE_API_KEY:
-    genai.configure(api_key=GOOGLE_API_KEY)
+# model clients are built once per process (model_backends.get_backend)
+warm_models(MODEL_TIERS)
 
 IST = pytz.timezone('Asia/Kolkata')
+# Dashboard look-back windows; keep queries bounded so old partitions are pruned.
+# The org title and activity feed fall back to the unbounded query for a quiet chat.
+DASHBOARD_RECENT_DAYS = int(os.getenv("DASHBOARD_RECENT_DAYS", "30"))
+# total_members counts every author the chat has ever had; set DASHBOARD_MEMBER_DAYS
+# to count only authors active in that window (prunes old partitions on big chats)
+DASHBOARD_MEMBER_DAYS = int(os.getenv("DASHBOARD_MEMBER_DAYS", "0"))
 
 # --- DB ---
 def get_db_connection():
+    t0 = time.perf_counter()
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = psycopg2.connect(DATABASE_URL, cursor_factory=TracedCursor)
+        DB_CONNECT_SECONDS.observe(time.perf_counter() - t0)
         return conn
     except Exception as e:
         print("DB connection error:", e, file=sys.stderr)
@@ -65,24 +112,18 @@ def init_db():
         return
     try:
         c = conn.cursor()
-        # project_updates
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS project_updates (
-                id SERIAL PRIMARY KEY,
-                chat_id TEXT NOT NULL,
-                author TEXT,
-                repo_name TEXT,
-                branch_name TEXT,
-                summary TEXT,
-                files_changed INTEGER DEFAULT 0,
-                files_added INTEGER DEFAULT 0,
-                files_modified INTEGER DEFAULT 0,
-                files_removed INTEGER DEFAULT 0,
-                lines_added INTEGER DEFAULT 0,
-                lines_removed INTEGER DEFAULT 0,
-                timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        # project_updates (monthly range partitions, see retention.py)
+        c.execute("SELECT 1 FROM pg_class WHERE relname = 'project_updates'")
+        if not c.fetchone():
+            create_partitioned_updates_table(c)
+        if is_partitioned(c):
+            ensure_monthly_partitions(c)
+        else:
+            print("⚠️ project_updates is not partitioned; run migrate_partition_updates.py.")
+        # summary text lives in a side table so the stats rows stay narrow
+        create_summary_tables(c)
+        if has_inline_summary(c):
+            print("⚠️ project_updates still has an inline summary column; run migrate_split_summaries.py.")
         # webhooks
         c.execute('''
             CREATE TABLE IF NOT EXISTS webhooks (
@@ -91,6 +132,8 @@ def init_db():
                 created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        # HMAC key for X-Hub-Signature-256; kept out of the webhook URL (NULL for chats set up before it existed)
+        c.execute("ALTER TABLE webhooks ADD COLUMN IF NOT EXISTS signing_secret TEXT")
         # tokens
         c.execute('''
             CREATE TABLE IF NOT EXISTS github_tokens (
@@ -158,15 +201,20 @@ def init_db():
               labels TEXT[]
             )
         ''')
+        # getUpdates offset per bot for telegram_poller.py (long-polling mode)
         c.execute('''
-            CREATE TABLE IF NOT EXISTS ci_results (
-              id BIGINT PRIMARY KEY,
-              pr_id BIGINT REFERENCES pull_requests(id),
-              status TEXT,
-              started_at TIMESTAMP WITH TIME ZONE,
-              finished_at TIMESTAMP WITH TIME ZONE
+            CREATE TABLE IF NOT EXISTS telegram_update_offsets (
+              bot_id TEXT PRIMARY KEY,
+              next_offset BIGINT NOT NULL,
+              updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
             )
         ''')
+        # issues are scoped per chat for the leaderboard
+        c.execute("ALTER TABLE issues_closed ADD COLUMN IF NOT EXISTS chat_id TEXT")
+        init_leaderboard_tables(c)
+        init_delivery_table(c)
+        init_subscription_table(c)
+        init_ci_table(c)
         c.execute("CREATE INDEX IF NOT EXISTS idx_updates_chat_time ON project_updates (chat_id, timestamp DESC)")
         c.execute("CREATE INDEX IF NOT EXISTS idx_webhooks_secret ON webhooks (secret_key)")
         conn.commit()
@@ -182,35 +230,117 @@ def save_to_db(chat_id, author, repo_name, branch_name, summary, added, modified
     conn = get_db_connection()
     if not conn: return
     try:
-        c = conn.cursor()
-        total_files = added + modified + removed
-        c.execute("""
-            INSERT INTO project_updates 
-            (chat_id, author, repo_name, branch_name, summary, files_changed, files_added, files_modified, files_removed, lines_added, lines_removed, timestamp) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-        """, (str(chat_id), author, repo_name, branch_name, summary, total_files, added, modified, removed, lines_added, lines_removed))
-        conn.commit()
+        with stage_timer('db_write'):
+            c = conn.cursor()
+            total_files = added + modified + removed
+            c.execute("""
+                INSERT INTO project_updates 
+                (chat_id, author, repo_name, branch_name, files_changed, files_added, files_modified, files_removed, lines_added, lines_removed, timestamp) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+                RETURNING id, timestamp
+            """, (str(chat_id), author, repo_name, branch_name, total_files, added, modified, removed, lines_added, lines_removed))
+            update_id, ts = c.fetchone()
+            if summary:
+                c.execute("""
+                    INSERT INTO update_summaries (update_id, chat_id, created_at, summary)
+                    VALUES (%s, %s, %s, %s)
+                """, (update_id, str(chat_id), ts, summary))
+            conn.commit()
+        touch_leaderboard(conn, chat_id)
     except Exception as e:
         print("save_to_db error:", e)
     finally:
         conn.close()
 
-def save_webhook_config(chat_id, secret_key):
+def save_webhook_config(chat_id, secret_key, signing_secret):
     conn = get_db_connection()
     if not conn: return
     try:
         c = conn.cursor()
         c.execute("""
-            INSERT INTO webhooks (secret_key, chat_id)
-            VALUES (%s, %s)
-            ON CONFLICT (chat_id) DO UPDATE SET secret_key = EXCLUDED.secret_key
-        """, (secret_key, str(chat_id)))
+            INSERT INTO webhooks (secret_key, chat_id, signing_secret)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (chat_id) DO UPDATE SET secret_key = EXCLUDED.secret_key, signing_secret = EXCLUDED.signing_secret
+        """, (secret_key, str(chat_id), signing_secret))
         conn.commit()
+        webhook_secrets.put(chat_id, secret_key, signing_secret)
     except Exception as e:
         print("save_webhook_config error:", e)
     finally:
         conn.close()
 
+def load_webhook_secrets():
+    """All chat_id -> (secret_key, signing_secret) (for the in-memory webhook secret cache)."""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("DB unavailable")
+    try:
+        c = conn.cursor()
+        c.execute("SELECT chat_id, secret_key, signing_secret FROM webhooks")
+        return {chat_id: (key, signing) for chat_id, key, signing in c.fetchall()}
+    finally:
+        conn.close()
+
+webhook_secrets = WebhookSecretCache(load_webhook_secrets)
+
+def save_subscription(chat_id, sub):
+    conn = get_db_connection()
+    if not conn: return False
+    try:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO event_subscriptions (chat_id, events, repos, branches, updated_at)
+            VALUES (%s, %s, %s, %s, NOW())
+            ON CONFLICT (chat_id) DO UPDATE
+              SET events = EXCLUDED.events, repos = EXCLUDED.repos, branches = EXCLUDED.branches, updated_at = NOW()
+        """, (str(chat_id), sorted(sub.events), list(sub.repos), list(sub.branches)))
+        conn.commit()
+        subscriptions.put(chat_id, sub)
+        return True
+    except Exception as e:
+        print("save_subscription error:", e)
+        return False
+    finally:
+        conn.close()
+
+def load_subscriptions():
+    """All chat_id -> Subscription (chats without a row use the defaults)."""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("DB unavailable")
+    try:
+        c = conn.cursor()
+        c.execute("SELECT chat_id, events, repos, branches FROM event_subscriptions")
+        return {chat: Subscription(events, repos, branches) for chat, events, repos, branches in c.fetchall()}
+    finally:
+        conn.close()
+
+subscriptions = SubscriptionCache(load_subscriptions)
+
+delivery_dedup = DeliveryDedup()
+
+def claim_webhook_delivery(delivery_id, chat_id, event):
+    """False for a redelivery already handled; fails open (True) when the DB is unavailable."""
+    conn = get_db_connection()
+    if not conn: return True
+    try:
+        return claim_delivery(conn, delivery_dedup, delivery_id, chat_id, event)
+    except Exception as e:
+        print("claim_webhook_delivery error:", e)
+        return True
+    finally:
+        conn.close()
+
+def release_webhook_delivery(delivery_id):
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        release_delivery(conn, delivery_dedup, delivery_id)
+    except Exception as e:
+        print("release_webhook_delivery error:", e)
+    finally:
+        conn.close()
+
 def get_chat_id_from_secret(secret_key):
     conn = get_db_connection()
     if not conn: return None
@@ -357,6 +487,8 @@ def clear_pending_request_by_user(user_id):
         c = conn.cursor()
         c.execute("DELETE FROM pending_token_requests WHERE user_id = %s", (str(user_id),))
         conn.commit()
+    except Exception as e:
+        print("clear_pending_request error:", e)
     finally:
         conn.close()
 
@@ -371,63 +503,167 @@ def mark_commit_processed(conn, sha, chat_id, repo):
         c.execute("INSERT INTO processed_commits (commit_sha, chat_id, repo_name) VALUES (%s, %s, %s) ON CONFLICT DO NOTHING", (sha, str(chat_id), repo))
     conn.commit()
 
-# --- AI & TELEGRAM ---
-def generate_ai_analysis(commit_data, files_changed):
-    commit_msg = commit_data.get('message', 'No message.')
-    input_text = f"COMMIT MESSAGE: {commit_msg}\nFILES CHANGED: {', '.join(files_changed)}"
-    prompt = f"""
-    You are an AI Code Reviewer. Analyze this commit data.
-    COMMIT DATA: {input_text}
-
-    INSTRUCTIONS:
-    1. Return valid HTML ONLY.
-    2. Telegram does NOT support <ul>, <ol>, or <li> tags. DO NOT USE THEM.
-    3. Use the text character "•" for bullet points.
-    4. Use <br> or newlines for line breaks.
-    5. Use <b> for bold, <i> for italic, <code> for code.
-
-    OUTPUT FORMAT:
-    <b>Review Status:</b> [Status]
-    <b>Summary:</b> [One sentence summary]
-    <b>Technical Context:</b> [List files using • bullet points]
-    """
+# --- Leaderboard snapshots ---
+# Events only mark the chat's snapshot dirty; the rebuild is debounced so a burst
+# of PR/review/commit events costs one recompute instead of one per event.
+LEADERBOARD_REFRESH_DELAY = int(os.getenv("LEADERBOARD_REFRESH_DELAY", "30"))
+_leaderboard_timers = {}
+_leaderboard_timers_lock = threading.Lock()
+
+def touch_leaderboard(conn, chat_id):
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        response = model.generate_content(prompt)
-        return response.text
+        mark_leaderboard_dirty(conn, chat_id)
     except Exception as e:
-        return f"AI Analysis Failed: {e}"
+        print("mark_leaderboard_dirty error:", e)
+        return
+    schedule_leaderboard_refresh(chat_id)
+
+def schedule_leaderboard_refresh(chat_id):
+    """Debounced rebuild; also requested by dashboard reads that find the snapshot missing or stale."""
+    key = str(chat_id)
+    with _leaderboard_timers_lock:
+        if key in _leaderboard_timers:
+            return
+        t = threading.Timer(LEADERBOARD_REFRESH_DELAY, _schedule_leaderboard_refresh, args=(key,))
+        t.daemon = True
+        _leaderboard_timers[key] = t
+        t.start()
+
+def _schedule_leaderboard_refresh(chat_id):
+    with _leaderboard_timers_lock:
+        _leaderboard_timers.pop(chat_id, None)
+    submit_background(refresh_leaderboard_for_chat, chat_id)
+
+def touch_leaderboards(conn, chat_ids):
+    for chat_id in chat_ids:
+        touch_leaderboard(conn, chat_id)
+
+ci_batcher = CIBatcher(get_db_connection, on_flush=touch_leaderboards)
+
+def refresh_leaderboard_for_chat(chat_id):
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        _, _, week_start_utc, now_ist = get_date_boundaries()
+        refresh_snapshot(conn, chat_id, week_start_utc, now_ist)
+    except Exception as e:
+        print("refresh_leaderboard error:", e)
+    finally:
+        conn.close()
 
-def send_to_telegram(text, author, repo, branch, target_bot_token, target_chat_id):
+def refresh_all_leaderboards():
+    """Periodic job entry point (python server.py refresh_leaderboards)."""
+    conn = get_db_connection()
+    if not conn: return 0
+    try:
+        _, _, week_start_utc, now_ist = get_date_boundaries()
+        return refresh_dirty_snapshots(conn, week_start_utc, now_ist)
+    finally:
+        conn.close()
+
+# --- AI & TELEGRAM ---
+def summarize_commit(commit_data, files_changed, stats=None, on_partial=None):
+    """
+    Classify the commit and summarize it on its tier's route (template, fast or pro model).
+    With stats (the compare path) the tier comes from the diff of the whole push.
+    """
+    lines_changed = sum(a + d for a, d, _ in stats.values()) if stats is not None else None
+    tier = classify_commit(commit_data, files_changed, lines_changed)
+    route, model_name = route_for(tier)
+    t0 = time.perf_counter()
+    with span("summarize_commit", tier=tier, route=route):
+        if model_name is None:
+            summary = template_summary(tier, commit_data, files_changed)
+        else:
+            summary = generate_ai_analysis(commit_data, files_changed, on_partial=on_partial, model_name=model_name,
+                                           tier=tier, stats=stats)
+    record_tier_latency(tier, route, time.perf_counter() - t0)
+    return summary
+
+def generate_ai_analysis(commit_data, files_changed, on_partial=None, model_name=MODEL_NAME, tier='standard', stats=None):
+    """
+    Model summary for one commit; with on_partial, streams and reports the text
+    so far. stats ({path: (additions, deletions, status)}) ranks files in the prompt.
+    """
+    prompt, prompt_info = build_prompt(commit_data, files_changed, stats, budget_tokens=prompt_budget(tier))
+    span_attrs = {"gen_ai.request.model": model_name, "prompt.tokens": prompt_info["tokens"],
+                  "prompt.files_collapsed": prompt_info["files_collapsed"]}
+
+    def call(deadline):
+        backend = get_backend()
+        with stage_timer('model_call'), span(f"{backend.name} generate_content", **span_attrs):
+            result = backend.generate(model_name, prompt, deadline, on_partial=on_partial)
+        record_usage(tier, model_name, result.prompt_tokens, result.output_tokens)
+        return result.text
+
+    return guarded_model_call(call, lambda: fallback_summary(commit_data, files_changed))
+
+def format_update_message(text, author, repo, branch):
+    """Header (author / repo / branch / IST time) plus the model's HTML cleaned for Telegram."""
+    return f"{update_header(author, repo, branch)}\n\n{sanitize_telegram_html(text)}"
+
+def update_header(author, repo, branch):
+    now_utc = datetime.utcnow()
+    ist_time = now_utc.astimezone(IST)
+    display_timestamp = ist_time.strftime('%I:%M %p')
+    header = (
+        f"👤 <b>{html.escape(author)}</b>\n"
+        f"📂 <b>{html.escape(repo)}</b> (<code>{html.escape(branch)}</code>)\n"
+        f"🕒 {display_timestamp}"
+    )
+    return header
+
+def send_to_telegram(text, author, repo, branch, target_bot_token, target_chat_id, stream=None):
+    """
+    Queue an update for the chat, split at Telegram's 4096 limit. Reports that
+    would take more than TELEGRAM_MAX_PARTS messages are sent as the first
+    part plus the full report attached as a text document. With a stream, the
+    first part replaces its progressively edited message.
+    """
     if not target_bot_token or not target_chat_id: return
     try:
-        clean_text = text.replace("```html", "").replace("```", "")
-        clean_text = clean_text.replace("<br>", "\n").replace("<br/>", "\n").replace("<br />", "\n")
-        clean_text = clean_text.replace("<ul>", "").replace("</ul>", "")
-        clean_text = clean_text.replace("<ol>", "").replace("</ol>", "")
-        clean_text = clean_text.replace("<li>", "• ").replace("</li>", "\n")
-        clean_text = clean_text.replace("<p>", "").replace("</p>", "\n\n")
-        now_utc = datetime.utcnow()
-        ist_time = now_utc.astimezone(IST)
-        display_timestamp = ist_time.strftime('%I:%M %p')
-        header = (
-            f"👤 <b>{html.escape(author)}</b>\n"
-            f"📂 <b>{html.escape(repo)}</b> (<code>{html.escape(branch)}</code>)\n"
-            f"🕒 {display_timestamp}"
-        )
-        message_text = f"{header}\n\n{clean_text}"
-        payload = {"chat_id": target_chat_id, "text": message_text, "parse_mode": "HTML"}
-        url = TELEGRAM_API_URL.format(token=target_bot_token)
-        r = requests.post(url, json=payload)
-        if r.status_code != 200:
-            print("Telegram send failed:", r.status_code, r.text)
+        message_text = stream.full_text(text) if stream else format_update_message(text, author, repo, branch)
+        parts = split_telegram_html(message_text)
+        document = None
+        if len(parts) > TELEGRAM_MAX_PARTS:
+            note = f"\n\n📎 <i>Report continues in the attached file ({len(parts)} parts).</i>"
+            parts = split_telegram_html(message_text, limit=TELEGRAM_MESSAGE_LIMIT - len(note))[:1]
+            parts[0] += note
+            filename = f"gitsync-{re.sub(r'[^A-Za-z0-9_.-]+', '_', repo)}-{datetime.now(IST).strftime('%Y%m%d-%H%M')}.txt"
+            document = (filename, html_to_text(message_text).encode(), "text/plain")
+        if stream:
+            stream.finish(parts)
+        else:
+            for part in parts:
+                enqueue_send(target_bot_token, {"chat_id": target_chat_id, "text": part, "parse_mode": "HTML"})
+        if document:
+            enqueue_send(target_bot_token, {"chat_id": target_chat_id, "caption": "Full push report"}, "sendDocument",
+                         files={"document": document})
     except Exception as e:
         print("send_to_telegram error:", e)
 
+def telegram_post(token, payload, method="sendMessage", files=None):
+    """Call a Bot API method; every Telegram request goes through here (metrics, 429 counting)."""
+    url = f"{TELEGRAM_API_BASE}/bot{token}/{method}"
+    with stage_timer('telegram_send'), http_span('telegram', method, url.replace(token, '<token>')) as s:
+        if files:
+            # uploads (sendDocument) must be multipart
+            r = requests.post(url, data=payload, files=files, timeout=TELEGRAM_TIMEOUT)
+        else:
+            r = requests.post(url, json=payload, timeout=TELEGRAM_TIMEOUT)
+        record_http_status(s, r.status_code)
+    record_telegram_response(method, r.status_code)
+    return r
+
+configure_send_queue(telegram_post)
+
 # --- GitHub helpers ---
 def validate_github_token(token):
     try:
-        r = requests.get("https://api.github.com/user", headers={"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}, timeout=8)
+        with http_span('github', 'GET', f"{GITHUB_API_URL}/user") as s:
+            r = requests.get(f"{GITHUB_API_URL}/user", headers={"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}, timeout=8)
+            record_http_status(s, r.status_code)
+        record_github_response('user', r)
         if r.status_code == 200:
             return r.json()
         else:
@@ -441,10 +677,13 @@ def try_compare_api_with_chat_token(owner, repo, before, after, chat_id):
     token = get_decrypted_token_for_chat(chat_id)
     if not token:
         return None, "no-token"
-    url = f"https://api.github.com/repos/{owner}/{repo}/compare/{before}...{after}"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/compare/{before}...{after}"
     headers = {"Authorization": f"Bearer {token}", "Accept": "application/vnd.github+json"}
     try:
-        r = requests.get(url, headers=headers, timeout=12)
+        with stage_timer('compare_fetch'), http_span('github', 'GET', url) as s:
+            r = requests.get(url, headers=headers, timeout=12)
+            record_http_status(s, r.status_code)
+        record_github_response('compare', r)
         if r.status_code == 200:
             return r.json(), None
         elif r.status_code in (401, 403):
@@ -463,35 +702,21 @@ def mark_token_invalid(chat_id, reason=None):
     if reason:
         group_msg += f"\n\nReason: {html.escape(reason)}"
     try:
-        requests.post(TELEGRAM_API_URL.format(token=TELEGRAM_BOT_TOKEN_FOR_COMMANDS),
-                      json={"chat_id": chat_id, "text": group_msg, "parse_mode": "HTML"})
+        telegram_post(TELEGRAM_BOT_TOKEN_FOR_COMMANDS, {"chat_id": chat_id, "text": group_msg, "parse_mode": "HTML"})
     except Exception as e:
         print("notify group failed:", e)
     # notify creator by name in group (best-effort)
     if creator:
         try:
             creator_msg = f"Hi {creator}, your saved GitHub token for this group appears invalid or revoked. Please reconfigure by clicking the secure setup link in the group (/gitsync)."
-            requests.post(TELEGRAM_API_URL.format(token=TELEGRAM_BOT_TOKEN_FOR_COMMANDS),
-                          json={"chat_id": chat_id, "text": creator_msg, "parse_mode": "HTML"})
+            telegram_post(TELEGRAM_BOT_TOKEN_FOR_COMMANDS, {"chat_id": chat_id, "text": creator_msg, "parse_mode": "HTML"})
         except Exception as e:
             print("notify creator failed:", e)
     return removed
 
 # --- GitHub event handlers (store PRs/reviews/issues) ---
-def handle_pull_request_event(data, target_chat):
+def handle_pull_request_event(event, target_chat):
     # insert/update pull_requests table
-    pr = data.get('pull_request', {})
-    pr_id = pr.get('id')
-    number = pr.get('number')
-    author = pr.get('user', {}).get('login')
-    repo = data.get('repository', {}).get('full_name')
-    state = pr.get('state')
-    created_at = pr.get('created_at')
-    merged_at = pr.get('merged_at')
-    closed_at = pr.get('closed_at')
-    additions = pr.get('additions', 0)
-    deletions = pr.get('deletions', 0)
-    changed_files = pr.get('changed_files', 0)
     conn = get_db_connection()
     if not conn: return
     try:
@@ -503,21 +728,16 @@ def handle_pull_request_event(data, target_chat):
               SET repo_name=EXCLUDED.repo_name, number=EXCLUDED.number, author=EXCLUDED.author,
                   created_at=EXCLUDED.created_at, merged_at=EXCLUDED.merged_at, closed_at=EXCLUDED.closed_at,
                   state=EXCLUDED.state, additions=EXCLUDED.additions, deletions=EXCLUDED.deletions, changed_files=EXCLUDED.changed_files
-        """, (pr_id, str(target_chat), repo, number, author, created_at, merged_at, closed_at, state, additions, deletions, changed_files))
+        """, (event.pr_id, str(target_chat), event.repository.full_name, event.number, event.user, event.created_at,
+              event.merged_at, event.closed_at, event.state, event.additions, event.deletions, event.changed_files))
         conn.commit()
+        touch_leaderboard(conn, target_chat)
     except Exception as e:
         print("handle_pull_request error:", e)
     finally:
         conn.close()
 
-def handle_pr_review_event(data, target_chat):
-    review = data.get('review', {})
-    pr = data.get('pull_request', {})
-    pr_id = pr.get('id')
-    reviewer = review.get('user', {}).get('login')
-    state = review.get('state')
-    submitted_at = review.get('submitted_at')
-    review_id = review.get('id')
+def handle_pr_review_event(event, target_chat):
     conn = get_db_connection()
     if not conn: return
     try:
@@ -526,109 +746,71 @@ def handle_pr_review_event(data, target_chat):
             INSERT INTO pr_reviews (id, pr_id, reviewer, state, submitted_at)
             VALUES (%s, %s, %s, %s, %s)
             ON CONFLICT (id) DO UPDATE SET state = EXCLUDED.state, submitted_at = EXCLUDED.submitted_at
-        """, (review_id, pr_id, reviewer, state, submitted_at))
+        """, (event.review_id, event.pr_id, event.reviewer, event.state, event.submitted_at))
         conn.commit()
+        touch_leaderboard(conn, target_chat)
     except Exception as e:
         print("handle_pr_review error:", e)
     finally:
         conn.close()
 
-def handle_issues_event(data, target_chat):
-    issue = data.get('issue', {})
-    issue_id = issue.get('id')
-    repo = data.get('repository', {}).get('full_name')
-    number = issue.get('number')
-    author = issue.get('user', {}).get('login')
-    closed_by = issue.get('closed_by', {}).get('login') if issue.get('closed_by') else None
-    created_at = issue.get('created_at')
-    closed_at = issue.get('closed_at')
-    labels = [l.get('name') for l in issue.get('labels', [])]
+def handle_issues_event(event, target_chat):
     conn = get_db_connection()
     if not conn: return
     try:
         c = conn.cursor()
         c.execute("""
-            INSERT INTO issues_closed (id, repo_name, number, author, closed_by, created_at, closed_at, labels)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-            ON CONFLICT (id) DO UPDATE SET closed_by=EXCLUDED.closed_by, closed_at=EXCLUDED.closed_at
-        """, (issue_id, repo, number, author, closed_by, created_at, closed_at, labels))
+            INSERT INTO issues_closed (id, chat_id, repo_name, number, author, closed_by, created_at, closed_at, labels)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            ON CONFLICT (id) DO UPDATE SET chat_id=EXCLUDED.chat_id, closed_by=EXCLUDED.closed_by, closed_at=EXCLUDED.closed_at
+        """, (event.issue_id, str(target_chat), event.repository.full_name, event.number, event.user, event.closed_by,
+              event.created_at, event.closed_at, event.labels))
         conn.commit()
+        touch_leaderboard(conn, target_chat)
     except Exception as e:
         print("handle_issues_event error:", e)
     finally:
         conn.close()
 
-# --- WEBHOOK ROUTE (single endpoint handles multiple event types) ---
+EVENT_HANDLERS = {
+    'pull_request': handle_pull_request_event,
+    'pull_request_review': handle_pr_review_event,
+    'issues': handle_issues_event,
+}
+
+def event_notification(gh_event, event):
+    """Group message for a non-push event: (text, repo full name, branch)."""
+    repo = event.repository.full_name
+    if gh_event == 'pull_request':
+        return f"🔀 Pull Request {event.action}: <b>#{event.number}</b> - {html.escape(event.title)}", repo, event.head_ref
+    if gh_event == 'pull_request_review':
+        return (f"🧐 PR Review by <b>{html.escape(event.reviewer or 'unknown')}</b>: <b>#{event.pr_number}</b> — {event.state}",
+                repo, event.head_ref)
+    return f"📌 Issue {event.action}: <b>#{event.number}</b> — {html.escape(event.title)}", repo, ''
+
+# --- WEBHOOK ROUTE (single endpoint handles multiple event types; see flows.handle_webhook) ---
 @app.route('/webhook', methods=['POST'])
 def git_webhook():
-    data = request.json
-    secret_key = request.args.get('secret_key')
-    target_chat_id = request.args.get('chat_id')
-    validated_chat_id = get_chat_id_from_secret(secret_key)
-    if not secret_key or not target_chat_id or str(validated_chat_id) != str(target_chat_id):
-        print("Auth failed:", target_chat_id, validated_chat_id)
-        return jsonify({"status": "error", "message": "Invalid secret_key or chat_id."}), 401
-
-    # Determine event type
-    gh_event = request.headers.get('X-GitHub-Event', '').lower()
-    # pick author nicely
-    author_name = "Unknown"
-    if 'pusher' in data:
-        author_name = data['pusher'].get('name')
-    elif 'sender' in data:
-        author_name = data['sender'].get('login')
-
-    # route events
-    try:
-        if gh_event == 'pull_request':
-            handle_pull_request_event(data, target_chat_id)
-            # enqueue summary to group (optional)
-            pr = data.get('pull_request', {})
-            title = pr.get('title','')
-            number = pr.get('number')
-            action = data.get('action')
-            msg = f"🔀 Pull Request {action}: <b>#{number}</b> - {html.escape(title)}"
-            send_to_telegram(msg, "GitSync", data.get('repository',{}).get('full_name',''), pr.get('head',{}).get('ref',''), TELEGRAM_BOT_TOKEN_FOR_COMMANDS, target_chat_id)
-        elif gh_event == 'pull_request_review':
-            handle_pr_review_event(data, target_chat_id)
-            pr = data.get('pull_request', {})
-            reviewer = data.get('review', {}).get('user',{}).get('login')
-            state = data.get('review', {}).get('state')
-            msg = f"🧐 PR Review by <b>{html.escape(reviewer or 'unknown')}</b>: <b>#{pr.get('number')}</b> — {state}"
-            send_to_telegram(msg, "GitSync", data.get('repository',{}).get('full_name',''), pr.get('head',{}).get('ref',''), TELEGRAM_BOT_TOKEN_FOR_COMMANDS, target_chat_id)
-        elif gh_event == 'issues':
-            handle_issues_event(data, target_chat_id)
-            issue = data.get('issue', {})
-            action = data.get('action')
-            msg = f"📌 Issue {action}: <b>#{issue.get('number')}</b> — {html.escape(issue.get('title',''))}"
-            send_to_telegram(msg, "GitSync", data.get('repository',{}).get('full_name',''), '', TELEGRAM_BOT_TOKEN_FOR_COMMANDS, target_chat_id)
-        else:
-            # default: treat as push
-            executor.submit(process_standup_task, TELEGRAM_BOT_TOKEN_FOR_COMMANDS, target_chat_id, author_name, data)
-    except Exception as e:
-        print("webhook dispatch error:", e)
-        traceback.print_exc()
-
-    return jsonify({"status": "processing", "message": "Accepted"}), 200
+    status, payload = run_sync(flows.handle_webhook(server_io, request.args, request.headers, request.get_data()))
+    return jsonify(payload), status
 
 # --- STANDUP / PROCESSING (push handling) ---
-def process_standup_task(target_bot_token, target_chat_id, author_name, data):
+@profiled('process_standup_task')
+def process_standup_task(target_bot_token, target_chat_id, author_name, event):
     try:
         all_updates = []
-        commits = data.get('commits', [])
-        repo_name = data.get('repository', {}).get('name', 'Unknown Repo')
-        org_name = data.get('repository', {}).get('organization', 'Unknown Org')
-        if isinstance(org_name, dict): org_name = org_name.get('login', 'Unknown')
-        display_repo_name = f"{org_name}/{repo_name}" if org_name not in ('Unknown','Unknown Org') else repo_name
-        branch_ref = data.get('ref', '')
-        branch_name = branch_ref.split('/')[-1] if branch_ref else 'unknown'
-        if not commits and 'head_commit' in data:
-            commits = [data['head_commit']]
-
-        owner = data.get('repository', {}).get('owner', {}) or {}
-        owner_login = owner.get('login') or owner.get('name')
-        before_sha = data.get('before')
-        after_sha = data.get('after')
+        commits = event.commits
+        repo_name = event.repository.name
+        display_repo_name = event.repository.display_name
+        branch_name = event.branch
+        owner_login = event.repository.owner_login
+        before_sha = event.before
+        after_sha = event.after
+
+        stream = None
+        if STREAM_SUMMARIES and target_bot_token and target_chat_id:
+            stream = StreamingMessage(target_bot_token, target_chat_id, update_header(author_name, display_repo_name, branch_name))
+            stream.start()
 
         compare_data = None
         compare_err = None
@@ -642,14 +824,15 @@ def process_standup_task(target_bot_token, target_chat_id, author_name, data):
             total_removed = sum(v[1] for v in file_map.values())
             total_modified = sum(1 for v in file_map.values() if v[2]=='modified')
             files_list = list(file_map.keys())
-            head_commit = data.get('head_commit') or (commits[0] if commits else {})
-            ai_response = generate_ai_analysis(head_commit or {}, files_list)
+            head_commit = event.head_commit or (commits[0] if commits else Commit())
+            on_partial = (lambda t: stream.update(f"<b>Push Summary (exact)</b>\n{t}")) if stream else None
+            ai_response = summarize_commit(head_commit, files_list, stats=file_map, on_partial=on_partial)
             summary = ai_response.strip()
             # Save summary + exact lines
             save_to_db(target_chat_id, author_name, display_repo_name, branch_name, summary, 0, total_modified, 0, lines_added=total_added, lines_removed=total_removed)
             lines_text = "\n".join([f"{k}: +{v[0]} / -{v[1]}" for k,v in file_map.items()])
             final_summary = f"<b>Push Summary (exact)</b>\n{summary}\n\n{lines_text}\n\n<b>Confidence:</b> exact"
-            send_to_telegram(final_summary, author_name, display_repo_name, branch_name, target_bot_token, target_chat_id)
+            send_to_telegram(final_summary, author_name, display_repo_name, branch_name, target_bot_token, target_chat_id, stream=stream)
         else:
             confidence_tag = "estimated"
             if compare_err and compare_err.startswith("auth-failed"):
@@ -658,131 +841,132 @@ def process_standup_task(target_bot_token, target_chat_id, author_name, data):
                 except Exception as e:
                     print("mark_token_invalid failed:", e)
                 confidence_tag = "token-invalid"
-            if not commits and 'head_commit' in data:
-                commits = [data['head_commit']]
             for commit in commits:
-                added_list = commit.get('added', [])
-                removed_list = commit.get('removed', [])
-                modified_list = commit.get('modified', [])
-                added_count = len(added_list)
-                removed_count = len(removed_list)
-                modified_count = len(modified_list)
-                files_list = added_list + removed_list + modified_list
-                ai_response = generate_ai_analysis(commit, files_list)
+                added_count = len(commit.added)
+                removed_count = len(commit.removed)
+                modified_count = len(commit.modified)
+                files_list = commit.files
+                commit_id = (commit.id or 'unknown')[:7]
+                on_partial = None
+                if stream:
+                    done_so_far = "".join(u + "\n\n----------------\n\n" for u in all_updates)
+                    on_partial = lambda t, prefix=done_so_far, cid=commit_id: stream.update(f"{prefix}<b>Commit:</b> <code>{cid}</code>\n{t}")
+                ai_response = summarize_commit(commit, files_list, on_partial=on_partial)
                 summary = ai_response.strip()
-                commit_id = commit.get('id', 'unknown')[:7]
                 all_updates.append(f"<b>Commit:</b> <code>{commit_id}</code>\n{summary}\n\n<b>Confidence:</b> {confidence_tag}")
                 save_to_db(target_chat_id, author_name, display_repo_name, branch_name, summary, added_count, modified_count, removed_count)
             if all_updates:
                 final_report = "\n\n----------------\n\n".join(all_updates)
-                send_to_telegram(final_report, author_name, display_repo_name, branch_name, target_bot_token, target_chat_id)
+                send_to_telegram(final_report, author_name, display_repo_name, branch_name, target_bot_token, target_chat_id, stream=stream)
+            elif stream:
+                stream.finish([stream.full_text("<i>No commits to summarize.</i>")])
         print("Background task complete.")
     except Exception as e:
         print("process_standup_task error:", e)
         traceback.print_exc()
 
-# --- TELEGRAM COMMANDS endpoint (handles /start, /gitsync, /dashboard, token paste) ---
+# --- TELEGRAM COMMANDS endpoint (handles /start, /gitsync, /dashboard, /events, token paste) ---
+# The flows live in flows.py; ServerIO gives them the blocking helpers above.
+class ServerIO:
+    """Blocking I/O for flows.py; every coroutine here returns without suspending (see flows.run_sync)."""
+
+    @property
+    def bot_username(self):
+        return BOT_USERNAME
+
+    @property
+    def app_base_url(self):
+        return APP_BASE_URL
+
+    # webhook path
+    async def webhook_secret(self, chat_id, secret_key):
+        return webhook_secrets.get(chat_id, secret_key)
+
+    async def subscription(self, chat_id):
+        return subscriptions.get(chat_id)
+
+    async def claim_delivery(self, delivery_id, chat_id, gh_event):
+        return claim_webhook_delivery(delivery_id, chat_id, gh_event)
+
+    async def release_delivery(self, delivery_id):
+        release_webhook_delivery(delivery_id)
+
+    async def record_webhook(self, gh_event, delivery_id, data):
+        record_webhook(gh_event, delivery_id, data)
+
+    async def handle_event(self, gh_event, event, chat_id):
+        EVENT_HANDLERS[gh_event](event, chat_id)
+
+    def notify(self, gh_event, event, chat_id):
+        msg, repo, branch = event_notification(gh_event, event)
+        send_to_telegram(msg, "GitSync", repo, branch, TELEGRAM_BOT_TOKEN_FOR_COMMANDS, chat_id)
+
+    def dispatch_push(self, event, chat_id):
+        submit_background(process_standup_task, TELEGRAM_BOT_TOKEN_FOR_COMMANDS, chat_id, event.author, event)
+
+    def queue_ci(self, event, chat_id):
+        return ci_batcher.add(event, chat_id)
+
+    # commands
+    async def get_chat_id_from_secret(self, secret_key):
+        return get_chat_id_from_secret(secret_key)
+
+    async def get_secret_from_chat_id(self, chat_id):
+        return get_secret_from_chat_id(chat_id)
+
+    async def save_webhook_config(self, chat_id, secret_key, signing_secret):
+        save_webhook_config(chat_id, secret_key, signing_secret)
+
+    async def save_subscription(self, chat_id, sub):
+        return save_subscription(chat_id, sub)
+
+    async def create_pending_request(self, secret_key, user_id, chat_id):
+        return create_pending_request(secret_key, user_id, chat_id)
+
+    async def get_pending_request_by_user(self, user_id):
+        return get_pending_request_by_user(user_id)
+
+    async def clear_pending_request_by_user(self, user_id):
+        clear_pending_request_by_user(user_id)
+
+    async def remove_token_for_chat(self, chat_id):
+        return remove_token_for_chat(chat_id)
+
+    async def validate_github_token(self, token):
+        return validate_github_token(token)
+
+    async def save_encrypted_token_for_chat(self, chat_id, token, created_by=None):
+        return save_encrypted_token_for_chat(chat_id, token, created_by=created_by)
+
+    def queue_html(self, chat_id, text):
+        queue_html(chat_id, text)
+
+    def start_token_install(self, chat_id, user_id, username, target_chat_id, token):
+        submit_background(install_github_token, chat_id, user_id, username, target_chat_id, token)
+
+server_io = ServerIO()
+
+def queue_html(chat_id, text):
+    enqueue_send(TELEGRAM_BOT_TOKEN_FOR_COMMANDS, {"chat_id": chat_id, "text": text, "parse_mode": "HTML"})
+
+def handle_telegram_update(update):
+    """Entry point for one Bot API update; returns the reply payload (with "method") or None."""
+    return run_sync(flows.handle_update(server_io, update))
+
+def install_github_token(chat_id, user_id, username, target_chat_id, token):
+    run_sync(flows.install_github_token(server_io, chat_id, user_id, username, target_chat_id, token))
+
 @app.route('/telegram_commands', methods=['POST'])
 def telegram_commands():
-    update = request.json
-    BOT_TOKEN = TELEGRAM_BOT_TOKEN_FOR_COMMANDS
-    APP_BASE_URL_USED = APP_BASE_URL
-
-    if 'message' in update:
-        message = update['message']
-        message_text = message.get('text', '')
-        chat_id = message['chat']['id']
-
-        # /start (supports deep-link payload)
-        if message_text.startswith('/start'):
-            parts = message_text.strip().split()
-            if len(parts) > 1:
-                secret_payload = parts[1].strip()
-                target_chat = get_chat_id_from_secret(secret_payload)
-                if not target_chat:
-                    requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "❌ This setup link is invalid or expired.", "parse_mode":"HTML"})
-                else:
-                    create_pending_request(secret_payload, message['from']['id'], target_chat)
-                    requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "🔒 Paste your GitHub PAT in this private chat. It will be stored encrypted and never shown. (Expires in 15 minutes)", "parse_mode":"HTML"})
-            else:
-                guide_text = (
-                    "👋 <b>Welcome to GitSync!</b>\n\n"
-                    "Add me to your Telegram organization group to instantly generate a unique webhook for your team.\n\n"
-                    f"Tap →Add(User_Name:<code>@{BOT_USERNAME}</code>)→ Done.\n\n"
-                    "Run:\n🔹 <code>/gitsync</code>\n🔹 <code>/dashboard</code>"
-                )
-                requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": guide_text, "parse_mode":"HTML"})
-            return jsonify({"status":"ok"}), 200
-
-        if message_text.startswith('/gitsync'):
-            new_key = str(uuid.uuid4())
-            save_webhook_config(chat_id, new_key)
-            webhook_url = f"{APP_BASE_URL_USED}/webhook?secret_key={new_key}&chat_id={chat_id}"
-            deep_link = f"https://t.me/{BOT_USERNAME}?start={new_key}"
-            response_text = (
-                "👋 <b>GitSync Setup Guide</b>\n\n"
-                "1. Copy your unique Webhook URL:\n\n"
-                f"<code>{webhook_url}</code>\n\n"
-                "2. Paste in GitHub repo settings → Webhooks (push event).\n\n"
-                f"3. To enable exact line counts for private repos, an admin should click: <a href=\"{deep_link}\">secure token setup (private DM)</a>\n\n"
-                "Then run /dashboard."
-            )
-            requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": response_text, "parse_mode":"HTML", "disable_web_page_preview": True})
-            return jsonify({"status":"ok"}), 200
-
-        if message_text.startswith('/dashboard'):
-            key = get_secret_from_chat_id(chat_id)
-            if key:
-                dashboard_url = f"{APP_BASE_URL}/dashboard?key={key}"
-                response_text = f"📊 <b>Team Dashboard</b>\nOpen: <a href='{dashboard_url}'>Open Dashboard</a>"
-            else:
-                response_text = "❌ Run /gitsync first."
-            requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": response_text, "parse_mode":"HTML"})
-            return jsonify({"status":"ok"}), 200
-
-        # private chat flows: token paste & removal
-        def looks_like_token(s):
-            return bool(re.search(r'ghp_|gho_|github_pat_|ghs_|ghu_|ghr_', s)) or len(s.strip()) > 30
-
-        if message['chat']['type'] == 'private':
-            text = message_text.strip()
-            if text.startswith('/remove_github_token'):
-                pending = get_pending_request_by_user(message['from']['id'])
-                if pending:
-                    target_chat = pending['chat_id']
-                    ok = remove_token_for_chat(target_chat)
-                    clear_pending_request_by_user(message['from']['id'])
-                    if ok:
-                        requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "✅ Token removed.", "parse_mode":"HTML"})
-                        requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": target_chat, "text": "⚠️ GitSync: Token removed. Exact counts disabled.", "parse_mode":"HTML"})
-                    else:
-                        requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "❌ Remove failed.", "parse_mode":"HTML"})
-                else:
-                    requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "⚠️ Click group setup link first.", "parse_mode":"HTML"})
-                return jsonify({"status":"ok"}), 200
-
-            if looks_like_token(text):
-                pending = get_pending_request_by_user(message['from']['id'])
-                if not pending:
-                    requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "⚠️ No pending request found. Use group's setup link.", "parse_mode":"HTML"})
-                else:
-                    target_chat_id = pending['chat_id']
-                    v = validate_github_token(text)
-                    if v:
-                        saved = save_encrypted_token_for_chat(target_chat_id, text, created_by=message.get('from',{}).get('username'))
-                        clear_pending_request_by_user(message['from']['id'])
-                        if saved:
-                            group_msg = f"✅ GitHub token installed by <b>{html.escape(message.get('from',{}).get('username','admin'))}</b>. Exact per-file insertions/deletions enabled."
-                            requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": target_chat_id, "text": group_msg, "parse_mode":"HTML"})
-                            requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "✅ Token validated and saved securely.", "parse_mode":"HTML"})
-                        else:
-                            requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "❌ Save failed.", "parse_mode":"HTML"})
-                    else:
-                        requests.post(TELEGRAM_API_URL.format(token=BOT_TOKEN), json={"chat_id": chat_id, "text": "❌ Token validation failed. Ensure 'repo' permissions are present.", "parse_mode":"HTML"})
-                return jsonify({"status":"ok"}), 200
-
+    update = request.get_json(silent=True)
+    if not isinstance(update, dict):
+        return jsonify({"status": "error", "message": "Invalid JSON body."}), 400
+    reply = handle_telegram_update(update)
+    if reply:
+        return jsonify(reply), 200
     return jsonify({"status":"ok"}), 200
 
+
 # --- Dashboard route (final metrics & corporate leaderboard) ---
 @app.route('/dashboard', methods=['GET'])
 def dashboard():
@@ -793,7 +977,11 @@ def dashboard():
     target_chat_id = get_chat_id_from_secret(secret_key)
     if not target_chat_id:
         return "<h1>401 Unauthorized</h1><p>Invalid dashboard key.</p>", 401
+    return render_dashboard(target_chat_id)
 
+@profiled('dashboard')
+def render_dashboard(target_chat_id):
+    """Query + render for an authenticated chat; needs an app context (asgi_app runs it in a thread)."""
     conn = get_db_connection()
     if not conn:
         return "<h1>Database Error</h1><p>Unable to connect.</p>", 500
@@ -803,13 +991,22 @@ def dashboard():
         # date boundaries
         today_start_utc, yesterday_start_utc, week_start_utc, now_ist = get_date_boundaries()
         
-        # org title
-        c.execute("SELECT repo_name FROM project_updates WHERE chat_id = %s ORDER BY timestamp DESC LIMIT 1", (str(target_chat_id),))
+        recent_start_utc = today_start_utc - timedelta(days=DASHBOARD_RECENT_DAYS)
+
+        # org title (recent partitions first; a quiet chat falls back to its last push ever)
+        c.execute("SELECT repo_name FROM project_updates WHERE chat_id = %s AND timestamp >= %s ORDER BY timestamp DESC LIMIT 1", (str(target_chat_id), recent_start_utc))
         r = c.fetchone()
+        if r is None:
+            c.execute("SELECT repo_name FROM project_updates WHERE chat_id = %s ORDER BY timestamp DESC LIMIT 1", (str(target_chat_id),))
+            r = c.fetchone()
         org_title = r[0] if r and r[0] else "Development Team"
 
-        # fetch distinct developers
-        c.execute("SELECT DISTINCT author FROM project_updates WHERE chat_id = %s ORDER BY author", (str(target_chat_id),))
+        # fetch distinct developers (all-time unless DASHBOARD_MEMBER_DAYS is set)
+        if DASHBOARD_MEMBER_DAYS > 0:
+            members_start_utc = today_start_utc - timedelta(days=DASHBOARD_MEMBER_DAYS)
+            c.execute("SELECT DISTINCT author FROM project_updates WHERE chat_id = %s AND timestamp >= %s ORDER BY author", (str(target_chat_id), members_start_utc))
+        else:
+            c.execute("SELECT DISTINCT author FROM project_updates WHERE chat_id = %s ORDER BY author", (str(target_chat_id),))
         developers = [row[0] for row in c.fetchall()]
         total_developers = len(developers)
 
@@ -946,200 +1143,43 @@ def dashboard():
         motivation_message = random.choice(motivation_messages)
         top_performer_message = random.choice(top_performer_messages)
 
-        # 8) Generate recent activities
+        # 8) Generate recent activities (same fallback as the org title when the window is empty)
         recent_activities = []
-        c.execute("""
-            SELECT author, repo_name, branch_name, summary, timestamp
-            FROM project_updates
-            WHERE chat_id = %s
-            ORDER BY timestamp DESC
-            LIMIT 10
-        """, (str(target_chat_id),))
+        recent_sql = """
+            SELECT u.author, u.repo_name, u.branch_name, LEFT(s.summary, 51), u.timestamp
+            FROM (
+                SELECT id, author, repo_name, branch_name, timestamp
+                FROM project_updates
+                WHERE chat_id = %s{}
+                ORDER BY timestamp DESC
+                LIMIT 10
+            ) u
+            LEFT JOIN update_summaries s ON s.update_id = u.id
+            ORDER BY u.timestamp DESC
+        """
+        c.execute(recent_sql.format(" AND timestamp >= %s"), (str(target_chat_id), recent_start_utc))
+        activity_rows = c.fetchall()
+        if not activity_rows:
+            c.execute(recent_sql.format(""), (str(target_chat_id),))
+            activity_rows = c.fetchall()
         
         activity_icons = ["fas fa-code", "fas fa-file-code", "fas fa-terminal", "fas fa-bug", "fas fa-check-circle"]
         activity_colors = ["#4361ee", "#4cc9f0", "#f72585", "#7209b7", "#3a0ca3"]
         
-        for i, row in enumerate(c.fetchall()):
+        for i, row in enumerate(activity_rows):
+            summary = row[3] or ""  # archived rows have no summary
             activity = {
                 'title': f"{row[0]} pushed to {row[1]}",
-                'description': row[3][:50] + "..." if len(row[3]) > 50 else row[3],
+                'description': summary[:50] + "..." if len(summary) > 50 else summary,
                 'time': row[4].astimezone(IST).strftime('%I:%M %p'),
                 'icon': activity_icons[i % len(activity_icons)],
                 'color': activity_colors[i % len(activity_colors)]
             }
             recent_activities.append(activity)
 
-        # 9) Corporate leaderboard (composite using PRs, reviews, issues, speed, CI, cross-team)
-        period_start = week_start_utc
-
-        # merged PRs
-        c.execute("""SELECT author, COUNT(*) AS merged_prs
-                     FROM pull_requests
-                     WHERE merged_at IS NOT NULL AND merged_at >= %s
-                     GROUP BY author""", (period_start,))
-        merged_rows = {r[0]: int(r[1]) for r in c.fetchall()}
-
-        # reviews
-        c.execute("""SELECT reviewer AS author, COUNT(*) AS reviews_done,
-                    SUM(CASE WHEN r.state='APPROVED' THEN 1 ELSE 0 END) AS approvals
-            FROM pr_reviews r
-            JOIN pull_requests p ON r.pr_id = p.id
-            WHERE r.submitted_at >= %s
-            GROUP BY reviewer""", (period_start,))
-        review_rows = {r[0]: {'reviews_done': int(r[1]), 'approvals': int(r[2])} for r in c.fetchall()}
-
-        # issues closed
-        c.execute("""SELECT closed_by AS author, COUNT(*) AS issues_closed,
-                            SUM(CASE WHEN labels && ARRAY['bug'] THEN 1 ELSE 0 END) AS bugs_closed
-                     FROM issues_closed
-                     WHERE closed_at >= %s
-                     GROUP BY closed_by""", (period_start,))
-        issue_rows = {r[0]: {'issues_closed': int(r[1]), 'bugs_closed': int(r[2] or 0)} for r in c.fetchall()}
-
-        # first review time per author (lower better)
-        c.execute("""WITH first_review AS (
-                       SELECT pr_id, MIN(submitted_at) AS first_review_at
-                       FROM pr_reviews GROUP BY pr_id
-                     )
-                     SELECT p.author, AVG(EXTRACT(epoch FROM (fr.first_review_at - p.created_at))) AS avg_first_review_secs
-                     FROM pull_requests p JOIN first_review fr ON fr.pr_id = p.id
-                     WHERE p.created_at >= %s
-                     GROUP BY p.author""", (period_start,))
-        first_review_rows = {r[0]: float(r[1]) for r in c.fetchall()}
-
-        # avg merge secs
-        c.execute("""SELECT author, AVG(EXTRACT(epoch FROM (merged_at - created_at))) AS avg_merge_secs
-                     FROM pull_requests
-                     WHERE merged_at IS NOT NULL AND created_at >= %s
-                     GROUP BY author""", (period_start,))
-        merge_time_rows = {r[0]: float(r[1]) for r in c.fetchall()}
-
-        # ci pass rates
-        c.execute("""SELECT p.author,
-                            SUM(CASE WHEN c.status='success' THEN 1 ELSE 0 END) AS passed,
-                            COUNT(c.*) AS total
-                     FROM pull_requests p
-                     LEFT JOIN ci_results c ON c.pr_id = p.id
-                     WHERE p.created_at >= %s
-                     GROUP BY p.author""", (period_start,))
-        ci_rows = {r[0]: {'passed': int(r[1] or 0), 'total': int(r[2] or 0)} for r in c.fetchall()}
-
-        # cross-team reviews (reviewer != pr author)
-        c.execute("""SELECT r.reviewer AS author, COUNT(*) AS cross_reviews
-                     FROM pr_reviews r
-                     JOIN pull_requests p ON r.pr_id = p.id
-                     WHERE r.submitted_at >= %s AND r.reviewer <> p.author
-                     GROUP BY r.reviewer""", (period_start,))
-        cross_rows = {r[0]: int(r[1]) for r in c.fetchall()}
-
-        # Also get commit stats for leaderboard
-        c.execute("""SELECT author, COUNT(*) as commits, 
-                            SUM(files_added + files_modified + files_removed) as files_changed
-                     FROM project_updates
-                     WHERE chat_id = %s AND timestamp >= %s
-                     GROUP BY author""", (str(target_chat_id), period_start))
-        commit_stats = {r[0]: {'commits': int(r[1] or 0), 'files_changed': int(r[2] or 0)} for r in c.fetchall()}
-
-        authors = set(merged_rows) | set(review_rows) | set(issue_rows) | set(first_review_rows) | set(merge_time_rows) | set(ci_rows) | set(cross_rows) | set(commit_stats.keys())
-
-        metrics = {}
-        for a in authors:
-            metrics[a] = {
-                'merged_prs': merged_rows.get(a, 0),
-                'reviews_done': review_rows.get(a, {}).get('reviews_done', 0),
-                'approvals': review_rows.get(a, {}).get('approvals', 0),
-                'issues_closed': issue_rows.get(a, {}).get('issues_closed', 0),
-                'bugs_closed': issue_rows.get(a, {}).get('bugs_closed', 0),
-                'avg_first_review_secs': first_review_rows.get(a, None),
-                'avg_merge_secs': merge_time_rows.get(a, None),
-                'ci_pass_rate': (ci_rows.get(a, {}).get('passed',0) / max(1, ci_rows.get(a, {}).get('total',0))) if ci_rows.get(a) else None,
-                'cross_reviews': cross_rows.get(a, 0),
-                'commits': commit_stats.get(a, {}).get('commits', 0),
-                'files_changed': commit_stats.get(a, {}).get('files_changed', 0)
-            }
-
-        def normalize_map(vals):
-            if not vals:
-                return {}
-            maxv = max(vals.values())
-            if maxv == 0:
-                return {k: 0.0 for k in vals}
-            return {k: (v / maxv) for k,v in vals.items()}
-
-        merged_map = {a: metrics[a]['merged_prs'] for a in authors}
-        reviews_map = {a: metrics[a]['reviews_done'] for a in authors}
-        issues_map = {a: metrics[a]['issues_closed'] for a in authors}
-        cross_map = {a: metrics[a]['cross_reviews'] for a in authors}
-        commits_map = {a: metrics[a]['commits'] for a in authors}
-        files_map = {a: metrics[a]['files_changed'] for a in authors}
-        first_review_map = {a: (metrics[a]['avg_first_review_secs'] if metrics[a]['avg_first_review_secs'] else None) for a in authors}
-        merge_time_map = {a: (metrics[a]['avg_merge_secs'] if metrics[a]['avg_merge_secs'] else None) for a in authors}
-        ci_map = {a: (metrics[a]['ci_pass_rate'] if metrics[a]['ci_pass_rate'] is not None else 0.0) for a in authors}
-
-        n_merged = normalize_map(merged_map)
-        n_reviews = normalize_map(reviews_map)
-        n_issues = normalize_map(issues_map)
-        n_cross = normalize_map(cross_map)
-        n_commits = normalize_map(commits_map)
-        n_files = normalize_map(files_map)
-        n_ci = normalize_map(ci_map)
-
-        def normalize_time_map(time_map):
-            filtered = {k:v for k,v in time_map.items() if v is not None}
-            if not filtered:
-                return {k:0.0 for k in time_map}
-            maxv = max(filtered.values())
-            if maxv == 0:
-                return {k:1.0 for k in filtered}
-            scores = {}
-            for k in time_map:
-                v = time_map[k]
-                if v is None:
-                    scores[k] = 0.0
-                else:
-                    scores[k] = 1.0 - (v / maxv)
-            return scores
-
-        n_first_review = normalize_time_map(first_review_map)
-        n_merge_time = normalize_time_map(merge_time_map)
-
-        weights = {
-            'merged_prs': 0.20,
-            'reviews': 0.15,
-            'issues': 0.10,
-            'commits': 0.15,
-            'files': 0.10,
-            'first_review_speed': 0.08,
-            'merge_speed': 0.07,
-            'ci': 0.10,
-            'cross_reviews': 0.05
-        }
-
-        leaderboard = []
-        for a in sorted(authors):
-            score = 0.0
-            score += weights['merged_prs'] * n_merged.get(a, 0.0)
-            score += weights['reviews'] * n_reviews.get(a, 0.0)
-            score += weights['issues'] * n_issues.get(a, 0.0)
-            score += weights['commits'] * n_commits.get(a, 0.0)
-            score += weights['files'] * n_files.get(a, 0.0)
-            score += weights['first_review_speed'] * n_first_review.get(a, 0.0)
-            score += weights['merge_speed'] * n_merge_time.get(a, 0.0)
-            score += weights['ci'] * n_ci.get(a, 0.0)
-            score += weights['cross_reviews'] * n_cross.get(a, 0.0)
-
-            leaderboard.append({
-                'name': a,
-                'score': round(score * 100, 2),
-                'commits': metrics[a]['commits'],
-                'files_changed': metrics[a]['files_changed'],
-                'merged_prs': metrics[a]['merged_prs'],
-                'reviews_done': metrics[a]['reviews_done'],
-                'issues_closed': metrics[a]['issues_closed'],
-                'ci_pass_rate': metrics[a].get('ci_pass_rate', None)
-            })
-
-        leaderboard.sort(key=lambda x: x['score'], reverse=True)
+        # 9) Corporate leaderboard (precomputed weekly snapshot, see leaderboard.py)
+        leaderboard = get_leaderboard(conn, target_chat_id, week_start_utc, now_ist,
+                                      request_refresh=schedule_leaderboard_refresh)
 
         # -- prepare template data
         template_data = {
@@ -1209,9 +1249,73 @@ def get_date_boundaries():
     week_start_utc = today_start_utc - timedelta(days=now_ist.weekday())
     return today_start_utc, yesterday_start_utc, week_start_utc, now_ist
 
+def run_updates_retention():
+    """Periodic job entry point (python server.py maintain_updates)."""
+    conn = get_db_connection()
+    if not conn: return 0, 0
+    try:
+        return run_retention(conn)
+    finally:
+        conn.close()
+
+@app.route('/_admin/retention', methods=['POST', 'GET'])
+@require_admin_key
+def admin_retention():
+    try:
+        created, archived = run_updates_retention()
+        return f"Retention completed. Partitions created: {created}, summaries archived: {archived}.", 200
+    except Exception as e:
+        print("retention error:", e)
+        traceback.print_exc()
+        return "Retention failed (see logs).", 500
+
+# --- Profiling (admin) ---
+# POST /_admin/profile/start?key=..&target=dashboard&seconds=60   (or &calls=20)
+# GET  /_admin/profile/status?key=..
+# GET  /_admin/profile/result?key=..&session=<id>   -> collapsed stacks for flamegraph.pl
+@app.route('/_admin/profile/start', methods=['POST'])
+@require_admin_key
+def admin_profile_start():
+    try:
+        session = start_profile(request.args.get('target', ''), seconds=request.args.get('seconds', type=int),
+                                calls=request.args.get('calls', type=int),
+                                interval_ms=request.args.get('interval_ms', type=float))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(session), 200
+
+@app.route('/_admin/profile/stop', methods=['POST'])
+@require_admin_key
+def admin_profile_stop():
+    session = stop_profile()
+    if not session:
+        return jsonify({"status": "error", "message": "No profiling session."}), 404
+    return jsonify(session), 200
+
+@app.route('/_admin/profile/status', methods=['GET'])
+@require_admin_key
+def admin_profile_status():
+    return jsonify(profile_status()), 200
+
+@app.route('/_admin/profile/result', methods=['GET'])
+@require_admin_key
+def admin_profile_result():
+    session_id = request.args.get('session') or profile_status().get('id')
+    if not session_id or not re.fullmatch(r"[0-9a-f]{12}", session_id):
+        return jsonify({"status": "error", "message": "Unknown session."}), 404
+    return profile_result(session_id), 200, {"Content-Type": "text/plain; charset=utf-8"}
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status":"healthy","service":"GitSync Bot","timestamp": datetime.now(timezone.utc).isoformat()})
+    return jsonify({
+        "status":"healthy","service":"GitSync Bot","timestamp": datetime.now(timezone.utc).isoformat(),
+        # background executor backlog (per worker process); polled by benchmarks/replay.py
+        "queue_depth": executor._work_queue.qsize(),
+        "worker_threads": len(executor._threads),
+        "send_queue_depth": send_queue_depth(),
+        "model_breaker": model_breaker.state,
+        "model_backend": get_backend().name
+    })
 
 @app.route('/test-db', methods=['GET'])
 def test_db():
@@ -1225,6 +1329,17 @@ with app.app_context():
     init_db()
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'init_db_sync':
+        # init_db() already ran on import above; a missing model is logged, not fatal
+        validate_models(MODEL_TIERS)
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == 'refresh_leaderboards':
+        print(f"Refreshed {refresh_all_leaderboards()} leaderboard snapshot(s).")
+        sys.exit(0)
+    if len(sys.argv) > 1 and sys.argv[1] == 'maintain_updates':
+        created, archived = run_updates_retention()
+        print(f"Created {created} partition(s), archived {archived} summaries.")
+        sys.exit(0)
     import os
     port = int(os.environ.get("PORT", 5000))
     # debug=False in production
@@ -9,7 +9,22 @@ PYTHON_EXEC="/usr/local/bin/python"
 echo "Running database initialization and migration..."
 $PYTHON_EXEC server.py init_db_sync
 
-# --- 2. Start Gunicorn (The Web Server) ---
+# --- 2. Prometheus multiprocess metrics ---
+# Gunicorn workers share metrics through files in this directory; it must be
+# empty at boot or stale counters from the previous run are served.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/gitsync_prom}"
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# --- 3. Start the web server ---
+# SERVER_MODE=asgi runs asgi_app (async /webhook, /telegram_commands, /dashboard
+# with the Flask app mounted for everything else) on uvicorn; default is the
+# original gunicorn sync setup.
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    echo "Starting Uvicorn (ASGI mode)..."
+    exec uvicorn asgi_app:app --host 0.0.0.0 --port $PORT --workers ${ASGI_WORKERS:-1} --timeout-keep-alive 75
+fi
+
 # We use exec to ensure Gunicorn replaces the shell process.
 # --timeout 120: Increases the worker boot timeout from 60s to 120s (crucial for slow DB connections).
 # --workers 2: Standard worker count for better concurrency.
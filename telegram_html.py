@@ -0,0 +1,221 @@
+import re
+import html
+
+# Single-pass normalizer from "whatever HTML the model produced" to the subset
+# Telegram's parse_mode=HTML accepts. One compiled tokenizer walks the text
+# once; whitelisted tags are kept (with only their allowed attributes), list /
+# paragraph / heading markup is turned into plain-text layout, unknown tags are
+# dropped, stray < > & are escaped and every open tag is closed, so the result
+# never trips "can't parse entities" on send.
+
+ALLOWED_TAGS = {'b', 'strong', 'i', 'em', 'u', 'ins', 's', 'strike', 'del',
+                'a', 'code', 'pre', 'blockquote', 'span', 'tg-spoiler', 'tg-emoji'}
+# Telegram rejects markup nested inside these
+LITERAL_TAGS = {'code', 'pre'}
+SUPPORTED_NAMED_ENTITIES = {'lt', 'gt', 'amp', 'quot'}
+
+_TOKEN = re.compile(
+    r"```[a-zA-Z]*"                                         # markdown code fences (dropped)
+    r"|<(?P<close>/)?(?P<tag>[a-zA-Z][a-zA-Z0-9-]*)"
+    r"(?P<attrs>(?:\s(?:\"[^\"]*\"|'[^']*'|[^<>\"'])*)?)/?>"  # quoted values may hold < or >
+    r"|&(?P<entity>#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[a-zA-Z][a-zA-Z0-9]{1,31});"
+    r"|[<>&]"
+)
+_ATTR = re.compile(r"""([a-zA-Z-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""")
+_HEADING = re.compile(r"h[1-6]")
+
+def _attrs(raw):
+    return {m.group(1).lower(): html.unescape(m.group(2) or m.group(3) or m.group(4) or '')
+            for m in _ATTR.finditer(raw or '')}
+
+def _open_tag(tag, raw_attrs):
+    """Opening markup for an allowed tag, or None when its required attributes are missing."""
+    attrs = _attrs(raw_attrs)
+    if tag == 'a':
+        href = attrs.get('href', '')
+        if not re.match(r"(https?|tg)://|mailto:", href):
+            return None
+        return f'<a href="{html.escape(href, quote=True)}">'
+    if tag == 'span':
+        return '<span class="tg-spoiler">' if attrs.get('class') == 'tg-spoiler' else None
+    if tag == 'tg-emoji':
+        emoji_id = attrs.get('emoji-id', '')
+        return f'<tg-emoji emoji-id="{emoji_id}">' if emoji_id.isdigit() else None
+    if tag == 'code' and attrs.get('class', '').startswith('language-'):
+        return f'<code class="{html.escape(attrs["class"], quote=True)}">'
+    if tag == 'blockquote' and re.search(r"\bexpandable\b", raw_attrs or ''):
+        return '<blockquote expandable>'
+    return f'<{tag}>'
+
+def sanitize_telegram_html(text):
+    """Return text that is valid for Telegram parse_mode=HTML (idempotent on valid input)."""
+    if not text:
+        return ''
+    out = []
+    stack = []        # open allowed tags, innermost last
+    pos = 0
+    for m in _TOKEN.finditer(text):
+        if m.start() > pos:
+            out.append(text[pos:m.start()])
+        pos = m.end()
+        token = m.group(0)
+        in_literal = bool(stack) and stack[-1] in LITERAL_TAGS
+
+        if token.startswith('```'):
+            continue
+        if m.group('entity') is not None:
+            name = m.group('entity')
+            if name.startswith('#') or name in SUPPORTED_NAMED_ENTITIES:
+                out.append(token)
+            else:
+                # e.g. &nbsp; / &mdash;: resolve, then escape whatever it stands for
+                resolved = html.unescape(token)
+                out.append(html.escape(resolved, quote=False) if resolved != token else '&amp;' + token[1:])
+            continue
+        if len(token) == 1:
+            out.append({'<': '&lt;', '>': '&gt;', '&': '&amp;'}[token])
+            continue
+
+        tag = m.group('tag').lower()
+        closing = bool(m.group('close'))
+
+        code_in_pre = tag == 'code' and not closing and stack and stack[-1] == 'pre'
+        if in_literal and not code_in_pre and not (closing and tag == stack[-1]):
+            # no nested markup inside code/pre (except <pre><code>): keep it visible as text
+            out.append(html.escape(token, quote=False))
+            continue
+
+        if tag == 'br':
+            out.append('\n')
+        elif tag in ('ul', 'ol'):
+            continue
+        elif tag == 'li':
+            out.append('\n' if closing else '• ')
+        elif tag == 'p':
+            if closing:
+                out.append('\n\n')
+        elif _HEADING.fullmatch(tag):
+            # headings become a bold line
+            if not closing:
+                out.append('<b>')
+                stack.append('b')
+            elif stack and stack[-1] == 'b':
+                stack.pop()
+                out.append('</b>\n')
+            else:
+                out.append('\n')
+        elif tag not in ALLOWED_TAGS:
+            continue
+        elif closing:
+            if tag not in stack:
+                continue
+            # close anything left open inside it so nesting stays balanced
+            while stack:
+                top = stack.pop()
+                out.append(f'</{top}>')
+                if top == tag:
+                    break
+        else:
+            if tag == 'a' and 'a' in stack:
+                continue
+            opening = _open_tag(tag, m.group('attrs'))
+            if opening is None:
+                continue
+            out.append(opening)
+            stack.append(tag)
+
+    if pos < len(text):
+        out.append(text[pos:])
+    while stack:
+        out.append(f'</{stack.pop()}>')
+    return ''.join(out)
+
+# --- Splitting at Telegram's message limit ---
+TELEGRAM_MESSAGE_LIMIT = 4096
+# text runs without whitespace longer than this are cut (only possible inside long URLs / paths)
+_MAX_ATOM = 1024
+_ATOM = re.compile(r"<[^>]*>|&[^;\s<&]{1,32};|\n|[^\S\n]+|[^\s<&]+|&")
+_TAG_NAME = re.compile(r"</?([a-zA-Z][a-zA-Z0-9-]*)")
+
+def telegram_length(text):
+    # Telegram counts UTF-16 code units; raw markup is always >= the parsed length
+    return len(text.encode('utf-16-le')) // 2
+
+def _atoms(text):
+    for a in _ATOM.findall(text):
+        if len(a) > _MAX_ATOM and not a.startswith(('<', '&')):
+            for k in range(0, len(a), _MAX_ATOM):
+                yield a[k:k + _MAX_ATOM]
+        else:
+            yield a
+
+def _apply(stack, atom):
+    """Track open tags across an atom; returns the new stack (a copy when it changes)."""
+    if not atom.startswith('<'):
+        return stack
+    m = _TAG_NAME.match(atom)
+    if not m:
+        return stack
+    name = m.group(1).lower()
+    if atom.startswith('</'):
+        for k in range(len(stack) - 1, -1, -1):
+            if stack[k][0] == name:
+                return stack[:k]
+        return stack
+    return stack + [(name, atom)]
+
+def _closers(stack):
+    return ''.join(f'</{name}>' for name, _ in reversed(stack))
+
+def split_telegram_html(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """
+    Split sanitized HTML into messages of at most `limit` units. Prefers blank
+    lines (section breaks), then line ends, then spaces; never cuts inside a tag
+    or entity, and closes / re-opens formatting tags across the cut.
+    """
+    if telegram_length(text) <= limit:
+        return [text]
+    atoms = list(_atoms(text))
+    chunks = []
+    stack = []
+    i = 0
+    while i < len(atoms):
+        while i < len(atoms) and atoms[i].isspace():
+            i += 1
+        if i >= len(atoms):
+            break
+        reopen = ''.join(opening for _, opening in stack)
+        size = telegram_length(reopen)
+        st = stack
+        cut = None            # (priority, index after break, stack at break)
+        j = i
+        while j < len(atoms):
+            atom = atoms[j]
+            new_st = _apply(st, atom)
+            atom_len = telegram_length(atom)
+            if size + atom_len + len(_closers(new_st)) > limit and j > i:
+                break
+            size += atom_len
+            st = new_st
+            j += 1
+            if atom == '\n':
+                priority = 2 if j >= 2 and atoms[j - 2] == '\n' else 1
+            elif atom.isspace():
+                priority = 0
+            else:
+                continue
+            if cut is None or priority >= cut[0] or size < limit // 2:
+                cut = (priority, j, st)
+        if j >= len(atoms) or cut is None:
+            end, end_stack = j, st
+        else:
+            _, end, end_stack = cut
+        body = ''.join(atoms[i:end]).rstrip()
+        chunks.append(reopen + body + _closers(end_stack))
+        stack = end_stack
+        i = end
+    return [c for c in chunks if c.strip()]
+
+def html_to_text(text):
+    """Plain-text rendering of Telegram HTML (for document attachments)."""
+    return html.unescape(re.sub(r"<[^>]+>", "", text))
@@ -0,0 +1,193 @@
+"""
+Long-polling Telegram update consumer (alternative to the /telegram_commands webhook).
+
+Runs as its own process so command handling does not compete with HTTP
+workers for threads:
+
+    python telegram_poller.py [--delete-webhook] [--once]
+
+Each getUpdates batch is dispatched concurrently across chats (updates of one
+chat stay in order) into server.handle_telegram_update; replies go out via the
+send queue. The next offset is stored in telegram_update_offsets only after
+the whole batch has been handled, so a crash re-delivers instead of dropping.
+
+Telegram allows one getUpdates consumer per bot, so extra replicas wait on a
+Postgres advisory lock and take over if the active one dies.
+"""
+import argparse
+import os
+import sys
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import server
+from metrics import record_telegram_response
+from telegram_queue import enqueue_send, drain
+
+POLL_TIMEOUT = int(os.getenv("TELEGRAM_POLL_TIMEOUT", "30"))
+POLL_LIMIT = int(os.getenv("TELEGRAM_POLL_LIMIT", "100"))
+POLL_CONCURRENCY = int(os.getenv("TELEGRAM_POLL_CONCURRENCY", "8"))
+POLL_ERROR_BACKOFF = 5
+
+def bot_id(token):
+    # the numeric prefix of the token identifies the bot without storing the secret
+    return token.split(':', 1)[0]
+
+def load_offset(conn, bot):
+    with conn.cursor() as c:
+        c.execute("SELECT next_offset FROM telegram_update_offsets WHERE bot_id = %s", (bot,))
+        r = c.fetchone()
+    return r[0] if r else None
+
+def save_offset(conn, bot, next_offset):
+    with conn.cursor() as c:
+        c.execute("""
+            INSERT INTO telegram_update_offsets (bot_id, next_offset, updated_at)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (bot_id) DO UPDATE SET next_offset = EXCLUDED.next_offset, updated_at = NOW()
+        """, (bot, next_offset))
+    conn.commit()
+
+def acquire_consumer_lock(conn, bot):
+    """Block until this process is the single consumer for the bot (session-level advisory lock)."""
+    key = zlib.crc32(f"telegram_poller:{bot}".encode())
+    with conn.cursor() as c:
+        c.execute("SELECT pg_try_advisory_lock(%s)", (key,))
+        if not c.fetchone()[0]:
+            print(f"Another poller holds the lock for bot {bot}; waiting...")
+            c.execute("SELECT pg_advisory_lock(%s)", (key,))
+    # the lock is session-level; don't leave the connection idle in transaction
+    conn.commit()
+
+def reconnect(conn, bot):
+    """
+    New connection after a DB error, holding the consumer lock again. The lock
+    went with the old session, so another replica may have taken over meanwhile.
+    """
+    try:
+        conn.close()
+    except Exception:
+        pass
+    while True:
+        conn = server.get_db_connection()
+        if conn:
+            try:
+                acquire_consumer_lock(conn, bot)
+                return conn
+            except Exception as e:
+                print("poller reconnect error:", e)
+                conn.close()
+        time.sleep(POLL_ERROR_BACKOFF)
+
+def get_updates(session, token, offset):
+    url = f"{server.TELEGRAM_API_BASE}/bot{token}/getUpdates"
+    payload = {"timeout": POLL_TIMEOUT, "limit": POLL_LIMIT, "allowed_updates": ["message"]}
+    if offset is not None:
+        payload["offset"] = offset
+    r = session.post(url, json=payload, timeout=POLL_TIMEOUT + 10)
+    record_telegram_response('getUpdates', r.status_code)
+    if r.status_code != 200:
+        raise RuntimeError(f"getUpdates {r.status_code}: {r.text[:200]}")
+    return r.json().get('result', [])
+
+def update_chat_id(update):
+    for key in ('message', 'edited_message', 'callback_query'):
+        obj = update.get(key)
+        if obj:
+            return (obj.get('chat') or obj.get('message', {}).get('chat') or {}).get('id')
+    return None
+
+def handle_one(token, update):
+    try:
+        reply = server.handle_telegram_update(update)
+        if reply:
+            reply = dict(reply)
+            method = reply.pop('method', 'sendMessage')
+            enqueue_send(token, reply, method)
+    except Exception as e:
+        print("poller handle error:", e, "update_id:", update.get('update_id'))
+
+def dispatch_batch(pool, token, updates):
+    """Run a batch: chats in parallel, each chat's updates sequentially."""
+    by_chat = OrderedDict()
+    for u in updates:
+        by_chat.setdefault(update_chat_id(u), []).append(u)
+
+    def run_chat(chat_updates):
+        for u in chat_updates:
+            handle_one(token, u)
+
+    for f in [pool.submit(run_chat, ups) for ups in by_chat.values()]:
+        f.result()
+
+def run(once=False, delete_webhook=False):
+    token = server.TELEGRAM_BOT_TOKEN_FOR_COMMANDS
+    if not token:
+        print("TELEGRAM_BOT_TOKEN_FOR_COMMANDS is not set.")
+        return 1
+    bot = bot_id(token)
+    conn = server.get_db_connection()
+    if not conn:
+        return 1
+    session = requests.Session()
+    try:
+        acquire_consumer_lock(conn, bot)
+        if delete_webhook:
+            # getUpdates returns 409 while a webhook is registered
+            r = session.post(f"{server.TELEGRAM_API_BASE}/bot{token}/deleteWebhook", json={}, timeout=15)
+            print("deleteWebhook:", r.status_code)
+        offset = saved_offset = load_offset(conn, bot)
+        print(f"Polling getUpdates for bot {bot} from offset {offset}.")
+        with ThreadPoolExecutor(max_workers=POLL_CONCURRENCY) as pool:
+            while True:
+                try:
+                    updates = get_updates(session, token, offset)
+                except Exception as e:
+                    print("getUpdates error:", e)
+                    if once:
+                        return 1
+                    time.sleep(POLL_ERROR_BACKOFF)
+                    continue
+                if updates:
+                    dispatch_batch(pool, token, updates)
+                    offset = max(u['update_id'] for u in updates) + 1
+                if offset != saved_offset:
+                    # a failed save is retried on the next loop; until then a crash re-delivers the batch
+                    try:
+                        save_offset(conn, bot, offset)
+                        saved_offset = offset
+                    except Exception as e:
+                        print("save_offset error:", e)
+                        if once:
+                            return 1
+                        time.sleep(POLL_ERROR_BACKOFF)
+                        if conn.closed:
+                            conn = reconnect(conn, bot)
+                            # another replica may have consumed updates while we had no lock
+                            saved_offset = load_offset(conn, bot)
+                            if saved_offset is not None and saved_offset > offset:
+                                offset = saved_offset
+                        else:
+                            conn.rollback()
+                        continue
+                if once:
+                    # let background work (token checks) and queued replies finish before exiting
+                    server.executor.shutdown(wait=True)
+                    drain()
+                    return 0
+    finally:
+        conn.close()
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--once', action='store_true', help='process a single getUpdates batch and exit')
+    p.add_argument('--delete-webhook', action='store_true', help='unregister the Bot API webhook before polling')
+    args = p.parse_args(argv)
+    return run(once=args.once, delete_webhook=args.delete_webhook)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+import os
+import time
+import queue
+import threading
+
+from metrics import TELEGRAM_QUEUE_DEPTH
+
+# Background Telegram send queue. Callers enqueue Bot API calls and return
+# immediately; worker threads deliver them, sleeping through 429 retry_after
+# and retrying 5xx/network errors with backoff. Messages are sharded by
+# chat_id so each chat's messages are delivered in the order they were queued.
+#
+# The sender is injected (server.telegram_post) to avoid importing server here.
+
+SEND_QUEUE_WORKERS = int(os.getenv("SEND_QUEUE_WORKERS", "4"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "4"))
+SEND_MAX_RETRY_AFTER = 60  # cap on a single 429 back-off (seconds)
+
+_post = None
+_shards = []
+_start_lock = threading.Lock()
+
+def configure_send_queue(post):
+    """post(token, payload, method, files=None) -> response; called once by server at import."""
+    global _post
+    _post = post
+
+def _ensure_started():
+    # threads are started lazily so gunicorn workers (not the master) own them
+    if _shards:
+        return
+    with _start_lock:
+        if _shards:
+            return
+        shards = [queue.Queue() for _ in range(SEND_QUEUE_WORKERS)]
+        for i, q in enumerate(shards):
+            threading.Thread(target=_worker, args=(q,), daemon=True, name=f"telegram-send-{i}").start()
+        _shards.extend(shards)
+
+def enqueue_send(token, payload, method="sendMessage", files=None):
+    """Queue one Bot API call (files= for multipart uploads); never blocks on the network."""
+    if not token or payload.get('chat_id') is None:
+        return
+    _ensure_started()
+    shard = _shards[hash(str(payload['chat_id'])) % len(_shards)]
+    TELEGRAM_QUEUE_DEPTH.inc()
+    shard.put((token, method, payload, files))
+
+def queue_depth():
+    return sum(q.qsize() for q in _shards)
+
+def drain(timeout=30.0):
+    """Wait until every queued send has been attempted; True if the queue emptied in time."""
+    deadline = time.monotonic() + timeout
+    while any(q.unfinished_tasks for q in _shards):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+def _retry_after(r):
+    try:
+        return min(float(r.json().get('parameters', {}).get('retry_after', 1)), SEND_MAX_RETRY_AFTER)
+    except Exception:
+        return 1.0
+
+def post_once(token, payload, method="sendMessage"):
+    """Single attempt, no retries (progress edits that the next edit supersedes anyway)."""
+    try:
+        return _post(token, payload, method)
+    except Exception as e:
+        print("telegram send error:", e)
+        return None
+
+def deliver(token, method, payload, files=None):
+    """Send with retries in the calling thread; returns the last response or None."""
+    r = None
+    for attempt in range(SEND_MAX_RETRIES + 1):
+        try:
+            r = _post(token, payload, method, files=files) if files else _post(token, payload, method)
+        except Exception as e:
+            print("telegram send error:", e)
+            r = None
+        if r is not None and r.status_code == 200:
+            return r
+        if r is not None and r.status_code == 429:
+            time.sleep(_retry_after(r))
+            continue
+        if r is not None and r.status_code < 500:
+            # 400/403: retrying the same payload won't help
+            print("Telegram send failed:", r.status_code, r.text)
+            return r
+        time.sleep(min(2 ** attempt, 30))
+    print("Telegram send gave up after retries:", method, payload.get('chat_id'))
+    return r
+
+def _worker(q):
+    while True:
+        token, method, payload, files = q.get()
+        TELEGRAM_QUEUE_DEPTH.dec()
+        try:
+            deliver(token, method, payload, files)
+        except Exception as e:
+            print("send queue worker error:", e)
+        finally:
+            q.task_done()
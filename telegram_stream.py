@@ -0,0 +1,70 @@
+import os
+import time
+
+from telegram_html import sanitize_telegram_html, split_telegram_html, TELEGRAM_MESSAGE_LIMIT
+from telegram_queue import deliver, post_once, enqueue_send
+
+# Progressive Telegram message for streamed model output: the header goes out
+# at once, then the same message is edited as text arrives. Edits are
+# throttled (Telegram allows roughly one edit per second per chat, less in
+# busy groups) and a 429 just skips that edit; the final edit always runs.
+
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.5"))
+STREAM_CURSOR = " ▌"
+
+class StreamingMessage:
+    def __init__(self, token, chat_id, header, min_interval=STREAM_EDIT_INTERVAL):
+        self.token = token
+        self.chat_id = chat_id
+        self.header = header
+        self.min_interval = min_interval
+        self.message_id = None
+        self._last_edit = 0.0
+        self._last_text = None
+
+    def _text(self, body, partial):
+        text = f"{self.header}\n\n{sanitize_telegram_html(body)}"
+        if not partial:
+            return text
+        budget = TELEGRAM_MESSAGE_LIMIT - len(STREAM_CURSOR)
+        return split_telegram_html(text, limit=budget)[0] + STREAM_CURSOR
+
+    def start(self, placeholder="⏳ <i>Summarizing…</i>"):
+        """Post the header right away; without a message_id later calls fall back to plain sends."""
+        r = deliver(self.token, "sendMessage", {"chat_id": self.chat_id, "parse_mode": "HTML",
+                                                "text": f"{self.header}\n\n{placeholder}"})
+        if r is not None and r.status_code == 200:
+            self.message_id = r.json().get('result', {}).get('message_id')
+            self._last_edit = time.monotonic()
+        return self.message_id is not None
+
+    def update(self, body):
+        """Throttled progress edit with the text streamed so far."""
+        if self.message_id is None or time.monotonic() - self._last_edit < self.min_interval:
+            return
+        text = self._text(body, partial=True)
+        if text == self._last_text:
+            return
+        self._last_edit = time.monotonic()
+        r = post_once(self.token, {"chat_id": self.chat_id, "message_id": self.message_id,
+                                   "text": text, "parse_mode": "HTML"}, "editMessageText")
+        if r is not None and r.status_code == 200:
+            self._last_text = text
+
+    def full_text(self, body):
+        """Final message text (header + sanitized body), to be split by the caller."""
+        return self._text(body, partial=False)
+
+    def finish(self, parts):
+        """Final content: edit the message to the first part, queue the remaining parts after it."""
+        if self.message_id is None:
+            for part in parts:
+                enqueue_send(self.token, {"chat_id": self.chat_id, "text": part, "parse_mode": "HTML"})
+            return
+        r = deliver(self.token, "editMessageText", {"chat_id": self.chat_id, "message_id": self.message_id,
+                                                     "text": parts[0], "parse_mode": "HTML"})
+        if r is None or r.status_code != 200:
+            # edit lost (message deleted, too old...): send the result as a new message instead
+            enqueue_send(self.token, {"chat_id": self.chat_id, "text": parts[0], "parse_mode": "HTML"})
+        for part in parts[1:]:
+            enqueue_send(self.token, {"chat_id": self.chat_id, "text": part, "parse_mode": "HTML"})
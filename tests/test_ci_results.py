@@ -0,0 +1,157 @@
+import pytest
+
+import ci_results
+from ci_results import CIBatcher, ci_row
+from events import parse_event
+
+def run(gh_event, run_id, status='completed', conclusion='success', pr_ids=(7,), started_at='t0'):
+    return parse_event(gh_event, {gh_event: {
+        'id': run_id, 'status': status, 'conclusion': conclusion if status == 'completed' else None,
+        'started_at': started_at, 'completed_at': 't1' if status == 'completed' else None, 'updated_at': 't1',
+        'pull_requests': [{'id': p} for p in pr_ids],
+    }})
+
+def test_ci_row_is_keyed_by_kind():
+    assert ci_row(run('check_run', 5))[:3] == ('check_run', 5, 7)
+    assert ci_row(run('workflow_run', 5))[:3] == ('workflow_run', 5, 7)
+
+def test_ci_row_without_pr_is_none():
+    assert ci_row(run('check_run', 5, pr_ids=())) is None
+
+class FakeConn:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.commits = 0
+        self.closed = False
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        if self.fail:
+            self.closed = True
+            raise RuntimeError("connection already closed")
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def written(monkeypatch):
+    """
+    Rows handed to execute_values; raises when the connection is marked as
+    failing, or when a row's started_at is 'bad' (like an un-castable timestamp).
+    """
+    rows = []
+    def execute_values(c, sql, values, page_size, fetch):
+        if c.fail:
+            raise RuntimeError("connection lost")
+        if any(v[4] == 'bad' for v in values):
+            raise ValueError("invalid input syntax for type timestamp with time zone")
+        rows.extend(values)
+        return [(v[2],) for v in values]
+    monkeypatch.setattr(ci_results, 'execute_values', execute_values)
+    return rows
+
+def batcher(conn, on_flush=None):
+    b = CIBatcher(connect=lambda: conn, on_flush=on_flush, batch_size=100, interval=60)
+    b._thread = object()        # keep the background thread out of the tests
+    return b
+
+def test_burst_for_one_run_is_coalesced(written):
+    b = batcher(FakeConn())
+    b.add(run('check_run', 5, status='queued'), 1)
+    b.add(run('check_run', 5, status='in_progress'), 1)
+    b.add(run('check_run', 5), 1)
+    b.add(run('check_suite', 5), 1)       # same id, different kind
+    assert b.pending() == 2
+    assert b.flush() == 2
+    assert sorted((r[0], r[3]) for r in written) == [('check_run', 'success'), ('check_suite', 'success')]
+
+def test_in_progress_never_replaces_completed(written):
+    b = batcher(FakeConn())
+    b.add(run('check_run', 5, conclusion='failure'), 1)
+    b.add(run('check_run', 5, status='in_progress'), 1)
+    b.flush()
+    assert written[0][3] == 'failure' and written[0][5] == 't1'
+
+def test_newer_completed_result_wins(written):
+    b = batcher(FakeConn())
+    b.add(run('check_run', 5, conclusion='failure'), 1)
+    b.add(run('check_run', 5, conclusion='success'), 1)
+    b.flush()
+    assert written[0][3] == 'success'
+
+def test_failed_flush_requeues_the_batch(written):
+    conn = FakeConn(fail=True)
+    b = batcher(conn)
+    b.add(run('check_run', 5), 1)
+    assert b.flush() is None
+    assert b.pending() == 1 and conn.closed
+    conn.fail = False
+    assert b.flush() == 1
+    assert b.pending() == 0
+
+def test_requeue_keeps_newer_rows_queued_meanwhile(written):
+    b = batcher(FakeConn())
+    b.add(run('check_run', 5, status='in_progress'), 1)
+    batch = b._pending
+    b._pending = {}
+    b.add(run('check_run', 5), 1)               # arrived while the batch was in flight
+    b.add(run('check_run', 6, status='in_progress'), 1)
+    b._requeue(batch)
+    b._requeue({('check_run', 6): (ci_row(run('check_run', 6)), '1')})
+    assert b._pending[('check_run', 5)][0][3] == 'success'
+    assert b._pending[('check_run', 6)][0][3] == 'success'    # a completed requeued row still beats in_progress
+
+def test_unavailable_db_requeues(written):
+    b = CIBatcher(connect=lambda: None, batch_size=100, interval=60)
+    b._thread = object()
+    b.add(run('check_run', 5), 1)
+    assert b.flush() is None
+    assert b.pending() == 1
+
+def test_on_flush_gets_chats_and_its_errors_are_contained(written):
+    seen = []
+    def on_flush(conn, chats):
+        seen.append(chats)
+        raise RuntimeError("refresh failed")
+    b = batcher(FakeConn(), on_flush)
+    b.add(run('check_run', 5), 1)
+    b.add(run('check_run', 6), 2)
+    assert b.flush() == 2
+    assert seen == [{'1', '2'}]
+    assert b.pending() == 0
+
+def test_events_without_pr_are_not_queued(written):
+    b = batcher(FakeConn())
+    assert b.add(run('check_run', 5, pr_ids=()), 1) is False
+    assert b.flush() == 0
+
+def test_bad_row_does_not_block_the_others(written):
+    b = batcher(FakeConn())
+    b.add(run('check_run', 5), 1)
+    b.add(run('check_run', 6, started_at='bad'), 1)
+    b.add(run('check_run', 7), 1)
+    assert b.flush() == 2
+    assert sorted(r[1] for r in written) == [5, 7]
+    assert list(b._pending) == [('check_run', 6)]      # retried on the next flush
+
+def test_bad_row_is_dropped_after_max_attempts(written):
+    b = batcher(None)
+    b.connect = FakeConn        # a fresh connection per flush
+    b.add(run('check_run', 6, started_at='bad'), 1)
+    for _ in range(ci_results.CI_MAX_ROW_ATTEMPTS):
+        b.add(run('check_run', 5), 1)
+        b.flush()
+    assert b.pending() == 0
+    assert b._failures == {}
+    assert [r[1] for r in written] == [5] * ci_results.CI_MAX_ROW_ATTEMPTS
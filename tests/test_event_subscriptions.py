@@ -0,0 +1,65 @@
+import pytest
+
+from event_subscriptions import (parse_subscription, Subscription, SubscriptionCache, DEFAULT_EVENTS,
+                                 ROUTE_ACK, ROUTE_CI, ROUTE_HANDLE, ROUTE_IGNORE, ROUTE_PUSH)
+
+def test_no_arguments_means_defaults():
+    sub = parse_subscription([])
+    assert sub.events == frozenset(DEFAULT_EVENTS)
+    assert sub.repos == () and sub.branches == ()
+
+def test_events_repos_and_branches():
+    sub = parse_subscription(['push', 'issues', 'repo:Acme/*', 'branch:release/*', 'branch:main'])
+    assert sub.events == {'push', 'issues'}
+    assert sub.repos == ('acme/*',)
+    assert sub.branches == ('release/*', 'main')
+
+def test_filters_only_keep_default_events():
+    assert parse_subscription(['repo:acme/api']).events == frozenset(DEFAULT_EVENTS)
+
+@pytest.mark.parametrize("arg", ['bogus', 'ping', 'repo:', 'branch:', 'PUSH'])
+def test_rejects_unknown_arguments(arg):
+    with pytest.raises(ValueError) as exc:
+        parse_subscription(['push', arg])
+    assert str(exc.value) == arg
+
+def test_routes():
+    sub = Subscription(['push', 'pull_request', 'check_run'])
+    assert sub.route('push') == ROUTE_PUSH
+    assert sub.route('pull_request') == ROUTE_HANDLE
+    assert sub.route('check_run') == ROUTE_CI
+    assert sub.route('issues') == ROUTE_IGNORE        # known but not subscribed
+    assert sub.route('star') == ROUTE_IGNORE          # unknown
+    assert sub.route('ping') == ROUTE_ACK             # always answered
+
+def test_matches_repo_patterns_on_full_name_or_name():
+    sub = Subscription(repos=['acme/*', 'tools'])
+    assert sub.matches('acme/api', 'main')
+    assert sub.matches('ACME/Web', None)
+    assert sub.matches('other/tools', 'main')
+    assert not sub.matches('other/api', 'main')
+    assert not sub.matches(None, 'main')
+
+def test_matches_branch_patterns():
+    sub = Subscription(branches=['main', 'release/*'])
+    assert sub.matches('acme/api', 'main')
+    assert sub.matches('acme/api', 'release/1.2')
+    assert not sub.matches('acme/api', 'feature/x')
+    assert sub.matches('acme/api', None)              # issues have no branch
+
+def test_empty_filters_match_everything():
+    assert Subscription().matches('any/repo', 'any-branch')
+
+def test_cache_returns_default_for_unknown_chat():
+    cache = SubscriptionCache(lambda: {'1': Subscription(['push'])}, ttl=60)
+    assert cache.get(1).events == {'push'}
+    assert cache.get(2).events == frozenset(DEFAULT_EVENTS)
+
+def test_cache_keeps_old_map_when_reload_fails():
+    cache = SubscriptionCache(None, ttl=0)
+    cache.replace({'1': Subscription(['issues'])})
+    def broken():
+        raise RuntimeError("db down")
+    cache.loader = broken
+    assert cache.get('1').events == {'issues'}
+    assert not cache.reloading()
@@ -0,0 +1,101 @@
+import pytest
+
+from events import (parse_event, Commit, PushEvent, PullRequestEvent, ReviewEvent, IssueEvent,
+                    CheckRunEvent, WorkflowRunEvent, loads)
+
+REPO = {'name': 'api', 'full_name': 'acme/api', 'owner': {'login': 'acme'}, 'organization': 'acme'}
+
+def test_push():
+    event = parse_event('push', {
+        'ref': 'refs/heads/release/1.2', 'after': 'f' * 40, 'repository': REPO, 'pusher': {'name': 'ann'},
+        'commits': [{'id': 'c1', 'message': 'Fix', 'added': ['a.py'], 'removed': [], 'modified': ['b.py']}],
+    })
+    assert isinstance(event, PushEvent)
+    assert event.author == 'ann'
+    assert event.ref_name == 'release/1.2'
+    assert event.branch == '1.2'
+    assert event.repository.display_name == 'acme/api'
+    assert event.commits[0].files == ['a.py', 'b.py']
+
+def test_push_falls_back_to_head_commit():
+    event = parse_event('push', {'head_commit': {'id': 'c9', 'message': 'Only head'}})
+    assert [c.id for c in event.commits] == ['c9']
+
+def test_pull_request_and_review():
+    pr = {'id': 7, 'number': 3, 'title': 'Add', 'user': {'login': 'bob'}, 'head': {'ref': 'feat'}}
+    event = parse_event('pull_request', {'action': 'opened', 'pull_request': pr, 'repository': REPO})
+    assert isinstance(event, PullRequestEvent)
+    assert (event.pr_id, event.user, event.ref_name) == (7, 'bob', 'feat')
+    review = parse_event('pull_request_review', {'review': {'id': 9, 'user': {'login': 'cy'}, 'state': 'approved'},
+                                                 'pull_request': pr})
+    assert isinstance(review, ReviewEvent)
+    assert (review.review_id, review.reviewer, review.pr_id) == (9, 'cy', 7)
+
+def test_issue_labels():
+    event = parse_event('issues', {'issue': {'id': 1, 'labels': [{'name': 'bug'}, {'name': 'ui'}]}})
+    assert isinstance(event, IssueEvent)
+    assert event.labels == ['bug', 'ui']
+    assert event.ref_name is None
+
+def test_ci_runs():
+    run = parse_event('check_run', {'check_run': {'id': 5, 'status': 'completed', 'conclusion': 'failure',
+                                                  'completed_at': 't1', 'pull_requests': [{'id': 7}, {'number': 2}]}})
+    assert isinstance(run, CheckRunEvent)
+    assert (run.outcome, run.finished_at, run.pr_ids) == ('failure', 't1', [7])
+    wf = parse_event('workflow_run', {'workflow_run': {'id': 6, 'status': 'in_progress', 'updated_at': 't2',
+                                                       'check_suite': {'head_branch': 'main'}}})
+    assert isinstance(wf, WorkflowRunEvent)
+    assert (wf.outcome, wf.finished_at, wf.ref_name) == ('in_progress', None, 'main')
+
+def test_unknown_event_parses_as_push():
+    assert isinstance(parse_event('star', {}), PushEvent)
+
+EVENTS = ['push', 'pull_request', 'pull_request_review', 'issues', 'check_run', 'check_suite', 'workflow_run']
+
+def _touch(event):
+    """Read every attribute the handlers use."""
+    event.author, event.ref_name, event.repository.display_name, event.repository.full_name.lower()
+    for commit in getattr(event, 'commits', []):
+        commit.files, commit.message.splitlines()
+    if isinstance(event, PushEvent):
+        event.branch
+    if hasattr(event, 'outcome'):
+        event.outcome
+
+@pytest.mark.parametrize("gh_event", EVENTS)
+def test_wrong_types_at_the_top_level(gh_event):
+    # each top-level object replaced by a value of another JSON type
+    data = {'repository': 'acme/api', 'sender': ['x'], 'pusher': 3, 'commits': {'id': 1}, 'head_commit': [],
+            'ref': None, 'pull_request': 'x', 'review': 1.5, 'issue': True, 'check_run': [],
+            'check_suite': 'x', 'workflow_run': None}
+    _touch(parse_event(gh_event, data))
+
+@pytest.mark.parametrize("gh_event, data", [
+    ('push', {'repository': {'owner': 'acme', 'organization': {'login': 5}, 'full_name': 3},
+              'commits': [None, 1, {'id': 2, 'message': ['x'], 'added': 'a.py'}]}),
+    ('pull_request', {'pull_request': {'user': [], 'head': 'feat', 'id': 'x'}}),
+    ('pull_request_review', {'review': {'user': 'cy'}, 'pull_request': {'head': None}}),
+    ('issues', {'issue': {'labels': ['bug', None, {'name': 3}], 'closed_by': 5, 'user': 'x'}}),
+    ('check_run', {'check_run': {'pull_requests': [None, 'x', {'id': 7}], 'check_suite': 'x'}}),
+    ('workflow_run', {'workflow_run': {'check_suite': [], 'pull_requests': {}}}),
+])
+def test_wrong_types_in_nested_objects(gh_event, data):
+    _touch(parse_event(gh_event, data))
+
+@pytest.mark.parametrize("data", [None, [], 'x', 3])
+def test_non_dict_body(data):
+    _touch(parse_event('push', data))
+
+def test_commit_parse_ignores_non_dicts():
+    assert Commit.parse(['x']).files == []
+    assert Commit.parse({'added': 'a.py', 'message': 5}).files == []
+
+def test_commit_file_lists_keep_only_strings():
+    commit = Commit.parse({'added': ['a.py', 3, None], 'removed': [{'x': 1}], 'modified': ['b.py', ['c.py']]})
+    assert commit.files == ['a.py', 'b.py']
+    clean = ['a.py', 'b.py']
+    assert Commit.parse({'added': clean}).added is clean      # well-formed lists aren't copied
+
+def test_loads_rejects_bad_json():
+    with pytest.raises(ValueError):
+        loads(b'{nope')
@@ -0,0 +1,89 @@
+import json
+
+import flows
+from event_subscriptions import Subscription
+from webhook_auth import github_signature
+
+BODY = json.dumps({'ref': 'refs/heads/main', 'repository': {'name': 'api', 'full_name': 'acme/api'},
+                   'commits': [{'id': 'c1', 'message': 'Fix'}]}).encode()
+
+class FakeIO:
+    """The webhook half of ServerIO, with deliveries claimed in a set."""
+
+    def __init__(self, fail_dispatch=False):
+        self.fail_dispatch = fail_dispatch
+        self.claimed = set()
+        self.pushes = []
+
+    async def webhook_secret(self, chat_id, secret_key):
+        return ('key-1', 'signing-1')
+
+    async def subscription(self, chat_id):
+        return Subscription()
+
+    async def claim_delivery(self, delivery_id, chat_id, gh_event):
+        if delivery_id in self.claimed:
+            return False
+        self.claimed.add(delivery_id)
+        return True
+
+    async def release_delivery(self, delivery_id):
+        self.claimed.discard(delivery_id)
+
+    async def record_webhook(self, gh_event, delivery_id, data):
+        pass
+
+    def dispatch_push(self, event, chat_id):
+        if self.fail_dispatch:
+            raise RuntimeError("executor shut down")
+        self.pushes.append((event, chat_id))
+
+def deliver(io, body=BODY, delivery_id='d-1'):
+    headers = {'X-GitHub-Event': 'push', 'X-GitHub-Delivery': delivery_id,
+               'X-Hub-Signature-256': github_signature('signing-1', body)}
+    return flows.run_sync(flows.handle_webhook(io, {'chat_id': '42', 'secret_key': 'key-1'}, headers, body))
+
+def test_push_is_dispatched_once():
+    io = FakeIO()
+    assert deliver(io)[0] == 200
+    assert deliver(io) == (200, {"status": "duplicate", "message": "Delivery already processed"})
+    assert len(io.pushes) == 1
+
+def test_failed_dispatch_is_an_error_and_stays_claimable():
+    io = FakeIO(fail_dispatch=True)
+    status, payload = deliver(io)
+    assert status >= 500 and payload["status"] == "error"
+    assert 'd-1' not in io.claimed
+    io.fail_dispatch = False
+    assert deliver(io)[0] == 200          # GitHub's redelivery runs it
+    assert len(io.pushes) == 1
+
+def test_invalid_json_releases_the_claim():
+    io = FakeIO()
+    status, payload = deliver(io, body=b'{nope')
+    assert (status, payload["message"]) == (400, "Invalid JSON body.")
+    assert io.claimed == set()
+
+class SetupIO:
+    app_base_url = 'https://gitsync.example'
+    bot_username = 'gitsync_bot'
+
+    def __init__(self):
+        self.saved = None
+        self.sent = []
+
+    async def save_webhook_config(self, chat_id, secret_key, signing_secret):
+        self.saved = (chat_id, secret_key, signing_secret)
+
+    def queue_html(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+def test_gitsync_sends_the_signing_secret_privately():
+    io = SetupIO()
+    message = {'text': '/gitsync', 'chat': {'id': -100, 'type': 'group'}, 'from': {'id': 7}}
+    reply = flows.run_sync(flows.handle_command_message(io, message))
+    chat_id, secret_key, signing_secret = io.saved
+    assert reply['chat_id'] == -100
+    assert f"secret_key={secret_key}" in reply['text']
+    assert signing_secret not in reply['text']
+    assert io.sent == [(7, io.sent[0][1])] and signing_secret in io.sent[0][1]
@@ -0,0 +1,93 @@
+import pytest
+
+import model_guard
+from events import Commit
+from model_guard import CircuitBreaker, ModelTimeout, guarded_model_call, fallback_summary
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(model_guard.time, 'monotonic', c)
+    return c
+
+def test_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.state == 'closed' and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow()
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+
+def test_single_probe_after_reset_timeout(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 59
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.state == 'half-open'
+    assert breaker.allow()          # the probe
+    assert not breaker.allow()      # everyone else waits for it
+    assert breaker.state == 'half-open'
+
+def test_probe_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    assert breaker.allow()
+
+def test_probe_failure_restarts_the_wait(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record_failure()        # a failed probe reopens immediately, below the threshold
+    assert breaker.state == 'open'
+    clock.now += 30
+    assert not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+@pytest.fixture
+def breaker(monkeypatch):
+    b = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(model_guard, 'model_breaker', b)
+    return b
+
+def test_guarded_call_returns_result(breaker):
+    assert guarded_model_call(lambda deadline: 'ok', lambda: 'fallback') == 'ok'
+
+@pytest.mark.parametrize("error", [ModelTimeout("slow"), TimeoutError(), RuntimeError("503")])
+def test_guarded_call_falls_back_and_counts_failures(breaker, error):
+    def call(deadline):
+        raise error
+    assert guarded_model_call(call, lambda: 'fallback') == 'fallback'
+    assert guarded_model_call(call, lambda: 'fallback') == 'fallback'
+    assert breaker.state == 'open'
+    calls = []
+    assert guarded_model_call(lambda d: calls.append(d), lambda: 'short') == 'short'
+    assert calls == []
+
+def test_fallback_summary_lists_files_and_escapes():
+    text = fallback_summary(Commit(message="Fix <bug>\nbody", added=['a.py'], modified=[f'm{i}.py' for i in range(12)]), [])
+    assert "<b>Summary:</b> Fix &lt;bug&gt;" in text
+    assert "Added (1): <code>a.py</code>" in text
+    assert "Modified (12)" in text and "(+2 more)" in text
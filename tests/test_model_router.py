@@ -0,0 +1,52 @@
+from events import Commit
+from model_router import (classify_commit, route_for, prompt_budget, LARGE_MIN_FILES, LARGE_PROMPT_TOKEN_BUDGET,
+                          FAST_MODEL_NAME, PRO_MODEL_NAME)
+from prompt_builder import PROMPT_TOKEN_BUDGET
+
+def commit(message):
+    return Commit(id='abc', message=message)
+
+def test_merge_message_uses_template():
+    assert classify_commit(commit("Merge pull request #12 from org/feature"), ["src/app.py"]) == 'merge'
+    assert route_for('merge') == ('template', None)
+
+def test_compare_path_ignores_the_head_message():
+    # the diff covers the whole push; a PR-merge head doesn't make it a merge
+    merge = commit("Merge pull request #12 from org/feature")
+    assert classify_commit(merge, ["src/app.py", "src/db.py", "src/api.py"], lines_changed=120) == 'standard'
+    assert classify_commit(merge, ["src/app.py"], lines_changed=4) == 'trivial'
+    assert classify_commit(commit("Fix typo"), ["src/a.py"], lines_changed=80) == 'standard'
+    assert classify_commit(merge, ["README.md"], lines_changed=40) == 'docs'
+
+def test_docs_only():
+    assert classify_commit(commit("Update guide"), ["README.md", "docs/setup.rst", "CHANGELOG"]) == 'docs'
+
+def test_docs_mixed_with_code_is_not_docs():
+    assert classify_commit(commit("Update guide"), ["README.md", "src/app.py"], lines_changed=200) == 'standard'
+
+def test_large_by_file_count_or_lines():
+    assert classify_commit(commit("Refactor"), [f"src/m{i}.py" for i in range(LARGE_MIN_FILES)]) == 'large'
+    assert classify_commit(commit("Refactor"), ["src/a.py"], lines_changed=10_000) == 'large'
+
+def test_trivial_by_lines_on_compare_path():
+    assert classify_commit(commit("Adjust retry"), ["src/a.py"], lines_changed=3) == 'trivial'
+    assert classify_commit(commit("Adjust retry"), ["src/a.py"], lines_changed=80) == 'standard'
+
+def test_trivial_by_message_without_line_counts():
+    assert classify_commit(commit("Fix typo in error message\n\nlong body"), ["src/a.py"]) == 'trivial'
+    assert classify_commit(commit("Add retry to uploads"), ["src/a.py"]) == 'standard'
+
+def test_message_only_checks_first_line():
+    assert classify_commit(commit("Add uploads\n\nalso fixes a typo"), ["src/a.py"]) == 'standard'
+
+def test_no_files_and_no_message():
+    assert classify_commit(Commit(), []) == 'standard'
+
+def test_routes():
+    assert route_for('trivial') == ('fast', FAST_MODEL_NAME)
+    assert route_for('large') == ('pro', PRO_MODEL_NAME)
+    assert route_for('unknown') == ('pro', PRO_MODEL_NAME)
+
+def test_large_gets_a_bigger_prompt_budget():
+    assert prompt_budget('large') == LARGE_PROMPT_TOKEN_BUDGET > PROMPT_TOKEN_BUDGET
+    assert prompt_budget('standard') == PROMPT_TOKEN_BUDGET
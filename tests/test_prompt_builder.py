@@ -0,0 +1,51 @@
+from events import Commit
+from prompt_builder import build_prompt, compact_file_list, estimate_tokens, PROMPT_TEMPLATE
+
+def paths(n, dirs=20):
+    return [f"pkg{i % dirs}/sub{i % 3}/file{i}.py" for i in range(n)]
+
+def test_small_push_lists_every_file():
+    lines, listed = compact_file_list(["a.py", "src/b.py"], budget_tokens=500)
+    assert listed == 2
+    assert lines == ["    - a.py", "    - src/b.py"]
+
+def test_highest_churn_files_are_listed_first():
+    stats = {"a.py": (1, 0, 'modified'), "b.py": (300, 20, 'added'), "c.py": (40, 2, 'modified')}
+    lines, _ = compact_file_list(list(stats), stats, budget_tokens=500)
+    assert lines[0] == "    - b.py (+300/-20) [added]"
+    assert lines[1] == "    - c.py (+40/-2)"
+
+def test_file_list_stays_within_budget():
+    for n in (10, 500, 5000):
+        for budget in (60, 300, 1500):
+            lines, listed = compact_file_list(paths(n), budget_tokens=budget)
+            used = sum(estimate_tokens(l) + 1 for l in lines)
+            assert used <= budget or lines[-1].startswith("    - (other files)")
+            assert 0 <= listed <= n
+
+def test_collapsed_files_are_counted_by_directory():
+    files = paths(2000)
+    lines, listed = compact_file_list(files, budget_tokens=300)
+    assert listed < len(files)
+    assert sum(int(l.rsplit("(", 1)[1].split(" ")[0]) for l in lines[listed:]) == len(files) - listed
+
+def test_tiny_budget_collapses_to_one_line():
+    lines, listed = compact_file_list(paths(5000, dirs=500), budget_tokens=10)
+    assert listed == 0
+    assert lines == ["    - (other files) (5000 files)"]
+
+def test_build_prompt_respects_token_budget():
+    message = "Refactor everything\n\n" + "details " * 2000
+    budget = 800
+    prompt, info = build_prompt(Commit(message=message), paths(3000), budget_tokens=budget)
+    fixed = estimate_tokens(PROMPT_TEMPLATE)
+    assert info["tokens"] <= budget + 20     # a few tokens for the formatted counts
+    assert info["files"] == 3000
+    assert info["files_listed"] + info["files_collapsed"] == 3000
+    assert info["tokens"] > fixed
+    assert "…" in prompt    # message was truncated
+
+def test_build_prompt_without_files():
+    prompt, info = build_prompt(Commit(message="Empty"), [])
+    assert "(none)" in prompt
+    assert info["files_listed"] == 0 and info["files_collapsed"] == 0
@@ -0,0 +1,62 @@
+import re
+
+from telegram_html import sanitize_telegram_html, split_telegram_html, telegram_length
+
+def test_keeps_allowed_tags_and_drops_unknown():
+    assert sanitize_telegram_html("<b>bold</b> <div>x</div> <i>it</i>") == "<b>bold</b> x <i>it</i>"
+
+def test_escapes_stray_markup_characters():
+    assert sanitize_telegram_html("1 < 2 > 0 & done") == "1 &lt; 2 &gt; 0 &amp; done"
+
+def test_closes_unclosed_tags():
+    assert sanitize_telegram_html("<b><i>open") == "<b><i>open</i></b>"
+
+def test_unsupported_named_entity_is_resolved():
+    assert sanitize_telegram_html("a&nbsp;b &mdash; &lt;") == "a\xa0b — &lt;"
+
+def test_lists_and_headings_become_text_layout():
+    assert sanitize_telegram_html("<h2>Title</h2><ul><li>one</li><li>two</li></ul>") == "<b>Title</b>\n• one\n• two\n"
+
+def test_markup_inside_code_stays_visible():
+    assert sanitize_telegram_html("<code><b>x</b></code>") == "<code>&lt;b&gt;x&lt;/b&gt;</code>"
+
+def test_link_requires_safe_scheme():
+    assert sanitize_telegram_html('<a href="javascript:alert(1)">x</a>') == "x"
+    assert sanitize_telegram_html('<a href="https://e.com/a?b=1&amp;c=2">x</a>') == '<a href="https://e.com/a?b=1&amp;c=2">x</a>'
+
+def test_gt_inside_quoted_attribute_value():
+    # a > inside the quoted href must not end the tag early
+    assert sanitize_telegram_html('<a href="https://e.com/?q=a>b">link</a> ok') == '<a href="https://e.com/?q=a&gt;b">link</a> ok'
+    assert sanitize_telegram_html("<code class='language-a>b'>x</code>") == '<code class="language-a&gt;b">x</code>'
+
+def test_unterminated_quote_is_escaped_as_text():
+    assert sanitize_telegram_html('<a href="foo>bar') == '&lt;a href="foo&gt;bar'
+
+def test_idempotent_on_sanitized_output():
+    once = sanitize_telegram_html('<h1>T</h1><a href="https://e.com/?q=a>b">l</a> <b>x & y')
+    assert sanitize_telegram_html(once) == once
+
+def test_split_short_text_is_one_chunk():
+    assert split_telegram_html("<b>hi</b>") == ["<b>hi</b>"]
+
+def test_split_respects_limit_and_rebalances_tags():
+    text = "<b>" + " ".join(f"word{i}" for i in range(400)) + "</b>"
+    chunks = split_telegram_html(text, limit=200)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert telegram_length(chunk) <= 200
+        assert chunk.startswith("<b>") and chunk.endswith("</b>")
+    assert re.sub(r"</?b>", "", " ".join(chunks)).split() == [f"word{i}" for i in range(400)]
+
+def test_split_prefers_blank_lines():
+    text = "a" * 60 + "\n\n" + "b" * 60 + "\n" + "c" * 60
+    assert split_telegram_html(text, limit=130)[0] == "a" * 60
+
+def test_split_never_cuts_inside_entity():
+    text = "&amp; " * 100
+    for chunk in split_telegram_html(text, limit=50):
+        assert not re.search(r"&(?!amp;)", chunk)
+
+def test_split_counts_utf16_units():
+    text = " ".join(["\U0001F600"] * 100)    # each emoji is two UTF-16 units
+    assert all(telegram_length(c) <= 51 for c in split_telegram_html(text, limit=51))
@@ -0,0 +1,79 @@
+import pytest
+
+import webhook_auth
+from webhook_auth import check_webhook, github_signature, WebhookSecretCache
+
+BODY = b'{"ref":"refs/heads/main"}'
+SIGNED = ('key-1', 'signing-1')      # chat set up with a signing secret
+LEGACY = ('key-1', None)             # chat set up before signing secrets
+
+def test_valid_signature_with_signing_secret():
+    assert check_webhook(SIGNED, '42', 'key-1', BODY, github_signature('signing-1', BODY)) is None
+
+def test_signing_secret_requires_a_signature():
+    assert check_webhook(SIGNED, '42', 'key-1', BODY, None) == 'missing_signature'
+
+def test_url_key_is_not_a_valid_signing_key():
+    # the secret_key is in the URL; a signature made with it proves nothing
+    assert check_webhook(SIGNED, '42', 'key-1', BODY, github_signature('key-1', BODY)) == 'bad_signature'
+
+def test_tampered_body_is_rejected():
+    sig = github_signature('signing-1', BODY)
+    assert check_webhook(SIGNED, '42', 'key-1', BODY + b' ', sig) == 'bad_signature'
+
+def test_malformed_signature_header():
+    assert check_webhook(SIGNED, '42', 'key-1', BODY, 'sha1=abc') == 'bad_signature'
+
+@pytest.mark.parametrize("chat_secrets, chat_id, key, reason", [
+    (SIGNED, None, 'key-1', 'missing_params'),
+    (SIGNED, '42', '', 'missing_params'),
+    (None, '42', 'key-1', 'unknown_chat'),
+    (SIGNED, '42', 'key-2', 'bad_secret'),
+])
+def test_rejected_before_signature_check(chat_secrets, chat_id, key, reason):
+    assert check_webhook(chat_secrets, chat_id, key, BODY, github_signature('signing-1', BODY)) == reason
+
+def test_legacy_chat_accepts_unsigned_or_secret_key_signature():
+    assert check_webhook(LEGACY, '42', 'key-1', BODY, None) is None
+    assert check_webhook(LEGACY, '42', 'key-1', BODY, github_signature('key-1', BODY)) is None
+    assert check_webhook(LEGACY, '42', 'key-1', BODY, github_signature('other', BODY)) == 'bad_signature'
+
+def test_legacy_chat_unsigned_rejected_when_required(monkeypatch):
+    monkeypatch.setattr(webhook_auth, 'WEBHOOK_REQUIRE_SIGNATURE', True)
+    assert check_webhook(LEGACY, '42', 'key-1', BODY, None) == 'missing_signature'
+
+def test_cache_reloads_once_and_serves_pairs():
+    calls = []
+    def loader():
+        calls.append(1)
+        return {42: ('key-1', 'signing-1')}
+    cache = WebhookSecretCache(loader, ttl=300, miss_refresh=30)
+    assert cache.get(42, 'key-1') == ('key-1', 'signing-1')
+    assert cache.get('42', 'key-1') == ('key-1', 'signing-1')
+    assert len(calls) == 1
+
+def test_cache_miss_refresh_is_rate_limited():
+    calls = []
+    cache = WebhookSecretCache(lambda: calls.append(1) or {}, ttl=300, miss_refresh=30)
+    for _ in range(5):
+        assert cache.get('unknown', 'junk') is None
+    assert len(calls) == 1
+
+def test_failed_reload_keeps_serving():
+    cache = WebhookSecretCache(None)
+    cache.put('42', 'key-1', 'signing-1')
+    def broken():
+        raise RuntimeError("db down")
+    cache.loader = broken
+    assert cache.get('42', 'key-1') == ('key-1', 'signing-1')
+    assert not cache.reloading()
+
+def test_failed_reload_backs_off():
+    calls = []
+    def broken():
+        calls.append(1)
+        raise RuntimeError("db down")
+    cache = WebhookSecretCache(broken, ttl=300, miss_refresh=30)
+    for _ in range(5):
+        assert cache.get('42', 'key-1') is None
+    assert len(calls) == 1
@@ -0,0 +1,171 @@
+import os
+import functools
+from contextlib import contextmanager
+
+import psycopg2.extensions
+from flask import request, g
+
+# Optional OpenTelemetry tracing: one trace per incoming request (webhook
+# deliveries carry github.delivery_id), continued into background tasks, with
+# child spans for DB queries, GitHub/Telegram HTTP calls and model calls.
+#
+# Needs `opentelemetry-sdk` (plus `opentelemetry-exporter-otlp-proto-http` for
+# OTLP). Enabled by either
+#   OTEL_EXPORTER_OTLP_ENDPOINT=http://collector:4318   -> OTLP/HTTP export
+#   TRACE_FILE=/tmp/gitsync-traces.jsonl                 -> one JSON span per line
+# Without the packages or the env vars every helper here is a no-op.
+
+try:
+    from opentelemetry import trace, context as otel_context
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.trace import Status, StatusCode
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+TRACE_FILE = os.getenv("TRACE_FILE")
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "gitsync")
+# statements are recorded as-is (parameters are not), truncated to this length
+MAX_STATEMENT_LEN = 500
+
+_tracer = None
+
+def init_tracing():
+    """Install the tracer provider once per process; returns True when tracing is on."""
+    global _tracer
+    if _tracer is not None:
+        return True
+    if not OTEL_AVAILABLE or not (OTLP_ENDPOINT or TRACE_FILE):
+        return False
+    try:
+        provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+        if OTLP_ENDPOINT:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        if TRACE_FILE:
+            out = open(TRACE_FILE, 'a', buffering=1)
+            exporter = ConsoleSpanExporter(out=out, formatter=lambda s: s.to_json(indent=None) + "\n")
+            provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer("gitsync")
+        return True
+    except Exception as e:
+        print("init_tracing error:", e)
+        return False
+
+def tracing_enabled():
+    return _tracer is not None
+
+@contextmanager
+def span(name, **attributes):
+    """Child span of the current context; attributes with None values are skipped."""
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name) as s:
+        for k, v in attributes.items():
+            if v is not None:
+                s.set_attribute(k, v)
+        yield s
+
+def set_attributes(current, **attributes):
+    """Set attributes on a span yielded by span(); safe when tracing is off."""
+    if current is None:
+        return
+    for k, v in attributes.items():
+        if v is not None:
+            current.set_attribute(k, v)
+
+def http_span(service, method, url):
+    return span(f"{service} {method}", **{"http.method": method, "http.url": url.split('?', 1)[0],
+                                           "peer.service": service})
+
+def record_http_status(current, status_code):
+    set_attributes(current, **{"http.status_code": status_code})
+    if current is not None and status_code >= 400:
+        current.set_status(Status(StatusCode.ERROR))
+
+def propagate_context(fn):
+    """
+    Capture the caller's trace context now and run fn inside it later, under a
+    task span: used when handing work to the background executor.
+    """
+    if _tracer is None:
+        return fn
+    ctx = otel_context.get_current()
+    name = getattr(fn, '__name__', 'task')
+
+    @functools.wraps(fn)
+    def runner(*args, **kwargs):
+        token = otel_context.attach(ctx)
+        try:
+            with span(f"task {name}"):
+                return fn(*args, **kwargs)
+        finally:
+            otel_context.detach(token)
+    return runner
+
+class TracedCursor(psycopg2.extensions.cursor):
+    """Records a db.query span per execute(); pass as cursor_factory to psycopg2.connect."""
+
+    def execute(self, query, vars=None):
+        if _tracer is None:
+            return super().execute(query, vars)
+        statement = query.decode() if isinstance(query, bytes) else str(query)
+        with span("db.query", **{"db.system": "postgresql",
+                                 "db.statement": " ".join(statement.split())[:MAX_STATEMENT_LEN]}) as s:
+            result = super().execute(query, vars)
+            set_attributes(s, **{"db.rowcount": self.rowcount})
+            return result
+
+    def executemany(self, query, vars_list):
+        if _tracer is None:
+            return super().executemany(query, vars_list)
+        statement = query.decode() if isinstance(query, bytes) else str(query)
+        with span("db.query", **{"db.system": "postgresql",
+                                 "db.statement": " ".join(statement.split())[:MAX_STATEMENT_LEN]}):
+            return super().executemany(query, vars_list)
+
+def register_tracing(app):
+    """Open a server span per request; webhook deliveries are tagged with their GitHub IDs."""
+    if not init_tracing():
+        return
+
+    @app.before_request
+    def _start_span():
+        attrs = {
+            "http.method": request.method,
+            "http.route": request.url_rule.rule if request.url_rule else request.path,
+            "github.delivery_id": request.headers.get('X-GitHub-Delivery'),
+            "github.event": request.headers.get('X-GitHub-Event'),
+            "gitsync.chat_id": request.args.get('chat_id'),
+        }
+        s = _tracer.start_span(f"{request.method} {attrs['http.route']}", kind=trace.SpanKind.SERVER)
+        for k, v in attrs.items():
+            if v is not None:
+                s.set_attribute(k, v)
+        g._trace_span = s
+        g._trace_token = otel_context.attach(trace.set_span_in_context(s))
+
+    @app.after_request
+    def _status(response):
+        s = g.get('_trace_span')
+        if s is not None:
+            record_http_status(s, response.status_code)
+        return response
+
+    @app.teardown_request
+    def _end_span(exc):
+        s = g.pop('_trace_span', None)
+        token = g.pop('_trace_token', None)
+        if s is None:
+            return
+        if exc is not None:
+            s.record_exception(exc)
+            s.set_status(Status(StatusCode.ERROR))
+        s.end()
+        if token is not None:
+            otel_context.detach(token)
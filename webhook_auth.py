@@ -0,0 +1,129 @@
+import os
+import hmac
+import time
+import hashlib
+import threading
+
+from metrics import WEBHOOK_REJECTED
+
+# Webhook authentication without parsing or a DB round trip per request.
+# Every chat's secret_key (the routing key in the webhook URL) and signing
+# secret (the "Secret" set in GitHub's webhook form, sent by /gitsync in a
+# private message to whoever ran it and never part of the URL) are held in memory. The secret_key query parameter is
+# compared in constant time; for chats with a signing secret,
+# X-Hub-Signature-256 over the raw body is required, so a leaked URL alone
+# can't post events. Chats set up before signing secrets existed have none:
+# their deliveries are checked against the legacy secret_key HMAC when GitHub
+# sends one, until /gitsync is run again.
+#
+# The cache is reloaded in full every WEBHOOK_SECRET_TTL seconds, or sooner
+# when a chat_id is unknown or its secret_key doesn't match (a chat created or
+# re-keyed by /gitsync in another worker), at most once per
+# WEBHOOK_SECRET_MISS_REFRESH seconds so junk requests can't each cost a query.
+
+WEBHOOK_SECRET_TTL = int(os.getenv("WEBHOOK_SECRET_TTL", "300"))
+WEBHOOK_SECRET_MISS_REFRESH = int(os.getenv("WEBHOOK_SECRET_MISS_REFRESH", "30"))
+# also reject unsigned deliveries for legacy chats (only once every hook has a secret set in GitHub)
+WEBHOOK_REQUIRE_SIGNATURE = os.getenv("WEBHOOK_REQUIRE_SIGNATURE", "0") == "1"
+
+class WebhookSecretCache:
+    """
+    chat_id -> (secret_key, signing_secret or None). loader() returns the whole
+    mapping (sync callers); async callers use replace().
+    """
+
+    def __init__(self, loader=None, ttl=WEBHOOK_SECRET_TTL, miss_refresh=WEBHOOK_SECRET_MISS_REFRESH):
+        self.loader = loader
+        self.ttl = ttl
+        self.miss_refresh = miss_refresh
+        self._secrets = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def stale(self, chat_id, secret_key=None):
+        """True when a full reload is due before answering for chat_id (and the secret_key presented)."""
+        if self._loaded_at is None:
+            return True
+        age = time.monotonic() - self._loaded_at
+        if age >= self.ttl:
+            return True
+        cached = self._secrets.get(str(chat_id))
+        miss = cached is None or (secret_key is not None and not hmac.compare_digest(cached[0].encode(), secret_key.encode()))
+        return miss and age >= self.miss_refresh
+
+    def replace(self, secrets):
+        with self._lock:
+            self._secrets = {str(k): v for k, v in secrets.items()}
+            self._loaded_at = time.monotonic()
+
+    def put(self, chat_id, secret_key, signing_secret=None):
+        with self._lock:
+            self._secrets[str(chat_id)] = (secret_key, signing_secret)
+
+    def peek(self, chat_id):
+        return self._secrets.get(str(chat_id))
+
+    def begin_reload(self):
+        """Single flight: True for the one caller that should reload now (it must call end_reload())."""
+        return self._reload_lock.acquire(blocking=False)
+
+    def end_reload(self, failed=False):
+        if failed:
+            with self._lock:
+                # keep serving the old map; retry after ttl, or miss_refresh for an unknown chat
+                self._loaded_at = time.monotonic()
+        self._reload_lock.release()
+
+    def reloading(self):
+        return self._reload_lock.locked()
+
+    def get(self, chat_id, secret_key=None):
+        if self.loader is not None and self.stale(chat_id, secret_key):
+            if self.begin_reload():
+                failed = False
+                try:
+                    self.replace(self.loader())
+                except Exception as e:
+                    print("webhook secret cache reload error:", e)
+                    failed = True
+                finally:
+                    self.end_reload(failed)
+            else:
+                with self._reload_lock:     # wait for the reload in flight instead of running another
+                    pass
+        return self.peek(chat_id)
+
+def github_signature(secret, body):
+    """X-Hub-Signature-256 value GitHub sends for body (also used by the benchmarks to sign requests)."""
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def signature_valid(secret, body, signature_header):
+    """Constant-time check of GitHub's 'sha256=<hex>' HMAC of the raw body."""
+    if not signature_header or not signature_header.startswith('sha256='):
+        return False
+    return hmac.compare_digest(github_signature(secret, body), signature_header)
+
+def check_webhook(chat_secrets, chat_id, secret_key, body, signature_header):
+    """
+    None when the request is authentic, otherwise the rejection reason
+    (also counted in gitsync_webhook_rejected_total). chat_secrets is the
+    cached (secret_key, signing_secret) for chat_id (None when the chat is unknown).
+    """
+    if not chat_id or not secret_key:
+        reason = 'missing_params'
+    elif chat_secrets is None:
+        reason = 'unknown_chat'
+    elif not hmac.compare_digest(chat_secrets[0].encode(), secret_key.encode()):
+        reason = 'bad_secret'
+    elif signature_header is None:
+        if not chat_secrets[1] and not WEBHOOK_REQUIRE_SIGNATURE:
+            return None     # legacy chat, GitHub Secret not set
+        reason = 'missing_signature'
+    # legacy chats were told to use the secret_key as GitHub's Secret
+    elif not signature_valid(chat_secrets[1] or chat_secrets[0], body, signature_header):
+        reason = 'bad_signature'
+    else:
+        return None
+    WEBHOOK_REJECTED.labels(reason=reason).inc()
+    return reason
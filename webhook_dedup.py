@@ -0,0 +1,92 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from metrics import WEBHOOK_DUPLICATES
+
+# Redelivery dedup keyed by X-GitHub-Delivery. GitHub retries on timeouts and
+# admins can press "Redeliver"; both reuse the delivery id. A per-process LRU
+# answers repeats seen by this worker without any I/O; otherwise the id is
+# claimed in webhook_deliveries with one INSERT ... ON CONFLICT DO NOTHING,
+# and a conflict means another worker (or an earlier run) already has it.
+# Rows older than WEBHOOK_DEDUP_TTL_HOURS are deleted opportunistically,
+# at most once per WEBHOOK_DEDUP_CLEANUP_INTERVAL per process.
+
+WEBHOOK_DEDUP_TTL_HOURS = int(os.getenv("WEBHOOK_DEDUP_TTL_HOURS", "72"))
+WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv("WEBHOOK_DEDUP_CACHE_SIZE", "10000"))
+WEBHOOK_DEDUP_CLEANUP_INTERVAL = int(os.getenv("WEBHOOK_DEDUP_CLEANUP_INTERVAL", "3600"))
+
+def init_delivery_table(c):
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_deliveries (
+          delivery_id TEXT PRIMARY KEY,
+          chat_id TEXT,
+          event TEXT,
+          received_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_received ON webhook_deliveries (received_at)")
+
+class DeliveryDedup:
+    """In-memory front: bounded LRU of delivery ids this process has claimed or seen as duplicates."""
+
+    def __init__(self, size=WEBHOOK_DEDUP_CACHE_SIZE):
+        self.size = size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def seen(self, delivery_id):
+        with self._lock:
+            if delivery_id in self._seen:
+                self._seen.move_to_end(delivery_id)
+                return True
+            return False
+
+    def remember(self, delivery_id):
+        with self._lock:
+            self._seen[delivery_id] = None
+            self._seen.move_to_end(delivery_id)
+            while len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+
+    def forget(self, delivery_id):
+        with self._lock:
+            self._seen.pop(delivery_id, None)
+
+    def cleanup_due(self):
+        """True at most once per WEBHOOK_DEDUP_CLEANUP_INTERVAL (the caller then runs the DELETE)."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_cleanup < WEBHOOK_DEDUP_CLEANUP_INTERVAL:
+                return False
+            self._last_cleanup = now
+            return True
+
+def claim_delivery(conn, dedup, delivery_id, chat_id, event):
+    """True if this is the first time delivery_id is seen (the caller should process it)."""
+    if dedup.seen(delivery_id):
+        WEBHOOK_DUPLICATES.labels(source='memory').inc()
+        return False
+    with conn.cursor() as c:
+        c.execute("""
+            INSERT INTO webhook_deliveries (delivery_id, chat_id, event) VALUES (%s, %s, %s)
+            ON CONFLICT (delivery_id) DO NOTHING
+        """, (delivery_id, str(chat_id), event))
+        claimed = c.rowcount == 1
+        if dedup.cleanup_due():
+            c.execute("DELETE FROM webhook_deliveries WHERE received_at < NOW() - make_interval(hours => %s)",
+                      (WEBHOOK_DEDUP_TTL_HOURS,))
+    conn.commit()
+    dedup.remember(delivery_id)
+    if not claimed:
+        WEBHOOK_DUPLICATES.labels(source='db').inc()
+    return claimed
+
+def release_delivery(conn, dedup, delivery_id):
+    """Undo a claim when handling failed, so a redelivery is processed again."""
+    dedup.forget(delivery_id)
+    with conn.cursor() as c:
+        c.execute("DELETE FROM webhook_deliveries WHERE delivery_id = %s", (delivery_id,))
+    conn.commit()
@@ -0,0 +1,52 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+
+# Opt-in capture of incoming GitHub webhooks for load replay (benchmarks/replay.py).
+# Enabled by setting WEBHOOK_RECORD_DIR; payloads are sanitized before writing.
+
+WEBHOOK_RECORD_DIR = os.getenv("WEBHOOK_RECORD_DIR")
+_write_lock = threading.Lock()
+
+# objects that carry secrets (hook config holds our webhook URL incl. secret_key)
+# or are never read by the handlers
+_DROP_KEYS = {'hook', 'installation', 'enterprise'}
+
+def sanitize_payload(obj):
+    """Recursively strip emails, API/avatar URLs and hook config from a GitHub payload."""
+    if isinstance(obj, dict):
+        out = {}
+        for k, v in obj.items():
+            if k in _DROP_KEYS:
+                continue
+            if k == 'email':
+                out[k] = 'redacted@example.com' if v else v
+            elif k.endswith('_url') or k == 'url':
+                continue
+            else:
+                out[k] = sanitize_payload(v)
+        return out
+    if isinstance(obj, list):
+        return [sanitize_payload(v) for v in obj]
+    return obj
+
+def record_webhook(event_type, delivery_id, payload):
+    """Append one sanitized delivery as a JSON line; never raises."""
+    if not WEBHOOK_RECORD_DIR:
+        return
+    try:
+        now = datetime.now(timezone.utc)
+        line = json.dumps({
+            'event': event_type,
+            'delivery_id': delivery_id,
+            'recorded_at': now.isoformat(),
+            'payload': sanitize_payload(payload)
+        })
+        path = os.path.join(WEBHOOK_RECORD_DIR, f"webhooks-{now.strftime('%Y%m%d')}.jsonl")
+        with _write_lock:
+            os.makedirs(WEBHOOK_RECORD_DIR, exist_ok=True)
+            with open(path, 'a') as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print("record_webhook error:", e)